@@ -0,0 +1,278 @@
+"""
+JSON API for machine clients (`/api/v1`).
+
+Authenticated with `Authorization: Bearer <token>` instead of the session, so
+clients need no CSRF token, redirects or HTML. Reads select plain column tuples
+and serialize them directly; writes go through the same summary bookkeeping as
+the HTML views.
+"""
+
+import functools
+import hashlib
+import secrets
+from decimal import Decimal
+
+from flask import Blueprint, Response, current_app, g, jsonify, request, url_for
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import Produto, TokenApi, Usuario
+from inventory_summary import snapshot, stamp, record_change, get_summary
+from importer import validate_row
+from pagination import paginate_keyset
+from search import search_products
+from user_cache import UserCache, UsuarioIdentidade
+import sku_index
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+TOKEN_PREFIX = 'gsk_'
+
+CAMPOS = ('id', 'sku', 'nome', 'descricao', 'quantidade', 'preco_venda')
+COLUNAS = tuple(getattr(Produto, campo) for campo in CAMPOS)
+
+# token digest -> UsuarioIdentidade; revoked tokens expire with the TTL
+tokens = UserCache()
+
+
+def configure(ttl, max_size):
+    tokens.ttl = ttl
+    tokens.max_size = max_size
+    tokens.clear()
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def create_token(usuario, nome):
+    """Store a new token for `usuario` and return its plain value (shown once)"""
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    db.session.add(TokenApi(usuario_id=usuario.id, nome=nome, token_hash=_digest(token)))
+    return token
+
+
+def revoke_token(token_id):
+    """Delete a token; returns False when it does not exist"""
+    registro = db.session.get(TokenApi, token_id)
+    if registro is None:
+        return False
+    tokens.invalidate(registro.token_hash)
+    db.session.delete(registro)
+    return True
+
+
+def _authenticate(token):
+    digest = _digest(token)
+    identidade = tokens.get(digest)
+    if identidade is not None:
+        return identidade
+
+    row = db.session.query(Usuario.id, Usuario.email, Usuario.is_admin).join(
+        TokenApi, TokenApi.usuario_id == Usuario.id
+    ).filter(TokenApi.token_hash == digest).first()
+    if row is None:
+        return None
+
+    identidade = UsuarioIdentidade(row.id, row.email, row.is_admin)
+    tokens.put(digest, identidade)
+    return identidade
+
+
+def _erro(mensagem, status, **extra):
+    return jsonify(erro=mensagem, **extra), status
+
+
+def token_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        identidade = _authenticate(token.strip()) if scheme.lower() == 'bearer' and token else None
+        if identidade is None:
+            response, status = _erro('Token de API ausente ou inválido.', 401)
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response, status
+        g.api_usuario = identidade
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def serialize(row):
+    """Product row tuple (in CAMPOS order) -> JSON-ready dict"""
+    id_, sku, nome, descricao, quantidade, preco_venda = row
+    return {
+        'id': id_,
+        'sku': sku,
+        'nome': nome,
+        'descricao': descricao,
+        'quantidade': quantidade,
+        'preco_venda': str(Decimal(str(preco_venda)).quantize(Decimal('0.01'))),
+    }
+
+
+def _row(produto):
+    return tuple(getattr(produto, campo) for campo in CAMPOS)
+
+
+def _json_object():
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+@api.errorhandler(404)
+def _nao_encontrado(e):
+    return _erro('Recurso não encontrado.', 404)
+
+
+@api.errorhandler(405)
+def _metodo_nao_permitido(e):
+    return _erro('Método não permitido.', 405)
+
+
+@api.route('/produtos', methods=['GET'])
+@token_required
+def listar_produtos():
+    """Cursor-paginated list: ?q=, ?ordem=id|nome, ?cursor=, ?per_page="""
+    search = request.args.get('q', '', type=str).strip()
+    ordem = request.args.get('ordem', 'id', type=str)
+    per_page = request.args.get('per_page', current_app.config['API_POR_PAGINA'], type=int)
+    per_page = max(1, min(per_page, current_app.config['API_POR_PAGINA_MAX']))
+
+    query = db.session.query(*COLUNAS)
+    keys = []
+    total = None
+    if search:
+        query, rank = search_products(query, search)
+        if rank is not None:
+            keys.append((rank, False))
+    else:
+        total = get_summary().total_produtos
+
+    if ordem == 'nome' and not keys:
+        keys.append((Produto.nome, False))
+    keys.append((Produto.id, False))
+
+    pagina = paginate_keyset(query, keys, cursor=request.args.get('cursor'), per_page=per_page, total=total)
+    return jsonify(
+        itens=[serialize(row) for row in pagina.items],
+        proximo=pagina.next_cursor,
+        anterior=pagina.prev_cursor,
+        total=pagina.total,
+    )
+
+
+@api.route('/produtos/por-sku', methods=['GET'])
+@token_required
+def produtos_por_sku():
+    """Fetch many products at once: ?sku=A&sku=B or ?skus=A,B"""
+    skus = request.args.getlist('sku')
+    for grupo in request.args.getlist('skus'):
+        skus.extend(grupo.split(','))
+    skus = list(dict.fromkeys(s.strip() for s in skus if s.strip()))
+    if not skus:
+        return _erro('Informe ao menos um SKU.', 400)
+    if len(skus) > current_app.config['API_SKUS_MAX']:
+        return _erro(f"Máximo de {current_app.config['API_SKUS_MAX']} SKUs por consulta.", 400)
+
+    rows = db.session.query(*COLUNAS).filter(Produto.sku.in_(skus)).all()
+    encontrados = {row.sku: row for row in rows}
+    return jsonify(
+        itens=[serialize(encontrados[sku]) for sku in skus if sku in encontrados],
+        nao_encontrados=[sku for sku in skus if sku not in encontrados],
+    )
+
+
+@api.route('/sku/<path:sku>', methods=['GET'])
+@token_required
+def consultar_sku(sku):
+    """Point-of-sale lookup served from the per-worker SKU index"""
+    body = sku_index.lookup(sku)
+    if body is None:
+        return _erro('Produto não encontrado.', 404)
+    return Response(body, mimetype='application/json')
+
+
+@api.route('/sku-index', methods=['GET'])
+@token_required
+def sku_index_stats():
+    return jsonify(sku_index.index.stats())
+
+
+@api.route('/produtos/<int:id>', methods=['GET'])
+@token_required
+def obter_produto(id):
+    row = db.session.query(*COLUNAS).filter(Produto.id == id).first()
+    if row is None:
+        return _erro('Produto não encontrado.', 404)
+    return jsonify(serialize(row))
+
+
+@api.route('/produtos', methods=['POST'])
+@token_required
+def criar_produto():
+    data = _json_object()
+    if data is None:
+        return _erro('Envie um objeto JSON.', 400)
+    try:
+        campos = validate_row(data)
+    except ValueError as e:
+        return _erro(str(e), 422)
+
+    produto = Produto(**campos, versao=stamp())
+    db.session.add(produto)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return _erro('SKU já existe. Use um SKU único.', 409)
+    record_change(after=snapshot(produto))
+    db.session.commit()
+
+    response = jsonify(serialize(_row(produto)))
+    response.headers['Location'] = url_for('api_v1.obter_produto', id=produto.id)
+    return response, 201
+
+
+@api.route('/produtos/<int:id>', methods=['PUT', 'PATCH'])
+@token_required
+def atualizar_produto(id):
+    """Update the given fields; omitted fields keep their current value"""
+    data = _json_object()
+    if data is None:
+        return _erro('Envie um objeto JSON.', 400)
+    produto = db.session.get(Produto, id, with_for_update=True)
+    if produto is None:
+        return _erro('Produto não encontrado.', 404)
+
+    atual = {campo: getattr(produto, campo) for campo in CAMPOS[1:]}
+    try:
+        campos = validate_row({**atual, **{k: v for k, v in data.items() if k in atual}})
+    except ValueError as e:
+        return _erro(str(e), 422)
+
+    antes = snapshot(produto)
+    for campo, valor in campos.items():
+        setattr(produto, campo, valor)
+    produto.versao = stamp()
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return _erro('SKU já existe. Use um SKU único.', 409)
+    record_change(antes, snapshot(produto))
+    db.session.commit()
+    return jsonify(serialize(_row(produto)))
+
+
+@api.route('/produtos/<int:id>', methods=['DELETE'])
+@token_required
+def excluir_produto(id):
+    produto = db.session.get(Produto, id, with_for_update=True)
+    if produto is None:
+        return _erro('Produto não encontrado.', 404)
+    antes = snapshot(produto)
+    db.session.delete(produto)
+    db.session.flush()
+    record_change(before=antes)
+    db.session.commit()
+    return '', 204
@@ -1,63 +1,245 @@
 import os
+import hmac
 import time
 import logging
+import threading
+import weakref
+import click
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, g
+from functools import wraps
+from flask import Blueprint, Flask, Response, current_app, jsonify, render_template, request, redirect, url_for, flash, g, stream_with_context, abort, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from flask.cli import AppGroup
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
 from werkzeug.middleware.proxy_fix import ProxyFix
 from sqlalchemy.orm import DeclarativeBase
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-
 class Base(DeclarativeBase):
     pass
 
 # Initialize extensions
 db = SQLAlchemy(model_class=Base)
 login_manager = LoginManager()
-
-# Create Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure PostgreSQL database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# Initialize extensions with app
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'web.login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 
-# Import models after db initialization
-from models import Usuario, Produto
-from forms import LoginForm, ProdutoForm
+logger = logging.getLogger(__name__)
+_schema_lock = threading.Lock()
+
+# Import models after db is defined
+from models import Usuario, Produto, TokenApi
+from forms import LoginForm, ProdutoForm, ImportarProdutosForm
+from inventory_summary import snapshot, stamp, record_change, get_summary, rebuild_summary, verify_summary
+from search import search_products, rebuild_search_index
+from pagination import paginate_keyset, cached_count
+from importer import import_products, detect_format, open_text, FORMATOS, TAMANHO_LOTE
+import exporter
+import user_cache
+import response_cache
+import api
+import sku_index
+import stress_jobs
+import stress_reports
+import metrics
+import query_stats
+import profiler
+import log_pipeline
+import schema
+from passwords import PasswordHashBusy
+from movements import apply_movement, run_batch, ProdutoNaoEncontrado, EstoqueInsuficiente, ChaveIdempotenciaConflito
+
+# HTML views, registered on every app built by create_app (endpoints are 'web.<function>')
+web = Blueprint('web', __name__)
+
+# Engines of every app built here; a preloaded master's pooled connections
+# must not be shared by the workers forked from it
+_engines = weakref.WeakSet()
+
+def _dispose_engines_after_fork():
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+def create_app(config=None):
+    """Build the application; `config` overrides the settings read from the environment.
+
+    Nothing here touches the database schema: tables are created by
+    `flask banco criar` (or `init_db.py`), and checked once per process on the
+    first request.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure PostgreSQL database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+
+    # Product listing
+    app.config["PRODUTOS_POR_PAGINA"] = int(os.environ.get("PRODUTOS_POR_PAGINA", 10))
+    app.config["PRODUTOS_POR_PAGINA_MAX"] = int(os.environ.get("PRODUTOS_POR_PAGINA_MAX", 100))
+    app.config["PRODUTOS_CONTAR_BUSCA"] = os.environ.get("PRODUTOS_CONTAR_BUSCA", "1") == "1"
+    app.config["MOVIMENTACOES_LOTE_MAX"] = int(os.environ.get("MOVIMENTACOES_LOTE_MAX", 5000))
+
+    # Per-worker cache of logged-in user identities
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 60))
+    app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", 1024))
+
+    # Rendered catalog pages, validated against the catalog version
+    app.config["RESPONSE_CACHE_SIZE"] = int(os.environ.get("RESPONSE_CACHE_SIZE", 256))
+    app.config["RESPONSE_CACHE_MAX_BYTES"] = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    app.config["RESPONSE_CACHE_VERSION_TTL"] = float(os.environ.get("RESPONSE_CACHE_VERSION_TTL", 1))
+
+    # JSON API page sizes
+    app.config["API_POR_PAGINA"] = int(os.environ.get("API_POR_PAGINA", 100))
+    app.config["API_POR_PAGINA_MAX"] = int(os.environ.get("API_POR_PAGINA_MAX", 1000))
+    app.config["API_SKUS_MAX"] = int(os.environ.get("API_SKUS_MAX", 500))
+
+    # In-memory SKU index for point-of-sale lookups (SKU_INDEX_WARM=0 loads it on the first lookup instead of the first request)
+    app.config["SKU_INDEX_WARM"] = os.environ.get("SKU_INDEX_WARM", "1") == "1"
+    app.config["SKU_INDEX_RELOAD_INTERVAL"] = float(os.environ.get("SKU_INDEX_RELOAD_INTERVAL", 5))
+    app.config["SKU_INDEX_MAX_AGE"] = float(os.environ.get("SKU_INDEX_MAX_AGE", 600))
+
+    # Password hashing: werkzeug method string and optional host-wide cap on concurrent verifications
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_SLOTS"] = int(os.environ.get("PASSWORD_HASH_SLOTS", 0))
+    app.config["PASSWORD_HASH_SLOTS_DIR"] = os.environ.get("PASSWORD_HASH_SLOTS_DIR", os.path.join(app.instance_path, "password_slots"))
+    app.config["PASSWORD_HASH_TIMEOUT"] = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+    # Stress tests started from /teste-estresse by admins; the target is always this setting,
+    # never the request's Host (behind ProxyFix that header is client-controlled)
+    app.config["STRESS_TEST_BASE_URL"] = os.environ.get("STRESS_TEST_BASE_URL", "http://127.0.0.1:5000")
+    app.config["STRESS_TEST_STATE_DIR"] = os.environ.get("STRESS_TEST_STATE_DIR", app.instance_path)
+    app.config["STRESS_TEST_MAX_USUARIOS"] = int(os.environ.get("STRESS_TEST_MAX_USUARIOS", 50))
+    app.config["STRESS_TEST_MAX_DURACAO"] = int(os.environ.get("STRESS_TEST_MAX_DURACAO", 600))
+    app.config["STRESS_REPORTS_DIR"] = os.environ.get("STRESS_REPORTS_DIR", ".")
+    app.config["STRESS_REPORTS_POR_PAGINA"] = int(os.environ.get("STRESS_REPORTS_POR_PAGINA", 20))
+
+    # Prometheus metrics: one mmap file per worker, summed by /metrics
+    app.config["METRICS_DIR"] = os.environ.get("METRICS_DIR", os.path.join(app.instance_path, "metrics"))
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN", "")
+
+    # SQL instrumentation: Server-Timing header, slow-request log, repeated statements in strict mode
+    app.config["SQL_TIMING"] = os.environ.get("SQL_TIMING", "1") == "1"
+    app.config["SQL_MAX_QUERIES"] = int(os.environ.get("SQL_MAX_QUERIES", 25))
+    app.config["SQL_SLOW_QUERY_MS"] = float(os.environ.get("SQL_SLOW_QUERY_MS", 100))
+    app.config["SQL_SLOW_REQUEST_DB_MS"] = float(os.environ.get("SQL_SLOW_REQUEST_DB_MS", 500))
+    app.config["SQL_STRICT"] = os.environ.get("SQL_STRICT", "0") == "1"
+    app.config["SQL_REPEAT_THRESHOLD"] = int(os.environ.get("SQL_REPEAT_THRESHOLD", 2))
+
+    # Opt-in sampling profiler: keeps stack samples of slow (or randomly sampled) requests
+    app.config["PROFILER_ENABLED"] = os.environ.get("PROFILER_ENABLED", "0") == "1"
+    app.config["PROFILER_SLOW_MS"] = float(os.environ.get("PROFILER_SLOW_MS", 500))
+    app.config["PROFILER_SAMPLE_RATE"] = float(os.environ.get("PROFILER_SAMPLE_RATE", 0))
+    app.config["PROFILER_INTERVAL_MS"] = float(os.environ.get("PROFILER_INTERVAL_MS", 5))
+    app.config["PROFILER_DIR"] = os.environ.get("PROFILER_DIR", os.path.join(app.instance_path, "profiles"))
+    app.config["PROFILER_MAX_FILES"] = int(os.environ.get("PROFILER_MAX_FILES", 200))
+
+    # Logging: JSON lines written by a background thread (LOG_FORMAT=texto for plain text)
+    app.config["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", "INFO").upper()
+    app.config["LOG_LEVELS"] = os.environ.get("LOG_LEVELS", "sqlalchemy=WARNING")
+    app.config["LOG_FORMAT"] = os.environ.get("LOG_FORMAT", "json")
+    app.config["LOG_QUEUE_SIZE"] = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+    app.config["LOG_ACCESS"] = os.environ.get("LOG_ACCESS", "1") == "1"
+
+    # Schema check on the first request; SCHEMA_AUTO_CREATE=0 refuses to serve instead of creating tables
+    app.config["SCHEMA_AUTO_CREATE"] = os.environ.get("SCHEMA_AUTO_CREATE", "1") == "1"
+
+    if config:
+        app.config.update(config)
+
+    # Initialize extensions with app
+    db.init_app(app)
+    login_manager.init_app(app)
+    log_pipeline.configure(app.config)
+    user_cache.configure(app.config["USER_CACHE_TTL"], app.config["USER_CACHE_SIZE"])
+    response_cache.configure(app.config["RESPONSE_CACHE_SIZE"], app.config["RESPONSE_CACHE_MAX_BYTES"])
+    api.configure(app.config["USER_CACHE_TTL"], app.config["USER_CACHE_SIZE"])
+    app.register_blueprint(api.api)
+    app.register_blueprint(web)
+    metrics.configure(app.config["METRICS_DIR"])
+    if app.config["SQL_TIMING"]:
+        query_stats.install(app)
+
+    app.before_request(before_request_func)
+    app.before_request(check_schema)
+    app.after_request(after_request_func)
+    app.teardown_request(teardown_request_func)
+    app.context_processor(inject_performance)
+    for grupo in (resumo_estoque_cli, busca_cli, produtos_cli, api_cli, metricas_cli, banco_cli):
+        app.cli.add_command(grupo)
+
+    with app.app_context():
+        _engines.update(db.engines.values())
+    return app
+
+def check_schema():
+    """Once per process, before the first request: create or report missing tables, columns and indexes,
+    then start loading the SKU index"""
+    if current_app.extensions.get('schema_verificado'):
+        return
+    with _schema_lock:
+        if current_app.extensions.get('schema_verificado'):
+            return
+        faltando = [nome for grupo in schema.differences() for nome in grupo]
+        if faltando:
+            if not current_app.config['SCHEMA_AUTO_CREATE']:
+                logger.error("Schema out of date (missing %s); run 'flask banco criar'", ', '.join(faltando))
+                abort(503)
+            schema.upgrade()
+            logger.warning("Schema upgraded: created %s", ', '.join(faltando))
+        current_app.extensions['schema_verificado'] = True
+        if current_app.config['SKU_INDEX_WARM']:
+            # In the worker, after any fork, and without delaying this request
+            sku_index.warm()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Usuario.query.get(int(user_id))
+    return user_cache.load_identity(int(user_id))
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
 
 # Performance monitoring
-@app.before_request
 def before_request_func():
     g.start_time = time.time()
+    metrics.request_started(request.method)
+    g.metrics_em_andamento = True
+    if current_app.config['SQL_TIMING']:
+        query_stats.start_request(current_app.config['SQL_STRICT'])
+    if current_app.config['PROFILER_ENABLED']:
+        profiler.start_request(current_app.config)
 
-@app.after_request
 def after_request_func(response):
-    diff_ms = round((time.time() - g.start_time) * 1000, 2)
+    elapsed = time.time() - g.start_time
+    diff_ms = round(elapsed * 1000, 2)
     response.headers['X-Response-Time'] = f'{diff_ms}ms'
-    return response
+    metrics.observe_request(request.method, _metrics_route(), response.status_code, elapsed)
+    profiler.finish_request(response, elapsed, current_app.config, _metrics_route())
+    log_pipeline.log_request(response, elapsed, _metrics_route())
+    return query_stats.finish_request(response, elapsed, current_app.config)
+
+def teardown_request_func(exc):
+    if g.pop('metrics_em_andamento', False):
+        metrics.request_finished(request.method)
+    profiler.discard_request()
+    if exc is not None:
+        metrics.count_exception(request.method, _metrics_route(), type(exc).__name__)
+
+def _metrics_route():
+    # The URL rule, not the path, keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule is not None else 'sem_rota'
 
-@app.context_processor
 def inject_performance():
     if hasattr(g, 'start_time'):
         response_time_ms = round((time.time() - g.start_time) * 1000, 2)
@@ -66,78 +248,90 @@ def inject_performance():
     return {'response_time_ms': response_time_ms}
 
 # Routes
-@app.route('/')
+@web.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
+        return redirect(url_for('web.dashboard'))
+    return redirect(url_for('web.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@web.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('web.dashboard'))
     
     form = LoginForm()
     if form.validate_on_submit():
         user = Usuario.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except PasswordHashBusy:
+            flash('Servidor ocupado. Tente novamente em instantes.', 'error')
+            return render_template('login.html', form=form), 503
+        if valid:
+            # Upgrade hashes made with outdated parameters
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             if not next_page or not next_page.startswith('/'):
-                next_page = url_for('dashboard')
+                next_page = url_for('web.dashboard')
             return redirect(next_page)
         flash('Email ou senha inválidos.', 'error')
     
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@web.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('Você foi desconectado com sucesso.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('web.login'))
 
-@app.route('/dashboard')
+@web.route('/dashboard')
 @login_required
 def dashboard():
-    # Calculate metrics
-    total_produtos = Produto.query.count()
-    total_estoque = db.session.query(db.func.sum(Produto.quantidade)).scalar() or 0
-    valor_total_estoque = db.session.query(
-        db.func.sum(Produto.quantidade * Produto.preco_venda)
-    ).scalar() or 0
-    
-    produtos_baixo_estoque = Produto.query.filter(Produto.quantidade <= 5).count()
+    # Metrics come from the incrementally maintained summary row
+    resumo = get_summary()
     
     return render_template('dashboard.html', 
-                         total_produtos=total_produtos,
-                         total_estoque=total_estoque,
-                         valor_total_estoque=valor_total_estoque,
-                         produtos_baixo_estoque=produtos_baixo_estoque)
+                         total_produtos=resumo.total_produtos,
+                         total_estoque=resumo.total_estoque,
+                         valor_total_estoque=resumo.valor_total_estoque,
+                         produtos_baixo_estoque=resumo.produtos_baixo_estoque)
 
-@app.route('/produtos')
+@web.route('/produtos')
 @login_required
+@response_cache.cached_page
 def produtos():
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '', type=str)
+    cursor = request.args.get('cursor', type=str)
+    ordem = request.args.get('ordem', 'id', type=str)
+    per_page = request.args.get('per_page', current_app.config['PRODUTOS_POR_PAGINA'], type=int)
+    per_page = max(1, min(per_page, current_app.config['PRODUTOS_POR_PAGINA_MAX']))
     
     query = Produto.query
+    keys = []
+    total = None
     if search:
-        query = query.filter(
-            db.or_(
-                Produto.nome.contains(search),
-                Produto.sku.contains(search),
-                Produto.descricao.contains(search)
-            )
-        )
+        query, rank = search_products(query, search)
+        if rank is not None:
+            keys.append((rank, False))
+        if current_app.config['PRODUTOS_CONTAR_BUSCA']:
+            total = cached_count(('produtos', search), query)
+    else:
+        # The summary row already holds an exact count
+        total = get_summary().total_produtos
+    
+    if ordem == 'nome' and not keys:
+        keys.append((Produto.nome, False))
+    keys.append((Produto.id, False))
     
-    produtos = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    produtos = paginate_keyset(query, keys, cursor=cursor, per_page=per_page, total=total)
     
-    return render_template('produtos.html', produtos=produtos, search=search)
+    return render_template('produtos.html', produtos=produtos, search=search, ordem=ordem)
 
-@app.route('/produtos/novo', methods=['GET', 'POST'])
+@web.route('/produtos/novo', methods=['GET', 'POST'])
 @login_required
 def produto_novo():
     form = ProdutoForm()
@@ -147,126 +341,381 @@ def produto_novo():
             sku=form.sku.data,
             descricao=form.descricao.data,
             quantidade=form.quantidade.data,
-            preco_venda=form.preco_venda.data
+            preco_venda=form.preco_venda.data,
+            versao=stamp()
         )
         db.session.add(produto)
+        record_change(after=snapshot(produto))
         db.session.commit()
         flash('Produto criado com sucesso!', 'success')
-        return redirect(url_for('produtos'))
+        return redirect(url_for('web.produtos'))
     
     return render_template('produto_form.html', form=form, title='Novo Produto')
 
-@app.route('/produtos/editar/<int:id>', methods=['GET', 'POST'])
+@web.route('/produtos/importar', methods=['GET', 'POST'])
+@login_required
+def produtos_importar():
+    form = ImportarProdutosForm()
+    resultado = None
+    
+    if form.validate_on_submit():
+        arquivo = form.arquivo.data
+        resultado = import_products(open_text(arquivo.stream), detect_format(arquivo.filename))
+        if resultado.total_erros:
+            flash(f'Importação concluída com {resultado.total_erros} linha(s) rejeitada(s).', 'error')
+        else:
+            flash('Importação concluída com sucesso!', 'success')
+    
+    return render_template('produtos_importar.html', form=form, resultado=resultado)
+
+@web.route('/produtos/exportar')
+@login_required
+def produtos_exportar():
+    formato = request.args.get('formato', 'csv', type=str)
+    if formato not in exporter.FORMATOS:
+        abort(400)
+    
+    mimetype, extensao = exporter.FORMATOS[formato]
+    filename = f"produtos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extensao}"
+    response = Response(stream_with_context(exporter.export_products(formato)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Let reverse proxies pass chunks through instead of buffering the whole file
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@web.route('/produtos/editar/<int:id>', methods=['GET', 'POST'])
 @login_required
 def produto_editar(id):
-    produto = Produto.query.get_or_404(id)
-    form = ProdutoForm(obj=produto)
+    # Locked on submit so the summary delta is taken against the committed quantity
+    produto = db.get_or_404(Produto, id, with_for_update=request.method == 'POST')
+    form = ProdutoForm(produto_id=produto.id, obj=produto)
     
     if form.validate_on_submit():
+        antes = snapshot(produto)
         form.populate_obj(produto)
+        produto.versao = stamp()
+        record_change(antes, snapshot(produto))
         db.session.commit()
         flash('Produto atualizado com sucesso!', 'success')
-        return redirect(url_for('produtos'))
+        return redirect(url_for('web.produtos'))
     
     return render_template('produto_form.html', form=form, title='Editar Produto', produto=produto)
 
-@app.route('/produtos/excluir/<int:id>', methods=['POST'])
+@web.route('/produtos/excluir/<int:id>', methods=['POST'])
 @login_required
 def produto_excluir(id):
-    produto = Produto.query.get_or_404(id)
+    produto = db.get_or_404(Produto, id, with_for_update=True)
+    antes = snapshot(produto)
+    # Product row first, summary second: the order every other write path uses
     db.session.delete(produto)
+    db.session.flush()
+    record_change(before=antes)
     db.session.commit()
     flash('Produto excluído com sucesso!', 'success')
-    return redirect(url_for('produtos'))
+    return redirect(url_for('web.produtos'))
 
-@app.route('/produtos/movimentar/<int:id>', methods=['POST'])
+@web.route('/produtos/movimentar/<int:id>', methods=['POST'])
 @login_required
 def produto_movimentar(id):
-    produto = Produto.query.get_or_404(id)
     quantidade = request.form.get('quantidade', type=int)
+    motivo = request.form.get('motivo', '', type=str).strip()[:200] or None
     
-    if quantidade is None:
+    if not quantidade:
         flash('Quantidade inválida.', 'error')
-        return redirect(url_for('produtos'))
+        return redirect(url_for('web.produtos'))
     
-    nova_quantidade = produto.quantidade + quantidade
-    
-    if nova_quantidade < 0:
+    try:
+        apply_movement(id, quantidade, motivo=motivo, usuario_id=current_user.id)
+    except ProdutoNaoEncontrado:
+        db.session.rollback()
+        abort(404)
+    except EstoqueInsuficiente:
+        db.session.rollback()
         flash('Estoque insuficiente para esta operação.', 'error')
-        return redirect(url_for('produtos'))
-    
-    produto.quantidade = nova_quantidade
+        return redirect(url_for('web.produtos'))
     db.session.commit()
     
     operacao = "entrada" if quantidade > 0 else "saída"
     flash(f'Movimentação de {operacao} realizada com sucesso!', 'success')
-    return redirect(url_for('produtos'))
+    return redirect(url_for('web.produtos'))
 
-@app.route('/teste-estresse')
+@web.route('/produtos/movimentar/lote', methods=['POST'])
 @login_required
-def teste_estresse():
-    """Página para visualizar e executar testes de estresse"""
-    import glob
-    import os
+def produtos_movimentar_lote():
+    """Apply a JSON batch of movements: {"itens": [{"sku"|"id", "quantidade", "motivo"}]}"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('itens'), list):
+        return jsonify(erro='Envie um objeto JSON com a lista "itens".'), 400
     
-    # Busca relatórios existentes na raiz do projeto
-    basic_reports = glob.glob("stress_test_report_*.md")
-    advanced_reports = glob.glob("advanced_stress_report_*.md")
+    itens = payload['itens']
+    if len(itens) > current_app.config['MOVIMENTACOES_LOTE_MAX']:
+        return jsonify(erro=f"Máximo de {current_app.config['MOVIMENTACOES_LOTE_MAX']} itens por lote."), 413
     
-    all_reports = []
+    chave = request.headers.get('Idempotency-Key') or payload.get('chave_idempotencia')
+    if chave is not None and not (isinstance(chave, str) and 0 < len(chave) <= 100):
+        return jsonify(erro='Chave de idempotência inválida.'), 400
     
-    for report_file in basic_reports + advanced_reports:
-        try:
-            stats = os.stat(report_file)
-            created_time = datetime.fromtimestamp(stats.st_mtime)
-            
-            # Lê algumas métricas básicas do relatório
-            with open(report_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            # Extrai métricas básicas do conteúdo
-            import re
-            # Busca pelos padrões dos relatórios básicos e avançados
-            total_requests = re.search(r'- \*\*Total de Requests:\*\*\s*(\d+)', content)
-            success_rate = re.search(r'- \*\*Taxa de Sucesso:\*\*\s*([\d.]+)%', content)
-            avg_time = re.search(r'- \*\*Média:\*\*\s*([\d.]+)\s*ms', content)
-            
-            # Se não encontrou no padrão básico, tenta padrão avançado
-            if not avg_time:
-                avg_time = re.search(r'- \*\*Tempo de Resposta Médio:\*\*\s*([\d.]+)\s*ms', content)
-            
-            report_type = "Avançado" if "advanced" in report_file else "Básico"
-            
-            all_reports.append({
-                'filename': report_file,
-                'type': report_type,
-                'created': created_time.strftime('%d/%m/%Y %H:%M'),
-                'total_requests': total_requests.group(1) if total_requests else 'N/A',
-                'success_rate': success_rate.group(1) if success_rate else 'N/A',
-                'avg_time': avg_time.group(1) if avg_time else 'N/A'
-            })
-        except:
-            continue
+    try:
+        resposta, replayed = run_batch(itens, chave=chave, usuario_id=current_user.id)
+    except ChaveIdempotenciaConflito:
+        db.session.rollback()
+        return jsonify(erro='Chave de idempotência já usada com outro conteúdo.'), 422
+    db.session.commit()
+    
+    response = jsonify(resposta)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+@web.route('/teste-estresse')
+@login_required
+def teste_estresse():
+    """Página para visualizar e executar testes de estresse"""
+    tipo = request.args.get('tipo')
+    if tipo not in stress_reports.TIPOS:
+        tipo = None
+    dias = request.args.get('dias', type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['STRESS_REPORTS_POR_PAGINA']
     
-    # Ordena por data de criação (mais recente primeiro)
-    all_reports.sort(key=lambda x: x['created'], reverse=True)
+    # Índice em cache por mtime: só relatórios novos ou alterados são lidos
+    reports = stress_reports.list_reports(current_app.config['STRESS_REPORTS_DIR'], tipo=tipo, dias=dias)
+    total_pages = max((len(reports) + per_page - 1) // per_page, 1)
+    page = min(page, total_pages)
     
-    return render_template('teste_estresse.html', reports=all_reports)
+    return render_template('teste_estresse.html',
+                           reports=reports[(page - 1) * per_page:page * per_page],
+                           latest_report=reports[0] if reports else None,
+                           total_reports=len(reports),
+                           page=page, total_pages=total_pages,
+                           tipo=tipo, dias=dias, tipos=stress_reports.TIPOS,
+                           tendencia=stress_reports.trend(reports),
+                           execucao=stress_jobs.status())
 
-@app.route('/executar-teste-estresse', methods=['POST'])
+@web.route('/executar-teste-estresse', methods=['POST'])
 @login_required
+@admin_required
 def executar_teste_estresse():
-    """Executa um teste de estresse via web"""
+    """Inicia um teste de estresse em segundo plano"""
     test_type = request.form.get('test_type', 'basic')
+    usuarios = request.form.get('usuarios', 5, type=int)
+    duracao = request.form.get('duracao', 30, type=int)
+    taxa = request.form.get('taxa', type=float)
     
-    # Aqui normalmente executaríamos o teste em background
-    # Por simplicidade, vamos apenas simular
-    flash('Teste de estresse iniciado! Verifique os logs do servidor.', 'info')
-    return redirect(url_for('teste_estresse'))
+    erro = None
+    if test_type not in stress_jobs.TIPOS:
+        erro = 'Tipo de teste inválido.'
+    elif not usuarios or not 1 <= usuarios <= current_app.config['STRESS_TEST_MAX_USUARIOS']:
+        erro = f"Usuários simultâneos deve estar entre 1 e {current_app.config['STRESS_TEST_MAX_USUARIOS']}."
+    elif not duracao or not 5 <= duracao <= current_app.config['STRESS_TEST_MAX_DURACAO']:
+        erro = f"Duração deve estar entre 5 e {current_app.config['STRESS_TEST_MAX_DURACAO']} segundos."
+    elif taxa is not None and taxa <= 0:
+        erro = 'A taxa máxima deve ser maior que zero.'
+    if erro:
+        flash(erro, 'error')
+        return redirect(url_for('web.teste_estresse'))
+    
+    base_url = current_app.config['STRESS_TEST_BASE_URL'].rstrip('/')
+    try:
+        stress_jobs.start(test_type, usuarios, duracao, taxa, base_url)
+    except stress_jobs.StressTestRunning:
+        flash('Já existe um teste de estresse em execução. Aguarde ou cancele antes de iniciar outro.', 'warning')
+        return redirect(url_for('web.teste_estresse'))
+    
+    flash('Teste de estresse iniciado! Acompanhe o progresso nesta página.', 'success')
+    return redirect(url_for('web.teste_estresse'))
+
+@web.route('/teste-estresse/status')
+@login_required
+def teste_estresse_status():
+    """Andamento do teste em execução (ou do último), consultado pela página"""
+    return jsonify(execucao=stress_jobs.status())
+
+@web.route('/teste-estresse/cancelar', methods=['POST'])
+@login_required
+@admin_required
+def cancelar_teste_estresse():
+    """Interrompe o teste em execução; o relatório parcial ainda é gerado"""
+    if stress_jobs.cancel():
+        flash('Cancelamento solicitado. O relatório parcial será gerado em instantes.', 'info')
+    else:
+        flash('Nenhum teste de estresse em execução.', 'warning')
+    return redirect(url_for('web.teste_estresse'))
+
+@web.route('/admin/perfis')
+@login_required
+@admin_required
+def perfis():
+    """Perfis de requisições lentas capturados pelo profiler, por rota"""
+    todos = profiler.list_profiles(current_app.config['PROFILER_DIR'])
+    rota = request.args.get('rota')
+    lista = [p for p in todos if p['route'] == rota] if rota else todos
+    return render_template('perfis.html', perfis=lista[:100], rotas=profiler.by_route(todos),
+                           rota=rota, total=len(todos))
+
+@web.route('/admin/perfis/<nome>')
+@login_required
+@admin_required
+def perfil_detalhe(nome):
+    """Funções com mais amostras em um perfil"""
+    if not profiler.NOME.match(nome):
+        abort(404)
+    try:
+        meta, amostras = profiler.load(current_app.config['PROFILER_DIR'], nome)
+    except FileNotFoundError:
+        abort(404)
+    return render_template('perfil_detalhe.html', perfil=meta,
+                           funcoes=profiler.top_functions(amostras), total_amostras=sum(amostras.values()))
+
+@web.route('/admin/perfis/<nome>.folded')
+@login_required
+@admin_required
+def perfil_download(nome):
+    """Perfil em formato collapsed-stack (flamegraph.pl, speedscope)"""
+    if not profiler.NOME.match(nome):
+        abort(404)
+    return send_from_directory(os.path.abspath(current_app.config['PROFILER_DIR']), nome + profiler.SUFIXO,
+                               mimetype='text/plain', as_attachment=True)
+
+@web.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint, summed across all workers"""
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(header, f'Bearer {token}'):
+            abort(401)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# CLI commands
+@click.group(cls=AppGroup, name='resumo-estoque')
+def resumo_estoque_cli():
+    """Manage the dashboard inventory summary"""
+
+@resumo_estoque_cli.command('rebuild')
+def resumo_estoque_rebuild():
+    """Recompute the inventory summary from the produtos table"""
+    resumo = rebuild_summary()
+    print(f"Resumo reconstruído: {resumo.total_produtos} produtos, "
+          f"{resumo.total_estoque} itens, R$ {resumo.valor_total_estoque}")
+
+@resumo_estoque_cli.command('verify')
+def resumo_estoque_verify():
+    """Check the inventory summary against the produtos table"""
+    drift = verify_summary()
+    if not drift:
+        print("Resumo de estoque consistente.")
+        return
+    for field, (stored, actual) in drift.items():
+        print(f"{field}: armazenado={stored} real={actual}")
+    raise click.ClickException("Resumo de estoque divergente. Execute 'flask resumo-estoque rebuild'.")
+
+@click.group(cls=AppGroup, name='busca')
+def busca_cli():
+    """Manage the product search index"""
+
+@busca_cli.command('reindex')
+def busca_reindex():
+    """Create the search index if missing and repopulate it"""
+    with db.engine.begin() as connection:
+        if not rebuild_search_index(connection):
+            raise click.ClickException("Banco de dados sem suporte a índice de busca; usando LIKE.")
+    print("Índice de busca reconstruído.")
+
+@click.group(cls=AppGroup, name='produtos')
+def produtos_cli():
+    """Bulk product operations"""
+
+@produtos_cli.command('importar')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(FORMATOS), help='Padrão: pela extensão do arquivo')
+@click.option('--lote', default=TAMANHO_LOTE, show_default=True, help='Linhas por upsert')
+def produtos_importar_cli(arquivo, formato, lote):
+    """Import products from a CSV or JSONL file, upserting by SKU"""
+    start = time.time()
+    with open(arquivo, 'rb') as f:
+        resultado = import_products(open_text(f), formato or detect_format(arquivo), lote)
+    elapsed = time.time() - start
+    
+    print(f"Linhas lidas: {resultado.lidos} ({resultado.lidos / max(elapsed, 1e-9):.0f} linhas/s)")
+    print(f"Inseridos: {resultado.inseridos} | Atualizados: {resultado.atualizados} | Erros: {resultado.total_erros}")
+    for erro in resultado.erros[:20]:
+        print(f"  linha {erro['linha']} ({erro['sku'] or '-'}): {erro['erro']}")
+    if resultado.total_erros > 20:
+        print(f"  ... e mais {resultado.total_erros - 20} erro(s)")
+
+@produtos_cli.command('exportar')
+@click.argument('arquivo', type=click.Path(dir_okay=False, writable=True))
+@click.option('--formato', type=click.Choice(list(exporter.FORMATOS)), default='csv', show_default=True)
+def produtos_exportar_cli(arquivo, formato):
+    """Export the whole catalog to a CSV, JSONL or XLSX file"""
+    with open(arquivo, 'wb') as f:
+        for chunk in exporter.export_products(formato):
+            f.write(chunk)
+    print(f"Catálogo exportado para {arquivo}")
+
+@click.group(cls=AppGroup, name='api')
+def api_cli():
+    """Manage JSON API tokens"""
+
+@api_cli.command('criar-token')
+@click.argument('email')
+@click.option('--nome', default='integracao', show_default=True, help='Identificação do token')
+def api_criar_token(email, nome):
+    """Create a bearer token for the user with EMAIL"""
+    usuario = Usuario.query.filter_by(email=email).first()
+    if usuario is None:
+        raise click.ClickException(f"Usuário não encontrado: {email}")
+    token = api.create_token(usuario, nome)
+    db.session.commit()
+    print(f"Token criado (guarde-o, ele não será exibido novamente):\n{token}")
+
+@api_cli.command('tokens')
+def api_tokens():
+    """List API tokens"""
+    for registro in TokenApi.query.order_by(TokenApi.id):
+        print(f"{registro.id}\t{registro.usuario.email}\t{registro.nome}\t{registro.criado_em:%Y-%m-%d %H:%M}")
+
+@api_cli.command('revogar-token')
+@click.argument('token_id', type=int)
+def api_revogar_token(token_id):
+    """Revoke the token with TOKEN_ID"""
+    if not api.revoke_token(token_id):
+        raise click.ClickException(f"Token não encontrado: {token_id}")
+    db.session.commit()
+    print("Token revogado.")
+
+@click.group(cls=AppGroup, name='metricas')
+def metricas_cli():
+    """Manage Prometheus metric files"""
+
+@metricas_cli.command('limpar')
+def metricas_limpar():
+    """Delete all worker metric files (run before starting gunicorn)"""
+    metrics.registry.clear()
+    print(f"Métricas zeradas em {current_app.config['METRICS_DIR']}")
+
+@click.group(cls=AppGroup, name='banco')
+def banco_cli():
+    """Manage the database schema"""
+
+@banco_cli.command('criar')
+def banco_criar():
+    """Create missing tables, columns and indexes (run on every deploy)"""
+    criados = schema.upgrade()
+    for nome in criados:
+        print(f"  criado: {nome}")
+    print("Esquema do banco de dados atualizado." if criados else "Esquema do banco de dados já estava atualizado.")
 
-# Create tables
-with app.app_context():
-    db.create_all()
+@banco_cli.command('verificar')
+def banco_verificar():
+    """Fail when a model table, column or index is missing from the database"""
+    tabelas, colunas, indices = schema.differences()
+    faltando = [f"{rotulo}: {', '.join(nomes)}" for rotulo, nomes in
+                (('tabelas', tabelas), ('colunas', colunas), ('índices', indices)) if nomes]
+    if faltando:
+        raise click.ClickException(f"Esquema desatualizado ({'; '.join(faltando)}). Execute 'flask banco criar'.")
+    print("Esquema do banco de dados completo.")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,180 @@
+"""
+Constant-memory streaming export of the product catalog.
+
+Rows are read as plain tuples from a server-side cursor (`yield_per` +
+`stream_results`), never as ORM objects, and each format encoder yields bytes
+chunk by chunk so the response can be streamed straight to the client.
+"""
+
+import csv
+import json
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from app import db
+from models import Produto, status_estoque_de
+
+TAMANHO_LOTE = 2000
+
+COLUNAS = (
+    'id', 'nome', 'sku', 'descricao', 'quantidade', 'preco_venda',
+    'valor_total_estoque', 'status_estoque',
+)
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def iter_product_rows(tamanho_lote=TAMANHO_LOTE):
+    """Yield lists of export rows, `tamanho_lote` at a time"""
+    stmt = db.select(
+        Produto.id, Produto.nome, Produto.sku, Produto.descricao,
+        Produto.quantidade, Produto.preco_venda,
+    ).order_by(Produto.id).execution_options(yield_per=tamanho_lote, stream_results=True)
+
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            batch = []
+            for id_, nome, sku, descricao, quantidade, preco_venda in partition:
+                preco = Decimal(str(preco_venda))
+                batch.append((
+                    id_, nome, sku, descricao or '', quantidade, preco,
+                    preco * quantidade, status_estoque_de(quantidade),
+                ))
+            yield batch
+    finally:
+        result.close()
+
+
+class _Buffer:
+    """Write-only sink drained after every batch"""
+
+    def __init__(self, empty=b''):
+        self.chunks = []
+        self.empty = empty
+
+    def write(self, data):
+        self.chunks.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self.empty.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def export_csv(batches):
+    buffer = _Buffer('')
+    writer = csv.writer(buffer)
+    writer.writerow(COLUNAS)
+    yield ('\ufeff' + buffer.drain()).encode('utf-8')
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.drain().encode('utf-8')
+
+
+def export_jsonl(batches):
+    for batch in batches:
+        lines = []
+        for row in batch:
+            record = dict(zip(COLUNAS, row))
+            record['preco_venda'] = str(record['preco_venda'])
+            record['valor_total_estoque'] = str(record['valor_total_estoque'])
+            lines.append(json.dumps(record, ensure_ascii=False))
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+# Characters XML 1.0 does not allow, even escaped
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Produtos" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(v) for v in values) + '</row>'
+
+
+def export_xlsx(batches):
+    """Stream a minimal single-sheet XLSX workbook with inline strings"""
+    buffer = _Buffer()
+    # An unseekable sink makes zipfile write data descriptors instead of seeking back
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row(COLUNAS)
+            ).encode('utf-8'))
+            for batch in batches:
+                sheet.write(''.join(_xlsx_row(row) for row in batch).encode('utf-8'))
+                yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+def export_products(formato, tamanho_lote=TAMANHO_LOTE):
+    """Return a generator of encoded chunks for the whole catalog"""
+    batches = iter_product_rows(tamanho_lote)
+    if formato == 'jsonl':
+        return export_jsonl(batches)
+    if formato == 'xlsx':
+        return export_xlsx(batches)
+    if formato == 'csv':
+        return export_csv(batches)
+    raise ValueError(f'Formato não suportado: {formato}')
@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, BooleanField, IntegerField, DecimalField, TextAreaField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, ValidationError
 from models import Produto
@@ -43,3 +44,9 @@ class ProdutoForm(FlaskForm):
         if produto:
             if self.produto_id is None or produto.id != self.produto_id:
                 raise ValidationError('SKU já existe. Use um SKU único.')
+
+class ImportarProdutosForm(FlaskForm):
+    arquivo = FileField('Arquivo', validators=[
+        FileRequired(message='Arquivo é obrigatório'),
+        FileAllowed(['csv', 'jsonl', 'ndjson'], message='Use um arquivo CSV ou JSONL')
+    ])
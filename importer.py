@@ -0,0 +1,298 @@
+"""
+Streaming bulk product import.
+
+Reads CSV or JSONL one line at a time, validates rows in chunks and upserts each
+chunk on the unique `sku` column with a multi-row `INSERT ... ON CONFLICT`.
+Invalid rows are reported individually and never abort the rest of the file;
+memory use depends on the chunk size, not on the file size. Uploads are read
+as UTF-8, or as cp1252 (what Excel saves in Brazilian Portuguese) when the
+start of the file is not valid UTF-8.
+"""
+
+import codecs
+import csv
+import io
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from models import Produto
+from inventory_summary import record_changes, stamp
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ('nome', 'sku', 'descricao', 'quantidade', 'preco_venda')
+TAMANHO_LOTE = 1000
+MAX_ERROS_REPORTADOS = 1000
+FORMATOS = ('csv', 'jsonl')
+# Bytes inspected to choose the text encoding
+AMOSTRA_CODIFICACAO = 64 * 1024
+
+
+class ImportResult:
+    """Counters and per-row errors of one import run"""
+
+    def __init__(self):
+        self.lidos = 0
+        self.inseridos = 0
+        self.atualizados = 0
+        self.total_erros = 0
+        self.erros = []
+
+    def add_error(self, linha, sku, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_REPORTADOS:
+            self.erros.append({'linha': linha, 'sku': sku, 'erro': mensagem})
+
+    def to_dict(self):
+        return {
+            'lidos': self.lidos,
+            'inseridos': self.inseridos,
+            'atualizados': self.atualizados,
+            'total_erros': self.total_erros,
+            'erros': self.erros,
+        }
+
+
+def detect_format(filename):
+    """Guess the file format from its extension"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_csv(stream):
+    """Yield (line number, dict) from a text stream, detecting ',' or ';'"""
+    header = stream.readline()
+    if not header:
+        return
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    fields = [f.strip().lower() for f in next(csv.reader([header], delimiter=delimiter))]
+    for linha, values in enumerate(csv.reader(stream, delimiter=delimiter), start=2):
+        if not values:
+            continue
+        yield linha, dict(zip(fields, values))
+
+
+def iter_jsonl(stream):
+    """Yield (line number, dict) from a JSON Lines text stream"""
+    for linha, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield linha, e
+            continue
+        yield linha, data if isinstance(data, dict) else ValueError('linha não é um objeto JSON')
+
+
+def _parse_decimal(value):
+    if isinstance(value, str):
+        value = value.strip()
+        # Brazilian format: 1.299,90
+        if ',' in value:
+            value = value.replace('.', '').replace(',', '.')
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def validate_row(data):
+    """Return a normalized row dict, or raise ValueError with the reason"""
+    if isinstance(data, Exception):
+        raise ValueError(f'JSON inválido: {data}')
+
+    nome = str(data.get('nome') or '').strip()
+    sku = str(data.get('sku') or '').strip()
+    descricao = str(data.get('descricao') or '').strip() or None
+
+    if not 2 <= len(nome) <= 100:
+        raise ValueError('Nome deve ter entre 2 e 100 caracteres')
+    if not 2 <= len(sku) <= 50:
+        raise ValueError('SKU deve ter entre 2 e 50 caracteres')
+    if descricao and len(descricao) > 500:
+        raise ValueError('Descrição deve ter no máximo 500 caracteres')
+
+    try:
+        quantidade = int(str(data.get('quantidade', '')).strip())
+    except ValueError:
+        raise ValueError('Quantidade inválida')
+    if quantidade < 0:
+        raise ValueError('Quantidade deve ser maior ou igual a 0')
+
+    try:
+        preco_venda = _parse_decimal(data.get('preco_venda', ''))
+    except (InvalidOperation, ValueError):
+        raise ValueError('Preço de venda inválido')
+    if preco_venda < Decimal('0.01'):
+        raise ValueError('Preço deve ser maior que 0')
+    if preco_venda >= Decimal('100000000'):
+        raise ValueError('Preço deve ser menor que 100.000.000,00')
+
+    return {
+        'nome': nome,
+        'sku': sku,
+        'descricao': descricao,
+        'quantidade': quantidade,
+        'preco_venda': preco_venda,
+    }
+
+
+def _insert_statement(dialect):
+    """Multi-row INSERT for the dialect, stamping the rows it writes"""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(Produto.__table__).values(versao=stamp())
+
+
+def _lock_existing(skus):
+    """SKU -> (quantidade, preco_venda) of the rows that exist, locked in SKU order"""
+    return {
+        sku: (quantidade, preco_venda)
+        for sku, quantidade, preco_venda in db.session.query(
+            Produto.sku, Produto.quantidade, Produto.preco_venda
+        ).filter(Produto.sku.in_(skus)).order_by(Produto.sku).with_for_update()
+    }
+
+
+def upsert_chunk(rows):
+    """Upsert validated rows in the current transaction.
+
+    Returns (inserted, updated). Existing rows are locked first, new ones are
+    inserted with ON CONFLICT DO NOTHING and counted from what the insert
+    returns, and a SKU another transaction inserted meanwhile is locked and
+    updated instead. Everything goes in SKU order, so concurrent imports of
+    overlapping files wait for each other instead of deadlocking. The
+    dashboard summary is adjusted in the same transaction from the locked
+    previous state.
+    """
+    if not rows:
+        return 0, 0
+    rows = sorted(rows, key=lambda row: row['sku'])
+
+    existing = _lock_existing([row['sku'] for row in rows])
+    stmt = _insert_statement(db.engine.dialect.name)
+    if stmt is not None:
+        inserted = set()
+        pendentes = [row for row in rows if row['sku'] not in existing]
+        while pendentes:
+            inserted.update(db.session.execute(
+                stmt.on_conflict_do_nothing(index_elements=['sku']).returning(Produto.__table__.c.sku),
+                pendentes,
+            ).scalars())
+            perdidos = [row for row in pendentes if row['sku'] not in inserted]
+            existing.update(_lock_existing([row['sku'] for row in perdidos]))
+            # Inserted and deleted again by others in between: try once more
+            pendentes = [row for row in perdidos if row['sku'] not in existing]
+
+        updates = [{f'b_{campo}': valor for campo, valor in row.items()} for row in rows if row['sku'] in existing]
+        if updates:
+            produtos = Produto.__table__
+            db.session.execute(
+                db.update(produtos)
+                .where(produtos.c.sku == db.bindparam('b_sku'))
+                .values(versao=stamp(), **{campo: db.bindparam(f'b_{campo}') for campo in CAMPOS if campo != 'sku'}),
+                updates,
+            )
+    else:
+        inserted = {row['sku'] for row in rows if row['sku'] not in existing}
+        for row in rows:
+            produto = Produto.query.filter_by(sku=row['sku']).first() or Produto()
+            for campo, valor in row.items():
+                setattr(produto, campo, valor)
+            produto.versao = stamp()
+            db.session.add(produto)
+        db.session.flush()
+
+    record_changes(
+        [(None if row['sku'] in inserted else existing[row['sku']], (row['quantidade'], row['preco_venda']))
+         for row in rows]
+    )
+    return len(inserted), len(rows) - len(inserted)
+
+
+def _flush_chunk(chunk, result):
+    """Write one chunk; on a database error retry its rows one by one"""
+    rows = [row for _, row in chunk.values()]
+    try:
+        inserted, updated = upsert_chunk(rows)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.warning("Lote de importação rejeitado, reprocessando por linha: %s", e)
+        inserted = updated = 0
+        for linha, row in chunk.values():
+            try:
+                i, u = upsert_chunk([row])
+                db.session.commit()
+                inserted += i
+                updated += u
+            except SQLAlchemyError as row_error:
+                db.session.rollback()
+                result.add_error(linha, row['sku'], str(getattr(row_error, 'orig', None) or row_error).strip())
+    result.inseridos += inserted
+    result.atualizados += updated
+
+
+def import_products(stream, formato='csv', tamanho_lote=TAMANHO_LOTE):
+    """Import products from a text stream and return an ImportResult"""
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato não suportado: {formato}')
+
+    result = ImportResult()
+    records = iter_jsonl(stream) if formato == 'jsonl' else iter_csv(stream)
+
+    # SKU -> (line, row); a SKU repeated within a chunk keeps its last line
+    chunk = {}
+    linha = 0
+    try:
+        for linha, data in records:
+            result.lidos += 1
+            try:
+                row = validate_row(data)
+            except ValueError as e:
+                sku = data.get('sku') if isinstance(data, dict) else None
+                result.add_error(linha, sku, str(e))
+                continue
+            chunk[row['sku']] = (linha, row)
+            if len(chunk) >= tamanho_lote:
+                _flush_chunk(chunk, result)
+                chunk = {}
+    except UnicodeDecodeError as e:
+        # Earlier chunks are already committed: import what was read and say where it stopped
+        result.add_error(linha + 1, None, f'Importação interrompida: o arquivo não está em {e.encoding} '
+                                          f'a partir daqui (as linhas anteriores foram importadas)')
+
+    if chunk:
+        _flush_chunk(chunk, result)
+    return result
+
+
+def detect_encoding(amostra):
+    """'utf-8-sig' if the sample is valid UTF-8, else 'cp1252'"""
+    try:
+        # Not final: a multi-byte character cut at the end of the sample is fine
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    return 'utf-8-sig'
+
+
+def open_text(binary_stream):
+    """Wrap an uploaded binary stream for line-by-line text reading"""
+    if binary_stream.seekable():
+        inicio = binary_stream.tell()
+        amostra = binary_stream.read(AMOSTRA_CODIFICACAO)
+        binary_stream.seek(inicio)
+    else:
+        binary_stream = io.BufferedReader(binary_stream, AMOSTRA_CODIFICACAO)
+        amostra = binary_stream.peek(AMOSTRA_CODIFICACAO)
+    return io.TextIOWrapper(binary_stream, encoding=detect_encoding(amostra), newline='')
@@ -2,22 +2,242 @@
 """
 Script para inicializar o banco de dados com dados de exemplo.
 Execute este script para recriar o banco de dados com dados iniciais.
+
+Sem argumentos cria o administrador e 10 produtos escritos à mão. Com
+--produtos N gera um catálogo sintético determinístico (mesma --seed, mesmos
+dados) com nomes, SKUs, descrições, estoques e preços realistas, carregado
+em lotes (COPY no PostgreSQL, executemany nos demais) com memória constante,
+e opcionalmente histórico de movimentações e usuários extras:
+
+    python init_db.py --produtos 1000000 --seed 42 --movimentacoes 500000 --usuarios 20
 """
 
+import argparse
+import csv
+import io
 import os
+import random
 import sys
+import time
+from array import array
+from datetime import datetime, timedelta
 from decimal import Decimal
+from itertools import islice
 
 # Add current directory to path to import our modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db
-from models import Usuario, Produto
+from app import create_app, db
+from models import Usuario, Produto, Movimentacao, LIMITE_ESTOQUE_BAIXO
+from inventory_summary import rebuild_summary
+from search import drop_search_index, ensure_search_index, rebuild_search_index
+
+TAMANHO_LOTE = 10000
+SENHA_USUARIOS = 'usuario'
+PERIODO_MOVIMENTACOES = timedelta(days=365)
+
+# (prefixo do SKU, preço típico, itens, marcas)
+CATEGORIAS = [
+    ('INF', 900, ['Notebook', 'Monitor', 'Teclado Mecânico', 'Mouse Sem Fio', 'SSD NVMe', 'Memória RAM',
+                  'Webcam Full HD', 'Headset', 'Hub USB-C', 'Roteador Wi-Fi'],
+     ['Dell', 'Lenovo', 'Logitech', 'Samsung', 'Kingston', 'Positivo', 'Multilaser', 'TP-Link']),
+    ('ELE', 350, ['Liquidificador', 'Cafeteira Elétrica', 'Air Fryer', 'Micro-ondas', 'Ventilador de Coluna',
+                  'Ferro de Passar', 'Aspirador de Pó', 'Sanduicheira'],
+     ['Mondial', 'Britânia', 'Philco', 'Electrolux', 'Arno', 'Oster', 'Cadence']),
+    ('FER', 280, ['Furadeira de Impacto', 'Parafusadeira', 'Jogo de Chaves', 'Serra Tico-Tico', 'Trena',
+                  'Esmerilhadeira', 'Alicate Universal', 'Nível a Laser'],
+     ['Bosch', 'Makita', 'Tramontina', 'Vonder', 'Black+Decker', 'Stanley']),
+    ('MOV', 650, ['Cadeira de Escritório', 'Mesa para Computador', 'Estante', 'Luminária de Mesa',
+                  'Gaveteiro', 'Armário Multiuso'],
+     ['Flexform', 'Cavaletti', 'Madesa', 'Politorno', 'Kappesberg']),
+    ('PAP', 25, ['Caderno Universitário', 'Caneta Esferográfica', 'Resma de Papel A4', 'Grampeador',
+                 'Agenda', 'Marca-texto', 'Pasta Catálogo'],
+     ['Tilibra', 'BIC', 'Chamex', 'Faber-Castell', 'Pilot', 'Foroni']),
+    ('CAS', 120, ['Jogo de Panelas', 'Garrafa Térmica', 'Toalha de Banho', 'Jogo de Cama', 'Faqueiro',
+                  'Pote Hermético', 'Tábua de Corte'],
+     ['Tramontina', 'Stanley', 'Karsten', 'Santista', 'Electrolux', 'Sanremo']),
+]
+ATRIBUTOS = ['Preto', 'Branco', 'Cinza', 'Azul', 'Vermelho', 'Inox', 'Bivolt', '110V', '220V', 'Compacto',
+             'Profissional', 'Premium', 'Slim', 'Kit com 2', 'Kit com 3', 'Edição Especial']
+FRASES = [
+    'Garantia de {meses} meses pelo fabricante.',
+    'Ideal para uso doméstico e profissional.',
+    'Acabamento resistente e fácil de limpar.',
+    'Embalagem com {unidades} unidade(s).',
+    'Produto com nota fiscal e certificação Inmetro.',
+    'Compatível com os principais modelos do mercado.',
+    'Peso aproximado de {peso} kg.',
+    'Dimensões compactas, cabe em qualquer ambiente.',
+]
+CENTAVOS = ('90', '99', '00', '49')
+
+
+def _lotes(linhas, tamanho):
+    linhas = iter(linhas)
+    while lote := list(islice(linhas, tamanho)):
+        yield lote
+
+
+def _estoque(rng):
+    """Skewed stock: some items out of stock or low, a long tail of large quantities"""
+    sorteio = rng.random()
+    if sorteio < 0.06:
+        return 0
+    if sorteio < 0.20:
+        return rng.randint(1, LIMITE_ESTOQUE_BAIXO)
+    return min(int(rng.paretovariate(1.3) * 8) + LIMITE_ESTOQUE_BAIXO, 10000)
+
+
+def _perfis(produtos, seed):
+    """(categoria, estoque inicial) of each product, from their own random stream"""
+    rng = random.Random(f"{seed}:estoque")
+    for _ in range(produtos):
+        yield rng.randrange(len(CATEGORIAS)), _estoque(rng)
+
+
+def _sku(categoria, produto_id):
+    return f"{CATEGORIAS[categoria][0]}-{produto_id:08d}"
+
+
+def gerar_produtos(produtos, seed, quantidades=None):
+    """Yield (id, nome, sku, descricao, quantidade, preco_venda) for ids 1..produtos.
+
+    `quantidades` replaces the generated stock levels (used when a movement
+    history changes them).
+    """
+    rng = random.Random(f"{seed}:texto")
+    for indice, (categoria, estoque) in enumerate(_perfis(produtos, seed)):
+        produto_id = indice + 1
+        _, preco_base, itens, marcas = CATEGORIAS[categoria]
+        item, marca = rng.choice(itens), rng.choice(marcas)
+        nome = f"{item} {marca} {rng.choice(ATRIBUTOS)} {rng.randint(100, 9999)}"
+        frases = rng.sample(FRASES, 3)
+        descricao = f"{item} {marca}. " + ' '.join(frases).format(
+            meses=rng.choice((3, 6, 12, 24)), unidades=rng.randint(1, 12), peso=rng.randint(1, 300) / 10)
+        preco = max(int(preco_base * rng.lognormvariate(0, 0.7)), 1)
+        yield (produto_id, nome, _sku(categoria, produto_id), descricao,
+               estoque if quantidades is None else quantidades[indice],
+               Decimal(f"{preco}.{rng.choice(CENTAVOS)}"))
+
+
+def gerar_movimentacoes(quantidade, seed, categorias, saldos, usuarios, fim):
+    """Yield (produto_id, sku, quantidade, saldo, motivo, usuario_id, criado_em) in time order.
 
-def init_database():
-    """Initialize database with sample data"""
+    Updates `saldos` in place, so it ends up holding each product's final stock.
+    A few popular products get most of the movements: mostly sales, with a
+    purchase when stock gets near the reorder point.
+    """
+    rng = random.Random(f"{seed}:movimentacoes")
+    produtos = len(saldos)
+    passo = PERIODO_MOVIMENTACOES / quantidade
+    inicio = fim - PERIODO_MOVIMENTACOES
+    for k in range(quantidade):
+        indice = int(produtos * rng.random() ** 3)
+        saldo = saldos[indice]
+        sorteio = rng.random()
+        if sorteio < 0.05:
+            motivo, delta = 'Devolução de cliente', rng.randint(1, 2)
+        elif saldo <= LIMITE_ESTOQUE_BAIXO * 2 and sorteio < 0.6:
+            # Restocked around the reorder point, sold down in between
+            motivo, delta = 'Compra de fornecedor', rng.randint(10, 100)
+        elif saldo > 0:
+            motivo, delta = 'Venda', -min(saldo, rng.randint(1, 5))
+        else:
+            motivo, delta = 'Compra de fornecedor', rng.randint(10, 100)
+        saldos[indice] = saldo + delta
+        yield (indice + 1, _sku(categorias[indice], indice + 1), delta, saldo + delta, motivo,
+               rng.choice(usuarios), inicio + passo * (k + rng.random()))
+
+
+def _carregar(tabela, colunas, linhas, lote):
+    """Insert row tuples in batches: COPY on PostgreSQL, executemany elsewhere"""
+    total = 0
+    inicio = time.time()
+    if db.engine.dialect.name == 'postgresql':
+        raw = db.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            comando = f"COPY {tabela.name} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)"
+            for pedaco in _lotes(linhas, lote):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(pedaco)  # None -> empty field -> NULL
+                buffer.seek(0)
+                cursor.copy_expert(comando, buffer)
+                raw.commit()
+                total += len(pedaco)
+                print(f"   {tabela.name}: {total:,} ({total / (time.time() - inicio):,.0f}/s)")
+        finally:
+            raw.close()
+        return total
+
+    insert = tabela.insert()
+    with db.engine.connect() as connection:
+        for pedaco in _lotes(linhas, lote):
+            connection.execute(insert, [dict(zip(colunas, linha)) for linha in pedaco])
+            connection.commit()
+            total += len(pedaco)
+            print(f"   {tabela.name}: {total:,} ({total / (time.time() - inicio):,.0f}/s)")
+    return total
+
+
+def criar_usuarios(quantidade):
+    """Create usuario1..N@gestokpro.com sharing one password hash; return all user ids"""
+    if quantidade:
+        modelo = Usuario(email='usuario1@gestokpro.com')
+        modelo.set_password(SENHA_USUARIOS)
+        db.session.add(modelo)
+        for i in range(2, quantidade + 1):
+            db.session.add(Usuario(email=f'usuario{i}@gestokpro.com', senha_hash=modelo.senha_hash))
+    db.session.commit()
+    return [usuario_id for (usuario_id,) in db.session.query(Usuario.id).order_by(Usuario.id)]
+
+
+def gerar_catalogo(produtos, seed, movimentacoes=0, usuarios=(), lote=TAMANHO_LOTE):
+    """Bulk-load a synthetic catalog (and movement history) into empty tables"""
+    # Rows would otherwise be indexed for search one at a time
+    with db.engine.begin() as connection:
+        drop_search_index(connection)
+
+    quantidades = None
+    if movimentacoes:
+        # Two passes over the same movement stream: the first only computes the
+        # final stock, so products are written once with the right quantity
+        # before the movements that reference them.
+        categorias = bytearray()
+        iniciais = array('i')
+        for categoria, estoque in _perfis(produtos, seed):
+            categorias.append(categoria)
+            iniciais.append(estoque)
+        quantidades = array('i', iniciais)
+        fim = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        for _ in gerar_movimentacoes(movimentacoes, seed, categorias, quantidades, usuarios, fim):
+            pass
+
+    colunas = ('id', 'nome', 'sku', 'descricao', 'quantidade', 'preco_venda')
+    _carregar(Produto.__table__, colunas, gerar_produtos(produtos, seed, quantidades), lote)
+    if movimentacoes:
+        colunas = ('produto_id', 'sku', 'quantidade', 'saldo', 'motivo', 'usuario_id', 'criado_em')
+        _carregar(Movimentacao.__table__, colunas,
+                  gerar_movimentacoes(movimentacoes, seed, categorias, iniciais, usuarios, fim), lote)
+
+    print("Reconstruindo índice de busca e estatísticas...")
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Explicit ids leave the serial sequence behind
+            connection.exec_driver_sql(
+                "SELECT setval(pg_get_serial_sequence('produtos', 'id'), (SELECT max(id) FROM produtos))")
+            # Creating the GIN indexes on the loaded table is the whole rebuild
+            ensure_search_index(connection)
+        else:
+            rebuild_search_index(connection)
+        connection.exec_driver_sql("ANALYZE")
+
+
+def init_database(produtos=None, seed=42, movimentacoes=0, usuarios=0, lote=TAMANHO_LOTE):
+    """Initialize database with sample data, or a generated catalog of `produtos` products"""
     print("Inicializando banco de dados...")
     
+    app = create_app()
     with app.app_context():
         # Drop all tables and recreate
         print("Removendo tabelas existentes...")
@@ -35,6 +255,19 @@ def init_database():
         admin.set_password('admin')
         db.session.add(admin)
         
+        if produtos is not None:
+            inicio = time.time()
+            ids_usuarios = criar_usuarios(usuarios)
+            print(f"Gerando {produtos:,} produtos (seed {seed})...")
+            gerar_catalogo(produtos, seed, movimentacoes, ids_usuarios, lote)
+            rebuild_summary()
+            print(f"✅ Banco de dados gerado em {time.time() - inicio:.1f}s!")
+            print(f"\n📦 {produtos:,} produtos, {movimentacoes:,} movimentações, {usuarios} usuários extras")
+            print("👤 Administrador: admin@gestokpro.com / admin")
+            if usuarios:
+                print(f"👥 Usuários: usuario1..{usuarios}@gestokpro.com / {SENHA_USUARIOS}")
+            return
+        
         # Create sample products
         print("Criando produtos de exemplo...")
         produtos_exemplo = [
@@ -114,6 +347,11 @@ def init_database():
             produto = Produto(**produto_data)
             db.session.add(produto)
         
+        db.session.flush()
+        
+        # Build the dashboard summary in the same transaction
+        rebuild_summary(commit=False)
+        
         # Commit all changes
         db.session.commit()
         
@@ -123,7 +361,21 @@ def init_database():
         print("   Email: admin@gestokpro.com")
         print("   Senha: admin")
         print(f"\n📦 {len(produtos_exemplo)} produtos de exemplo criados")
-        print("\n🚀 Você pode agora executar a aplicação com: python app.py")
+        print("\n🚀 Você pode agora executar a aplicação com: python main.py")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--produtos', type=int, help='gera N produtos sintéticos em vez dos 10 de exemplo')
+    parser.add_argument('--seed', type=int, default=42, help='mesma seed, mesmos dados')
+    parser.add_argument('--movimentacoes', type=int, default=0, help='histórico de movimentações a gerar')
+    parser.add_argument('--usuarios', type=int, default=0, help='usuários extras além do administrador')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='linhas por lote de carga')
+    args = parser.parse_args()
+    if args.produtos is None and (args.movimentacoes or args.usuarios):
+        parser.error('--movimentacoes e --usuarios exigem --produtos')
+    if args.movimentacoes and not args.produtos:
+        parser.error('--movimentacoes exige pelo menos um produto')
+    init_database(args.produtos, args.seed, args.movimentacoes, args.usuarios, args.lote)
 
 if __name__ == '__main__':
-    init_database()
+    main()
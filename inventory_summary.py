@@ -0,0 +1,284 @@
+"""
+Incrementally maintained inventory summary.
+
+The dashboard reads the `estoque_resumo` rows instead of aggregating the whole
+`produtos` table. Every product write applies its delta in the same
+transaction, and `rebuild_summary`/`verify_summary` recompute it from scratch
+when drift is suspected. The rows also carry the catalog version that every
+write bumps, which the response cache uses to validate pages.
+
+The summary is striped over FAIXAS rows that `read_summary` adds up: a write
+updates the row of its thread (`_faixa`), which stays locked until it commits,
+so writers only queue behind others that picked the same row instead of behind
+every write in the system. Rebuilds put the totals on row RESUMO_ID and zero
+the rest.
+
+Written products carry a `versao` stamp so the SKU index can fetch only them.
+The stamp is set by the write's own statement (`stamp`) and orders writes
+without a shared counter: on PostgreSQL it is the writing transaction's id,
+and `horizon` is the oldest id whose transaction may still commit; on SQLite,
+which runs one writer at a time, it is simply the next number.
+"""
+
+import os
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from app import db
+from models import Produto, EstoqueResumo, LIMITE_ESTOQUE_BAIXO
+
+RESUMO_ID = 1
+# Summary rows; more rows, fewer writers waiting on each other
+FAIXAS = 16
+
+SUMMARY_FIELDS = (
+    'total_produtos',
+    'total_estoque',
+    'valor_total_estoque',
+    'produtos_baixo_estoque',
+)
+
+
+def snapshot(produto):
+    """Return the (quantidade, preco_venda) pair the summary depends on"""
+    return (produto.quantidade, produto.preco_venda)
+
+
+def _contribution(state):
+    """Contribution of one product state to each summary field"""
+    if state is None:
+        return (0, 0, Decimal('0'), 0)
+    quantidade, preco_venda = state
+    quantidade = quantidade or 0
+    valor = Decimal(quantidade) * Decimal(str(preco_venda or 0))
+    baixo = 1 if quantidade <= LIMITE_ESTOQUE_BAIXO else 0
+    return (1, quantidade, valor, baixo)
+
+
+def stamp():
+    """SQL value of `produtos.versao` for a row being written"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.txid_current()
+    ultimo = Produto.__table__.alias('ultimo')
+    return db.select(db.func.coalesce(db.func.max(ultimo.c.versao), 0) + 1).scalar_subquery()
+
+
+def horizon():
+    """SQL value below which every `produtos.versao` stamp is already committed (or never will be)"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.txid_snapshot_xmin(db.func.txid_current_snapshot())
+    return stamp()
+
+
+def record_change(before=None, after=None):
+    """Apply the summary delta between two product states.
+
+    Pass `before=None` for an insert and `after=None` for a delete. Must be
+    called inside the transaction that performs the product write, after it.
+    """
+    record_changes([(before, after)])
+
+
+def record_changes(changes):
+    """Apply the summed delta of an iterable of (before, after) states"""
+    delta = [0, 0, Decimal('0'), 0]
+    exclusoes = 0
+    for before, after in changes:
+        old = _contribution(before)
+        new = _contribution(after)
+        for i in range(len(delta)):
+            delta[i] += new[i] - old[i]
+        if before is not None and after is None:
+            exclusoes += 1
+    apply_delta(*delta, geracao=1 if exclusoes else 0)
+
+
+def _faixa():
+    """Summary row this thread writes to.
+
+    Fixed per process and thread, so a transaction never holds two of them and
+    concurrent writers spread over FAIXAS rows instead of queueing on one.
+    """
+    return hash((os.getpid(), threading.get_ident())) % FAIXAS + 1
+
+
+def apply_delta(produtos=0, estoque=0, valor=0, baixo=0, geracao=0):
+    """Add the given deltas to this thread's summary row and bump its version"""
+    result = db.session.execute(
+        db.update(EstoqueResumo)
+        .where(EstoqueResumo.id == _faixa())
+        .values(
+            total_produtos=EstoqueResumo.total_produtos + produtos,
+            total_estoque=EstoqueResumo.total_estoque + estoque,
+            valor_total_estoque=EstoqueResumo.valor_total_estoque + valor,
+            produtos_baixo_estoque=EstoqueResumo.produtos_baixo_estoque + baixo,
+            versao=EstoqueResumo.versao + 1,
+            geracao=EstoqueResumo.geracao + geracao,
+            atualizado_em=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.info['catalogo_alterado'] = True
+
+    # No summary rows yet: build them from the table, which already holds this
+    # write. If a concurrent first write created them meanwhile (or only the
+    # other rows were missing), this delta goes to its row like any other.
+    if result.rowcount == 0 and not _create_summary():
+        apply_delta(produtos, estoque, valor, baixo, geracao)
+
+
+def movement_delta(quantidade, preco_venda, delta):
+    """UPDATE of this thread's summary row for a stock movement, as a CTE.
+
+    `quantidade` and `preco_venda` are the moved row's new values, columns of
+    the CTE that moved it, so on PostgreSQL the movement, its ledger entry and
+    this delta are one statement. The CTE returns the row it updated: nothing
+    when the row does not exist yet, and the caller then uses `record_change`.
+    """
+    resumo = EstoqueResumo.__table__
+
+    def baixo(q):
+        return db.case((q <= LIMITE_ESTOQUE_BAIXO, 1), else_=0)
+
+    db.session.info['catalogo_alterado'] = True
+    return (
+        db.update(resumo)
+        .where(resumo.c.id == _faixa())
+        .values(
+            total_estoque=resumo.c.total_estoque + delta,
+            valor_total_estoque=resumo.c.valor_total_estoque + preco_venda * delta,
+            produtos_baixo_estoque=resumo.c.produtos_baixo_estoque + baixo(quantidade) - baixo(quantidade - delta),
+            versao=resumo.c.versao + 1,
+            atualizado_em=datetime.utcnow(),
+        )
+        .returning(resumo.c.id)
+        .cte('resumo')
+    )
+
+
+def _create_summary():
+    """Insert the summary rows from `produtos` unless they exist; True if the
+    totals row was inserted here"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        rebuild_summary(commit=False)
+        return True
+
+    agora = datetime.utcnow()
+    inserted = db.session.execute(insert(EstoqueResumo).values(
+        id=RESUMO_ID, versao=1, geracao=0, atualizado_em=agora, **compute_summary()
+    ).on_conflict_do_nothing(index_elements=['id'])).rowcount == 1
+    db.session.execute(insert(EstoqueResumo).values([
+        dict(id=faixa, versao=0, geracao=0, atualizado_em=agora, **dict.fromkeys(SUMMARY_FIELDS, 0))
+        for faixa in range(1, FAIXAS + 1) if faixa != RESUMO_ID
+    ]).on_conflict_do_nothing(index_elements=['id']))
+    return inserted
+
+
+def compute_summary():
+    """Aggregate the summary fields from `produtos` in a single scan"""
+    valor = db.func.sum(Produto.quantidade * Produto.preco_venda)
+    baixo = db.func.sum(
+        db.case((Produto.quantidade <= LIMITE_ESTOQUE_BAIXO, 1), else_=0)
+    )
+    row = db.session.query(
+        db.func.count(Produto.id),
+        db.func.coalesce(db.func.sum(Produto.quantidade), 0),
+        db.func.coalesce(valor, 0),
+        db.func.coalesce(baixo, 0),
+    ).one()
+
+    return {
+        'total_produtos': int(row[0]),
+        'total_estoque': int(row[1]),
+        'valor_total_estoque': Decimal(str(row[2])).quantize(Decimal('0.01')),
+        'produtos_baixo_estoque': int(row[3]),
+    }
+
+
+def _soma(coluna):
+    return db.cast(db.func.sum(coluna), db.BigInteger).label(coluna.key)
+
+
+# Built once: the dashboard reads it on every request
+_LEITURA = db.select(
+    _soma(EstoqueResumo.total_produtos),
+    _soma(EstoqueResumo.total_estoque),
+    db.func.sum(EstoqueResumo.valor_total_estoque).label('valor_total_estoque'),
+    _soma(EstoqueResumo.produtos_baixo_estoque),
+    _soma(EstoqueResumo.versao),
+    _soma(EstoqueResumo.geracao),
+    db.func.max(EstoqueResumo.atualizado_em).label('atualizado_em'),
+)
+
+
+def read_summary():
+    """The summary rows added up, or None before the first build.
+
+    The row has the SUMMARY_FIELDS plus `versao` (the catalog version),
+    `geracao` and `atualizado_em`.
+    """
+    row = db.session.execute(_LEITURA).one()
+    return row if row.versao is not None else None
+
+
+def rebuild_summary(commit=True):
+    """Recompute the summary from `produtos` into the totals row and zero the others"""
+    # Locked before the scan: writers still holding a product row add their
+    # delta after this commits, on top of totals that do not include them
+    linhas = {
+        resumo.id: resumo
+        for resumo in EstoqueResumo.query.order_by(EstoqueResumo.id).with_for_update()
+    }
+    totals = compute_summary()
+    for faixa in range(1, FAIXAS + 1):
+        if faixa not in linhas:
+            linhas[faixa] = EstoqueResumo(id=faixa, versao=0, geracao=0)
+            db.session.add(linhas[faixa])
+    agora = datetime.utcnow()
+    for faixa, resumo in linhas.items():
+        for field in SUMMARY_FIELDS:
+            setattr(resumo, field, totals[field] if faixa == RESUMO_ID else 0)
+        resumo.atualizado_em = agora
+    totais = linhas[RESUMO_ID]
+    totais.versao = (totais.versao or 0) + 1
+    # Whatever changed the table behind the summary's back is invisible to the row versions
+    totais.geracao = (totais.geracao or 0) + 1
+    db.session.info['catalogo_alterado'] = True
+
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return read_summary()
+
+
+def verify_summary():
+    """Compare the stored summary with a fresh aggregate.
+
+    Returns a dict of `field -> (stored, actual)` for every field that drifted;
+    an empty dict means the summary is consistent.
+    """
+    totals = compute_summary()
+    resumo = read_summary()
+
+    drift = {}
+    for field in SUMMARY_FIELDS:
+        stored = getattr(resumo, field) if resumo is not None else None
+        actual = totals[field]
+        if stored is None or Decimal(str(stored)) != Decimal(str(actual)):
+            drift[field] = (stored, actual)
+    return drift
+
+
+def get_summary():
+    """Return the summary, building it on first use"""
+    resumo = read_summary()
+    if resumo is None:
+        resumo = rebuild_summary()
+    return resumo
@@ -0,0 +1,164 @@
+"""
+Structured, non-blocking logging.
+
+The thread that logs a record (a request, for the access log and for any
+application warning) only puts it on a bounded in-memory queue; one listener
+thread per process formats it as a JSON line (or plain text, for local
+development) and writes it to stderr. When the queue is full the record is
+dropped and counted in `gestokpro_log_records_dropped_total` on /metrics,
+instead of making requests wait on a slow terminal or log collector.
+
+Levels come from the environment: LOG_LEVEL for everything, LOG_LEVELS for
+per-logger overrides ("sqlalchemy=WARNING,werkzeug=INFO").
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+from flask import g, request
+from flask_login import current_user
+
+import metrics
+
+ACCESS_LOGGER = 'gestokpro.access'
+FORMATO_TEXTO = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Everything else on a record came from `extra=`
+_CAMPOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg and the `extra` fields"""
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for chave, valor in record.__dict__.items():
+            if chave not in _CAMPOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados['exc'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            dados['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(dados, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without ever blocking; count the records that do not fit"""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Freeze the message (arguments may change later); formatting and
+        # tracebacks are left to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+            metrics.count_log_dropped(record.levelname)
+
+
+def _parse_levels(texto):
+    """'a=WARNING,b.c=debug' -> [('a', 'WARNING'), ('b.c', 'DEBUG')]"""
+    niveis = []
+    for item in filter(None, (parte.strip() for parte in texto.split(','))):
+        nome, _, nivel = item.partition('=')
+        niveis.append((nome.strip(), nivel.strip().upper()))
+    return niveis
+
+
+class LogPipeline:
+    """Root queue handler plus the listener thread of this process"""
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self._saida = None
+        self._tamanho = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.stop)
+
+    def configure(self, config):
+        raiz = logging.getLogger()
+        self.stop()
+        if self.handler is not None:
+            raiz.removeHandler(self.handler)
+
+        self._tamanho = config['LOG_QUEUE_SIZE']
+        self._saida = logging.StreamHandler(sys.stderr)
+        if config['LOG_FORMAT'] == 'json':
+            self._saida.setFormatter(JsonFormatter())
+        else:
+            self._saida.setFormatter(logging.Formatter(FORMATO_TEXTO))
+        self.handler = DroppingQueueHandler(queue.Queue(self._tamanho))
+        raiz.addHandler(self.handler)
+
+        raiz.setLevel(config['LOG_LEVEL'])
+        for nome, nivel in _parse_levels(config['LOG_LEVELS']):
+            logging.getLogger(nome).setLevel(nivel)
+        access_logger.disabled = not config['LOG_ACCESS']
+        self.start()
+
+    def start(self):
+        self.listener = logging.handlers.QueueListener(self.handler.queue, self._saida)
+        self.listener.start()
+
+    def stop(self):
+        """Write out what is still queued and stop the listener"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _after_fork(self):
+        # The parent's listener thread does not exist in a forked worker, and
+        # its queue may have been forked with a lock held
+        if self.handler is not None:
+            self.handler.queue = queue.Queue(self._tamanho)
+            self.handler.descartados = 0
+            self.start()
+
+
+pipeline = LogPipeline()
+configure = pipeline.configure
+
+
+def log_request(response, elapsed, route):
+    """Access log entry; call before query_stats.finish_request consumes the SQL totals"""
+    if access_logger.disabled or not access_logger.isEnabledFor(logging.INFO):
+        return
+    stats = g.get('sql_stats')
+    duracao_ms = round(elapsed * 1000, 2)
+    access_logger.info('%s %s %s %.2fms', request.method, request.full_path.rstrip('?'),
+                       response.status_code, duracao_ms, extra={
+                           'method': request.method,
+                           'path': request.path,
+                           'route': route,
+                           'status': response.status_code,
+                           'duration_ms': duracao_ms,
+                           'db_ms': round(stats.db_time * 1000, 2) if stats is not None else None,
+                           'db_queries': stats.count if stats is not None else None,
+                           'user_id': current_user.id if current_user.is_authenticated else None,
+                           'remote_addr': request.remote_addr,
+                           'bytes': response.content_length,
+                       })
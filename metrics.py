@@ -0,0 +1,273 @@
+"""
+Request metrics in Prometheus text format, aggregated across gunicorn workers.
+
+Each worker process writes its counters to its own mmap-backed file in
+METRICS_DIR (one writer per file, no cross-process locking); `/metrics`
+reads every file in the directory and sums the values. Counters and
+histograms of workers that have exited are kept, so totals do not go
+backwards when gunicorn recycles a worker; gauges only count live workers.
+Point METRICS_DIR at an empty directory per deployment (or run
+`flask metricas limpar` before starting gunicorn) to reset the totals.
+"""
+
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+
+PREFIXO = 'gestokpro_'
+DURACAO = PREFIXO + 'http_request_duration_seconds'
+EM_ANDAMENTO = PREFIXO + 'http_requests_in_progress'
+EXCECOES = PREFIXO + 'http_request_exceptions_total'
+LOGS_DESCARTADOS = PREFIXO + 'log_records_dropped_total'
+CACHE_USUARIOS = PREFIXO + 'user_cache_lookups_total'
+
+# Upper bounds in seconds (the +Inf bucket is the count)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+DESCRICOES = {
+    DURACAO: ('histogram', 'HTTP request latency by route, method and status'),
+    EM_ANDAMENTO: ('gauge', 'HTTP requests currently being served'),
+    EXCECOES: ('counter', 'Unhandled exceptions raised by views'),
+    LOGS_DESCARTADOS: ('counter', 'Log records dropped because the log queue was full'),
+    CACHE_USUARIOS: ('counter', 'Logged-in user identity lookups by result (hit or miss)'),
+}
+GAUGES = {EM_ANDAMENTO}
+
+TAMANHO_INICIAL = 64 * 1024
+_CABECALHO = struct.Struct('q')  # bytes in use, written last
+
+
+def _pad(tamanho):
+    # Keeps every value 8-byte aligned: 4-byte length + key + padding
+    return tamanho + (8 - (4 + tamanho) % 8) % 8
+
+
+def _parse(data):
+    """Yield (key, value, value offset) for every entry in a metrics file"""
+    usado = _CABECALHO.unpack_from(data, 0)[0] if len(data) >= 8 else 0
+    pos = 8
+    while pos < usado:
+        tamanho = struct.unpack_from('i', data, pos)[0]
+        chave = bytes(data[pos + 4:pos + 4 + tamanho]).decode('utf-8')
+        pos += 4 + _pad(tamanho)
+        yield chave, struct.unpack_from('d', data, pos)[0], pos
+        pos += 8
+
+
+class MetricsFile:
+    """Append-only key -> float64 table in a memory-mapped file, owned by one process"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(TAMANHO_INICIAL)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._usado = _CABECALHO.unpack_from(self._mmap, 0)[0] or 8
+        # A recycled pid reuses its file and keeps adding to it
+        self._posicoes = {chave: pos for chave, _, pos in _parse(self._mmap)}
+
+    def _criar(self, chave):
+        codificada = chave.encode('utf-8')
+        entrada = struct.pack('i', len(codificada)) + codificada.ljust(_pad(len(codificada)), b' ')
+        necessario = self._usado + len(entrada) + 8
+        if necessario > len(self._mmap):
+            tamanho = len(self._mmap)
+            while tamanho < necessario:
+                tamanho *= 2
+            self._mmap.close()
+            self._file.truncate(tamanho)
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._mmap[self._usado:self._usado + len(entrada)] = entrada
+        pos = self._usado + len(entrada)
+        struct.pack_into('d', self._mmap, pos, 0.0)
+        self._usado = pos + 8
+        # Readers only look up to the header, so the entry is complete before it is visible
+        _CABECALHO.pack_into(self._mmap, 0, self._usado)
+        self._posicoes[chave] = pos
+        return pos
+
+    def add(self, chave, valor):
+        with self._lock:
+            pos = self._posicoes.get(chave)
+            if pos is None:
+                pos = self._criar(chave)
+            atual = struct.unpack_from('d', self._mmap, pos)[0]
+            struct.pack_into('d', self._mmap, pos, atual + valor)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+class Registry:
+    """Per-process writer plus the cross-process reader for `/metrics`"""
+
+    def __init__(self):
+        self.pasta = None
+        self._arquivo = None
+        self._chaves = {}  # encoded keys; labels are bounded (route rules, methods, statuses)
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def configure(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+        self.pasta = pasta
+        self._after_fork()
+
+    def _after_fork(self):
+        # The child must not write into its parent's file
+        self._arquivo = None
+
+    def _file(self):
+        if self._arquivo is None:
+            with self._lock:
+                if self._arquivo is None:
+                    caminho = os.path.join(self.pasta, f'metrics_{os.getpid()}.db')
+                    self._arquivo = MetricsFile(caminho)
+        return self._arquivo
+
+    def add(self, nome, labels, valor=1.0):
+        if self.pasta is None:
+            return
+        cache = (nome, tuple(labels.items()))
+        chave = self._chaves.get(cache)
+        if chave is None:
+            chave = self._chaves[cache] = json.dumps([nome, labels], separators=(',', ':'))
+        self._file().add(chave, valor)
+
+    def collect(self):
+        """Sum every worker file: {(name, labels tuple): value}"""
+        totais = {}
+        for caminho in glob.glob(os.path.join(self.pasta, 'metrics_*.db')):
+            pid = int(os.path.basename(caminho)[len('metrics_'):-len('.db')])
+            vivo = _pid_alive(pid)
+            try:
+                with open(caminho, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            for chave, valor, _ in _parse(data):
+                nome, labels = json.loads(chave)
+                if nome in GAUGES and not vivo:
+                    continue
+                item = (nome, tuple(sorted(labels.items())))
+                totais[item] = totais.get(item, 0.0) + valor
+        return totais
+
+    def clear(self):
+        for caminho in glob.glob(os.path.join(self.pasta, 'metrics_*.db')):
+            os.remove(caminho)
+        self._after_fork()
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return False  # os.kill would terminate it; the dev server is single-process
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+configure = registry.configure
+
+
+def observe_request(method, route, status, segundos):
+    labels = {'method': method, 'route': route, 'status': str(status)}
+    registry.add(DURACAO + '_count', labels)
+    registry.add(DURACAO + '_sum', labels, segundos)
+    for limite in BUCKETS:
+        if segundos <= limite:
+            registry.add(DURACAO + '_bucket', dict(labels, le=_formatar(limite)))
+            break
+
+
+def request_started(method):
+    registry.add(EM_ANDAMENTO, {'method': method}, 1.0)
+
+
+def request_finished(method):
+    registry.add(EM_ANDAMENTO, {'method': method}, -1.0)
+
+
+def count_exception(method, route, excecao):
+    registry.add(EXCECOES, {'method': method, 'route': route, 'exception': excecao})
+
+
+def count_log_dropped(level):
+    registry.add(LOGS_DESCARTADOS, {'level': level})
+
+
+def count_user_cache(resultado):
+    registry.add(CACHE_USUARIOS, {'result': resultado})
+
+
+def _formatar(valor):
+    if math.isinf(valor):
+        return '+Inf'
+    return repr(float(valor))
+
+
+def _escape(valor):
+    return str(valor).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pares) + '}'
+
+
+def _amostra(nome, pares, valor):
+    texto = repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+    return f'{nome}{_labels(pares)} {texto}'
+
+
+def render():
+    """All metrics in Prometheus text exposition format (version 0.0.4)"""
+    totais = registry.collect()
+    linhas = []
+
+    # Histogram: stored buckets are per-bucket counts; exposition is cumulative
+    series = {}
+    for (nome, pares), valor in totais.items():
+        if nome.startswith(DURACAO):
+            sem_le = tuple(p for p in pares if p[0] != 'le')
+            campos = series.setdefault(sem_le, {'buckets': {}, 'sum': 0.0, 'count': 0.0})
+            if nome.endswith('_bucket'):
+                campos['buckets'][dict(pares)['le']] = valor
+            elif nome.endswith('_sum'):
+                campos['sum'] = valor
+            else:
+                campos['count'] = valor
+    tipo, ajuda = DESCRICOES[DURACAO]
+    linhas += [f'# HELP {DURACAO} {ajuda}', f'# TYPE {DURACAO} {tipo}']
+    for pares in sorted(series):
+        campos = series[pares]
+        acumulado = 0.0
+        for limite in BUCKETS:
+            le = _formatar(limite)
+            acumulado += campos['buckets'].get(le, 0.0)
+            linhas.append(_amostra(DURACAO + '_bucket', pares + (('le', le),), acumulado))
+        linhas.append(_amostra(DURACAO + '_bucket', pares + (('le', '+Inf'),), campos['count']))
+        linhas.append(_amostra(DURACAO + '_sum', pares, campos['sum']))
+        linhas.append(_amostra(DURACAO + '_count', pares, campos['count']))
+
+    for nome in (EM_ANDAMENTO, EXCECOES, LOGS_DESCARTADOS, CACHE_USUARIOS):
+        tipo, ajuda = DESCRICOES[nome]
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+        for (metrica, pares), valor in sorted(totais.items()):
+            if metrica == nome:
+                linhas.append(_amostra(nome, pares, valor))
+    return '\n'.join(linhas) + '\n'
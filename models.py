@@ -1,7 +1,20 @@
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from passwords import hash_password, verify_password, needs_rehash
+
+# Products at or below this quantity count as low stock
+LIMITE_ESTOQUE_BAIXO = 5
+
+def status_estoque_de(quantidade):
+    """Return the stock status label for a quantity"""
+    if quantidade == 0:
+        return 'Sem estoque'
+    elif quantidade <= LIMITE_ESTOQUE_BAIXO:
+        return 'Estoque baixo'
+    else:
+        return 'Em estoque'
 
 class Usuario(UserMixin, db.Model):
     __tablename__ = 'usuarios'
@@ -13,17 +26,25 @@ class Usuario(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.senha_hash = generate_password_hash(password)
+        self.senha_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.senha_hash, password)
+        return verify_password(self.senha_hash, password)
+    
+    def password_needs_rehash(self):
+        """Check if the hash uses outdated parameters"""
+        return needs_rehash(self.senha_hash)
     
     def __repr__(self):
         return f'<Usuario {self.email}>'
 
 class Produto(db.Model):
     __tablename__ = 'produtos'
+    __table_args__ = (
+        # Keyset pagination by name
+        db.Index('ix_produtos_nome_id', 'nome', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -31,6 +52,9 @@ class Produto(db.Model):
     descricao = db.Column(db.Text)
     quantidade = db.Column(db.Integer, nullable=False, default=0)
     preco_venda = db.Column(db.Numeric(10, 2), nullable=False)
+    # Stamp of the last write to this row (inventory_summary.stamp); the SKU
+    # index reads the rows written since it last caught up
+    versao = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
     
     def __repr__(self):
         return f'<Produto {self.nome}>'
@@ -43,9 +67,68 @@ class Produto(db.Model):
     @property
     def status_estoque(self):
         """Return stock status"""
-        if self.quantidade == 0:
-            return 'Sem estoque'
-        elif self.quantidade <= 5:
-            return 'Estoque baixo'
-        else:
-            return 'Em estoque'
+        return status_estoque_de(self.quantidade)
+
+class EstoqueResumo(db.Model):
+    """Inventory summary kept in sync by the product write paths, striped over
+    inventory_summary.FAIXAS rows that are added up on read"""
+    __tablename__ = 'estoque_resumo'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    total_produtos = db.Column(db.Integer, nullable=False, default=0)
+    total_estoque = db.Column(db.BigInteger, nullable=False, default=0)
+    valor_total_estoque = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    produtos_baixo_estoque = db.Column(db.Integer, nullable=False, default=0)
+    versao = db.Column(db.BigInteger, nullable=False, default=0)
+    # Bumped by deletes and rebuilds, changes the per-row versions cannot show
+    geracao = db.Column(db.BigInteger, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<EstoqueResumo {self.total_produtos} produtos>'
+
+class Movimentacao(db.Model):
+    """Append-only ledger of stock movements"""
+    __tablename__ = 'movimentacoes'
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id', ondelete='SET NULL'), index=True)
+    sku = db.Column(db.String(50), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)
+    saldo = db.Column(db.Integer, nullable=False)
+    motivo = db.Column(db.String(200))
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='SET NULL'))
+    lote_id = db.Column(db.Integer, db.ForeignKey('movimentacao_lotes.id', ondelete='SET NULL'))
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<Movimentacao {self.sku} {self.quantidade:+d}>'
+
+class LoteMovimentacao(db.Model):
+    """Batch of movements, keyed by the client's idempotency key"""
+    __tablename__ = 'movimentacao_lotes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    chave = db.Column(db.String(100), unique=True, index=True)
+    payload_hash = db.Column(db.String(64), nullable=False)
+    resposta = db.Column(db.Text)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='SET NULL'))
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<LoteMovimentacao {self.chave}>'
+
+class TokenApi(db.Model):
+    """Bearer token for the JSON API; only its SHA-256 digest is stored"""
+    __tablename__ = 'api_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
+    nome = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    usuario = db.relationship('Usuario')
+    
+    def __repr__(self):
+        return f'<TokenApi {self.nome}>'
@@ -0,0 +1,293 @@
+"""
+Atomic stock movements.
+
+A movement is a single conditional `UPDATE ... SET quantidade = quantidade + :delta
+WHERE id = :id AND quantidade + :delta >= 0 RETURNING ...`, so concurrent
+movements never lose updates and no row lock is held across the request. Each
+applied movement is appended to the `movimentacoes` ledger; on PostgreSQL the
+update, the ledger insert and the summary delta travel as one data-modifying
+CTE, and the new version stamp is set by the update itself.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import Produto, Movimentacao, LoteMovimentacao
+from inventory_summary import record_change, record_changes, movement_delta, stamp
+
+
+class ProdutoNaoEncontrado(Exception):
+    pass
+
+
+class EstoqueInsuficiente(Exception):
+    pass
+
+
+class ChaveIdempotenciaConflito(Exception):
+    """The idempotency key was already used with a different payload"""
+
+
+def _conditional_update(produto_id, delta):
+    return (
+        db.update(Produto.__table__)
+        .where(Produto.__table__.c.id == produto_id)
+        .where(Produto.__table__.c.quantidade + delta >= 0)
+        .values(quantidade=Produto.__table__.c.quantidade + delta, versao=stamp())
+    )
+
+
+def _apply_postgresql(produto_id, delta, motivo, usuario_id):
+    produtos = Produto.__table__
+    upd = _conditional_update(produto_id, delta).returning(
+        produtos.c.id, produtos.c.sku, produtos.c.quantidade, produtos.c.preco_venda
+    ).cte('upd')
+    ledger = db.insert(Movimentacao.__table__).from_select(
+        ['produto_id', 'sku', 'quantidade', 'saldo', 'motivo', 'usuario_id', 'criado_em'],
+        db.select(
+            upd.c.id, upd.c.sku, db.literal(delta), upd.c.quantidade,
+            db.literal(motivo, db.String), db.literal(usuario_id, db.Integer),
+            db.literal(datetime.utcnow(), db.DateTime),
+        ),
+    ).cte('ledger')
+    resumo = movement_delta(upd.c.quantidade, upd.c.preco_venda, delta)
+    resumido = db.select(db.func.count()).select_from(resumo).scalar_subquery() > 0
+    stmt = db.select(upd.c.quantidade, upd.c.preco_venda, resumido).add_cte(ledger)
+    return db.session.execute(stmt).first()
+
+
+def _apply_generic(produto_id, delta, motivo, usuario_id):
+    produtos = Produto.__table__
+    row = db.session.execute(
+        _conditional_update(produto_id, delta).returning(
+            produtos.c.sku, produtos.c.quantidade, produtos.c.preco_venda
+        )
+    ).first()
+    if row is None:
+        return None
+
+    db.session.execute(db.insert(Movimentacao.__table__).values(
+        produto_id=produto_id,
+        sku=row.sku,
+        quantidade=delta,
+        saldo=row.quantidade,
+        motivo=motivo,
+        usuario_id=usuario_id,
+        criado_em=datetime.utcnow(),
+    ))
+    return row.quantidade, row.preco_venda, False
+
+
+def apply_movement(produto_id, delta, motivo=None, usuario_id=None):
+    """Add `delta` to a product's stock and record it in the ledger.
+
+    Runs in the current transaction and returns the new quantity. Raises
+    ProdutoNaoEncontrado or EstoqueInsuficiente without changing anything.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        row = _apply_postgresql(produto_id, delta, motivo, usuario_id)
+    else:
+        row = _apply_generic(produto_id, delta, motivo, usuario_id)
+
+    if row is None:
+        exists = db.session.query(Produto.id).filter(Produto.id == produto_id).first()
+        if exists is None:
+            raise ProdutoNaoEncontrado(produto_id)
+        raise EstoqueInsuficiente(produto_id)
+
+    quantidade, preco_venda, resumido = row
+    if not resumido:
+        record_change((quantidade - delta, preco_venda), (quantidade, preco_venda))
+    return quantidade
+
+
+def parse_batch_item(data):
+    """Validate one batch item into {'id', 'sku', 'quantidade', 'motivo'}"""
+    if not isinstance(data, dict):
+        raise ValueError('Item deve ser um objeto')
+
+    produto_id = data.get('id')
+    sku = data.get('sku')
+    if produto_id is None and not sku:
+        raise ValueError('Informe sku ou id')
+    if produto_id is not None and (not isinstance(produto_id, int) or isinstance(produto_id, bool)):
+        raise ValueError('id inválido')
+    if sku is not None and not isinstance(sku, str):
+        raise ValueError('sku inválido')
+
+    quantidade = data.get('quantidade')
+    if not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade == 0:
+        raise ValueError('quantidade deve ser um inteiro diferente de zero')
+
+    motivo = data.get('motivo')
+    if motivo is not None:
+        motivo = str(motivo).strip()[:200] or None
+
+    return {'id': produto_id, 'sku': sku, 'quantidade': quantidade, 'motivo': motivo}
+
+
+def _write_deltas(deltas):
+    """Add each product's net delta with one set-based UPDATE"""
+    produtos = Produto.__table__
+    if db.engine.dialect.name == 'postgresql':
+        valores = db.values(
+            db.column('id', db.Integer), db.column('delta', db.Integer), name='v'
+        ).data(list(deltas.items()))
+        db.session.execute(
+            db.update(produtos)
+            .where(produtos.c.id == valores.c.id)
+            .values(quantidade=produtos.c.quantidade + valores.c.delta, versao=stamp())
+        )
+    else:
+        db.session.execute(
+            db.update(produtos)
+            .where(produtos.c.id == db.bindparam('b_id'))
+            .values(quantidade=produtos.c.quantidade + db.bindparam('b_delta'), versao=stamp()),
+            [{'b_id': pid, 'b_delta': delta} for pid, delta in deltas.items()],
+        )
+
+
+def apply_batch(itens, usuario_id=None, lote_id=None):
+    """Apply a list of movements in the current transaction.
+
+    The affected rows are read and locked in one query (in id order, so
+    concurrent batches cannot deadlock), items are checked in request order
+    against the running balances, and the accepted ones are written with one
+    UPDATE plus one multi-row ledger INSERT. Returns one result per item.
+    """
+    produtos = Produto.__table__
+    parsed = []
+    for item in itens:
+        try:
+            parsed.append(parse_batch_item(item))
+        except ValueError as e:
+            parsed.append({'erro': str(e)})
+
+    skus = {item['sku'] for item in parsed if item.get('sku')}
+    ids = {item['id'] for item in parsed if item.get('id') is not None}
+    conditions = []
+    if skus:
+        conditions.append(produtos.c.sku.in_(skus))
+    if ids:
+        conditions.append(produtos.c.id.in_(ids))
+
+    rows = []
+    if conditions:
+        rows = db.session.execute(
+            db.select(produtos.c.id, produtos.c.sku, produtos.c.quantidade, produtos.c.preco_venda)
+            .where(db.or_(*conditions))
+            .order_by(produtos.c.id)
+            .with_for_update()
+        ).all()
+    by_id = {row.id: row for row in rows}
+    id_by_sku = {row.sku: row.id for row in rows}
+    saldos = {row.id: row.quantidade for row in rows}
+
+    agora = datetime.utcnow()
+    resultados = []
+    ledger = []
+    for indice, item in enumerate(parsed):
+        resultado = {'indice': indice}
+        if 'erro' in item:
+            resultado.update(status='invalido', erro=item['erro'])
+            resultados.append(resultado)
+            continue
+
+        pid = item['id'] if item['id'] is not None else id_by_sku.get(item['sku'])
+        if pid not in by_id or (item['sku'] and by_id[pid].sku != item['sku']):
+            resultado.update(status='nao_encontrado', sku=item['sku'], id=item['id'])
+            resultados.append(resultado)
+            continue
+
+        sku = by_id[pid].sku
+        novo_saldo = saldos[pid] + item['quantidade']
+        if novo_saldo < 0:
+            resultado.update(status='estoque_insuficiente', sku=sku, id=pid, saldo=saldos[pid])
+            resultados.append(resultado)
+            continue
+
+        saldos[pid] = novo_saldo
+        ledger.append({
+            'produto_id': pid,
+            'sku': sku,
+            'quantidade': item['quantidade'],
+            'saldo': novo_saldo,
+            'motivo': item['motivo'],
+            'usuario_id': usuario_id,
+            'lote_id': lote_id,
+            'criado_em': agora,
+        })
+        resultado.update(status='ok', sku=sku, id=pid, saldo=novo_saldo)
+        resultados.append(resultado)
+
+    deltas = {
+        pid: saldos[pid] - row.quantidade
+        for pid, row in by_id.items()
+        if saldos[pid] != row.quantidade
+    }
+    if deltas:
+        _write_deltas(deltas)
+        record_changes(
+            [((by_id[pid].quantidade, by_id[pid].preco_venda), (saldos[pid], by_id[pid].preco_venda))
+             for pid in deltas]
+        )
+    if ledger:
+        db.session.execute(db.insert(Movimentacao.__table__), ledger)
+
+    return resultados
+
+
+def payload_hash(itens):
+    return hashlib.sha256(
+        json.dumps(itens, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+
+
+def _replay(chave, hash_):
+    lote = LoteMovimentacao.query.filter_by(chave=chave).first()
+    if lote is None or lote.resposta is None:
+        return None
+    if lote.payload_hash != hash_:
+        raise ChaveIdempotenciaConflito(chave)
+    return json.loads(lote.resposta)
+
+
+def run_batch(itens, chave=None, usuario_id=None):
+    """Apply a batch once per idempotency key.
+
+    Returns `(resposta, replayed)`. A retried key returns the stored response
+    of the first run instead of applying the movements again. The caller
+    commits.
+    """
+    hash_ = payload_hash(itens)
+    if chave:
+        resposta = _replay(chave, hash_)
+        if resposta is not None:
+            return resposta, True
+
+    # Claiming the key first makes a concurrent retry wait on the unique index
+    lote = LoteMovimentacao(chave=chave or None, payload_hash=hash_, usuario_id=usuario_id)
+    db.session.add(lote)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        resposta = _replay(chave, hash_)
+        if resposta is None:
+            raise
+        return resposta, True
+
+    resultados = apply_batch(itens, usuario_id=usuario_id, lote_id=lote.id)
+    aplicados = sum(1 for r in resultados if r['status'] == 'ok')
+    resposta = {
+        'lote': lote.id,
+        'aplicados': aplicados,
+        'rejeitados': len(resultados) - aplicados,
+        'resultados': resultados,
+    }
+    lote.resposta = json.dumps(resposta)
+    return resposta, False
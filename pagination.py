@@ -0,0 +1,156 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are selected with `WHERE (keys) > (last keys) ORDER BY keys LIMIT n`
+instead of OFFSET, so every page costs the same as the first one as long as
+the keys are indexed. Cursors are signed, opaque tokens carrying the sort key
+values of the first/last row on the page and a fingerprint of the ordering
+and filter they belong to; a cursor presented to a different ordering or
+search restarts from the first page instead of comparing values of another
+column type or skipping into another result set.
+"""
+
+import hashlib
+import time
+
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+
+from app import db
+
+CURSOR_SALT = 'keyset-cursor'
+
+# Cached counts for filtered listings: key -> (expires_at, total)
+_count_cache = {}
+COUNT_CACHE_SIZE = 256
+
+
+class KeysetPage:
+    """One page of results plus the cursors to its neighbours"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt=CURSOR_SALT)
+
+
+def _fingerprint(clause):
+    """SQL text of a clause plus its bound values, which str() leaves out"""
+    compiled = clause.compile()
+    return f'{compiled} {sorted(compiled.params.items())!r}'
+
+
+def sort_key(keys, criteria=None):
+    """Fingerprint of an ordering and the filter it pages through: the key
+    expressions, their directions and every bound value (the search term)"""
+    partes = [f"{_fingerprint(expr)} {'desc' if descending else 'asc'}" for expr, descending in keys]
+    if criteria is not None:
+        partes.append(_fingerprint(criteria))
+    return hashlib.sha1(';'.join(partes).encode('utf-8')).hexdigest()[:12]
+
+
+def encode_cursor(values, direction, sort):
+    """Build an opaque token for the given sort key values of ordering `sort`"""
+    return _serializer().dumps({'k': list(values), 'd': direction, 's': sort})
+
+
+def decode_cursor(token, sort):
+    """Return (values, direction); invalid tokens, or tokens of another
+    ordering, restart from the first page"""
+    try:
+        data = _serializer().loads(token)
+        if data.get('s') != sort:
+            return None, 'next'
+        return data['k'], data['d']
+    except (BadSignature, KeyError, TypeError, AttributeError):
+        return None, 'next'
+
+
+def _after(keys, values, backwards):
+    """Condition selecting rows strictly past `values` in the page direction"""
+    directions = {descending != backwards for _, descending in keys}
+    exprs = [expr for expr, _ in keys]
+
+    # Uniform direction: a row-value comparison the planner can match to the index
+    if len(directions) == 1:
+        descending = directions.pop()
+        left, right = db.tuple_(*exprs), db.tuple_(*values)
+        return left < right if descending else left > right
+
+    clauses = []
+    for i, (expr, descending) in enumerate(keys):
+        equal = [k == v for k, v in zip(exprs[:i], values[:i])]
+        if descending != backwards:
+            clauses.append(db.and_(*equal, expr < values[i]))
+        else:
+            clauses.append(db.and_(*equal, expr > values[i]))
+    return db.or_(*clauses)
+
+
+def paginate_keyset(query, keys, cursor=None, per_page=10, total=None):
+    """Fetch one page of `query` ordered by `keys`.
+
+    `keys` is a list of `(expression, descending)` pairs whose last entry must
+    be unique (normally the primary key). Items are the query's entity, or
+    row tuples when the query selects several columns.
+    """
+    width = len(query.column_descriptions)
+    sort = sort_key(keys, query.whereclause)
+    values, direction = decode_cursor(cursor, sort) if cursor else (None, 'next')
+    if values is not None and len(values) != len(keys):
+        values, direction = None, 'next'
+    backwards = direction == 'prev'
+
+    query = query.add_columns(*[expr.label(f'_k{i}') for i, (expr, _) in enumerate(keys)])
+    if values is not None:
+        query = query.filter(_after(keys, values, backwards))
+    order = [
+        expr.desc() if descending != backwards else expr.asc()
+        for expr, descending in keys
+    ]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = values is not None, has_more
+    else:
+        has_next, has_prev = has_more, values is not None
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1][width:], 'next', sort)
+    if rows and has_prev:
+        prev_cursor = encode_cursor(rows[0][width:], 'prev', sort)
+
+    items = [row[0] if width == 1 else row[:width] for row in rows]
+    return KeysetPage(items, per_page, next_cursor, prev_cursor, total)
+
+
+def cached_count(key, query, ttl=60):
+    """COUNT(*) of `query`, cached per worker for `ttl` seconds"""
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    total = query.order_by(None).count()
+    if len(_count_cache) >= COUNT_CACHE_SIZE:
+        _count_cache.pop(next(iter(_count_cache)))
+    _count_cache[key] = (now + ttl, total)
+    return total
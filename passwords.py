@@ -0,0 +1,94 @@
+"""
+Password hashing with configurable parameters.
+
+`PASSWORD_HASH_METHOD` selects the werkzeug method (e.g. "scrypt:16384:8:1" or
+"pbkdf2:sha256:600000"); hashes created with other parameters are upgraded on
+the next successful login.
+
+`PASSWORD_HASH_SLOTS` > 0 caps how many verifications run at once across every
+gunicorn worker on the host, so a login storm cannot take every core away from
+the requests being served. Each slot is a lock file in
+`PASSWORD_HASH_SLOTS_DIR` held with flock(2) while the hash runs in the
+requesting worker; the kernel releases it when the hash returns or the worker
+dies, so the cap holds even for abandoned requests. A request that waits longer
+than `PASSWORD_HASH_TIMEOUT` for a slot gets PasswordHashBusy (503). The
+verification itself still occupies the worker (there is no offloading); size
+the worker count for the expected login rate.
+"""
+
+
+import os
+import time
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Pause between attempts to take a slot
+ESPERA_SLOT = 0.005
+
+
+class PasswordHashBusy(Exception):
+    """No verification slot freed up within PASSWORD_HASH_TIMEOUT"""
+
+
+_method_prefix = {}
+
+
+def _method():
+    return current_app.config["PASSWORD_HASH_METHOD"]
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=_method())
+
+
+def _current_prefix():
+    """`method:params` prefix werkzeug writes for the configured method"""
+    method = _method()
+    prefix = _method_prefix.get(method)
+    if prefix is None:
+        # Werkzeug fills in default parameters; hash once to learn them
+        prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        _method_prefix[method] = prefix
+    return prefix
+
+
+def needs_rehash(password_hash):
+    """True when the hash was made with other parameters than configured"""
+    return password_hash.split('$', 1)[0] != _current_prefix()
+
+
+def _acquire_slot(directory, slots, timeout):
+    """Lock one of `slots` files shared by the workers; the open file, or None on timeout"""
+    import fcntl
+
+    os.makedirs(directory, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    first = os.getpid() % slots
+    while True:
+        for i in range(slots):
+            slot = open(os.path.join(directory, f'slot{(first + i) % slots}.lock'), 'a')
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot
+            except BlockingIOError:
+                slot.close()
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(ESPERA_SLOT)
+
+
+def verify_password(password_hash, password):
+    slots = current_app.config["PASSWORD_HASH_SLOTS"]
+    if slots <= 0:
+        return check_password_hash(password_hash, password)
+
+    slot = _acquire_slot(current_app.config["PASSWORD_HASH_SLOTS_DIR"], slots,
+                         current_app.config["PASSWORD_HASH_TIMEOUT"])
+    if slot is None:
+        raise PasswordHashBusy()
+    try:
+        return check_password_hash(password_hash, password)
+    finally:
+        # Closing the file drops the lock
+        slot.close()
@@ -0,0 +1,195 @@
+"""
+Opt-in sampling profiler for slow requests.
+
+While PROFILER_ENABLED is on, one background thread per worker snapshots
+the stacks of the threads currently serving requests every
+PROFILER_INTERVAL_MS (`sys._current_frames`, no tracing hooks, so the
+overhead does not grow with the amount of Python executed). When a request
+ends, its samples are kept only if it took at least PROFILER_SLOW_MS or was
+picked by PROFILER_SAMPLE_RATE. Kept profiles are written in collapsed-stack
+format (flamegraph.pl, speedscope) with a JSON sidecar, into a ring of at
+most PROFILER_MAX_FILES profiles in PROFILER_DIR.
+"""
+
+import glob
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+SUFIXO = '.folded'
+NOME = re.compile(r'^\d+_\d+_\d+$')
+
+
+class StackSampler:
+    """Samples the stacks of registered threads into per-thread Counters"""
+
+    def __init__(self):
+        self.intervalo = 0.005
+        self._ativos = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked gunicorn worker
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._ativos = {}
+                    self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.intervalo)
+            if not self._ativos:
+                continue
+            frames = sys._current_frames()
+            for ident, amostras in list(self._ativos.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    amostras[_collapse(frame)] += 1
+
+    def start(self):
+        self._ensure_thread()
+        amostras = Counter()
+        self._ativos[threading.get_ident()] = amostras
+        return amostras
+
+    def stop(self):
+        return self._ativos.pop(threading.get_ident(), None)
+
+
+def _frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(' ', '_').replace(';', ':')
+
+
+def _collapse(frame):
+    """Root-to-leaf stack as 'file:function;file:function;...'"""
+    nomes = []
+    while frame is not None:
+        nomes.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(nomes))
+
+
+sampler = StackSampler()
+
+
+def start_request(config):
+    sampler.intervalo = config['PROFILER_INTERVAL_MS'] / 1000
+    g.profiler_amostrada = random.random() < config['PROFILER_SAMPLE_RATE']
+    g.profiler_amostras = sampler.start()
+
+
+def finish_request(response, elapsed, config, route):
+    """Stop sampling; keep the profile if the request was slow or sampled"""
+    amostras = g.pop('profiler_amostras', None)
+    if amostras is None:
+        return
+    sampler.stop()
+    duracao_ms = elapsed * 1000
+    motivo = None
+    if duracao_ms >= config['PROFILER_SLOW_MS']:
+        motivo = 'lenta'
+    elif g.pop('profiler_amostrada', False):
+        motivo = 'amostra'
+    if motivo and amostras:
+        save(config, dict(amostras), {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(duracao_ms, 2),
+            'interval_ms': config['PROFILER_INTERVAL_MS'],
+            'motivo': motivo,
+        })
+
+
+def discard_request():
+    """Unregister a request that ended without reaching finish_request (unhandled error)"""
+    if g.pop('profiler_amostras', None) is not None:
+        sampler.stop()
+
+
+def save(config, amostras, meta):
+    pasta = config['PROFILER_DIR']
+    os.makedirs(pasta, exist_ok=True)
+    # Time-ordered names: the ring drops the oldest first
+    nome = f"{time.time_ns()}_{os.getpid()}_{threading.get_ident() % 100000}"
+    meta = dict(meta, nome=nome, criado_em=time.time(), samples=sum(amostras.values()), pid=os.getpid())
+    with open(os.path.join(pasta, nome + SUFIXO), 'w', encoding='utf-8') as f:
+        for stack, n in amostras.items():
+            f.write(f"{stack} {n}\n")
+    with open(os.path.join(pasta, nome + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    _prune(pasta, config['PROFILER_MAX_FILES'])
+
+
+def _prune(pasta, maximo):
+    metas = sorted(glob.glob(os.path.join(pasta, '*.json')))
+    for caminho in metas[:max(len(metas) - maximo, 0)]:
+        base = caminho[:-len('.json')]
+        for arquivo in (caminho, base + SUFIXO):
+            try:
+                os.remove(arquivo)
+            except FileNotFoundError:
+                pass  # another worker pruned it first
+
+
+def list_profiles(pasta):
+    """Metadata of every stored profile, slowest first"""
+    perfis = []
+    for caminho in glob.glob(os.path.join(pasta, '*.json')):
+        try:
+            with open(caminho, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta['criado'] = datetime.fromtimestamp(meta['criado_em'])
+        perfis.append(meta)
+    perfis.sort(key=lambda p: p['duration_ms'], reverse=True)
+    return perfis
+
+
+def by_route(perfis):
+    """[(route, count, slowest ms, mean ms)] ordered by the slowest capture"""
+    rotas = {}
+    for perfil in perfis:
+        rotas.setdefault(perfil['route'], []).append(perfil['duration_ms'])
+    return sorted(((rota, len(d), max(d), sum(d) / len(d)) for rota, d in rotas.items()),
+                  key=lambda r: r[2], reverse=True)
+
+
+def load(pasta, nome):
+    """(metadata, {stack: samples}) of one profile; raises FileNotFoundError"""
+    with open(os.path.join(pasta, nome + '.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    meta['criado'] = datetime.fromtimestamp(meta['criado_em'])
+    amostras = {}
+    with open(os.path.join(pasta, nome + SUFIXO), encoding='utf-8') as f:
+        for linha in f:
+            stack, _, n = linha.rstrip('\n').rpartition(' ')
+            amostras[stack] = int(n)
+    return meta, amostras
+
+
+def top_functions(amostras, limite=25):
+    """[(function, self samples, inclusive samples)] by inclusive samples"""
+    proprio = Counter()
+    inclusivo = Counter()
+    for stack, n in amostras.items():
+        frames = stack.split(';')
+        proprio[frames[-1]] += n
+        for nome in set(frames):
+            inclusivo[nome] += n
+    return [(nome, proprio[nome], n) for nome, n in inclusivo.most_common(limite)]
@@ -0,0 +1,148 @@
+"""
+Per-request SQL and template timing.
+
+SQLAlchemy cursor events count every statement and time it; Flask's
+template signals time Jinja rendering. At the end of the request the totals
+go out as a `Server-Timing` header (db, tpl and total, visible in the
+browser's network panel) and a warning is logged when a threshold is
+exceeded. Strict mode also counts statements by SQL text to flag ones that
+run repeatedly in one request: the same parameters mean a redundant query,
+different parameters usually mean an N+1 loop.
+"""
+
+import logging
+import time
+from collections import Counter
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_SQL_LOG = 200
+
+
+class RequestQueries:
+    """Statement count, DB time and render time of one request"""
+
+    __slots__ = ('count', 'db_time', 'slowest', 'slowest_statement', 'render_time',
+                 '_render_start', 'statements', 'calls')
+
+    def __init__(self, strict=False):
+        self.count = 0
+        self.db_time = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.render_time = 0.0
+        self._render_start = None
+        # Only kept in strict mode
+        self.statements = Counter() if strict else None
+        self.calls = Counter() if strict else None
+
+    def record(self, statement, parameters, duracao):
+        self.count += 1
+        self.db_time += duracao
+        if duracao > self.slowest:
+            self.slowest = duracao
+            self.slowest_statement = statement
+        if self.statements is not None:
+            self.statements[statement] += 1
+            self.calls[(statement, repr(parameters))] += 1
+
+    def repeated(self, minimo):
+        """[(statement, times, times with identical parameters)] run at least `minimo` times"""
+        if self.statements is None:
+            return []
+        repetidas = []
+        for statement, vezes in self.statements.most_common():
+            if vezes < minimo:
+                break
+            identicas = max(n for (s, _), n in self.calls.items() if s == statement)
+            repetidas.append((statement, vezes, identicas))
+        return repetidas
+
+
+def _current():
+    if not has_request_context():
+        return None
+    return g.get('sql_stats')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info['query_start'].pop()
+    stats = _current()
+    if stats is not None:
+        stats.record(statement, parameters, time.perf_counter() - inicio)
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _current()
+    if stats is not None and stats._render_start is None:
+        stats._render_start = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    stats = _current()
+    if stats is not None and stats._render_start is not None:
+        stats.render_time += time.perf_counter() - stats._render_start
+        stats._render_start = None
+
+
+def install(app):
+    """Register the engine and template listeners (once per process)"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+
+def start_request(strict=False):
+    g.sql_stats = RequestQueries(strict)
+
+
+def _one_line(statement):
+    return ' '.join(statement.split())[:TAMANHO_SQL_LOG]
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 2)
+
+
+def finish_request(response, elapsed, config):
+    """Add the Server-Timing header and log the request if it crossed a threshold"""
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+
+    timing = [f'db;dur={_ms(stats.db_time)};desc="{stats.count} queries"']
+    if stats.render_time:
+        timing.append(f'tpl;dur={_ms(stats.render_time)}')
+    timing.append(f'total;dur={_ms(elapsed)}')
+    repetidas = stats.repeated(config['SQL_REPEAT_THRESHOLD'])
+    if repetidas:
+        timing.append(f'sqlrep;desc="{len(repetidas)} repeated statements"')
+    response.headers['Server-Timing'] = ', '.join(timing)
+
+    problemas = []
+    if stats.count > config['SQL_MAX_QUERIES']:
+        problemas.append(f'{stats.count} queries')
+    if _ms(stats.db_time) > config['SQL_SLOW_REQUEST_DB_MS']:
+        problemas.append(f'{_ms(stats.db_time)} ms in the database')
+    if _ms(stats.slowest) > config['SQL_SLOW_QUERY_MS']:
+        problemas.append(f'slowest statement {_ms(stats.slowest)} ms')
+    if problemas:
+        logger.warning('%s %s: %s (db %.2f ms, templates %.2f ms, total %.2f ms); slowest: %s',
+                       request.method, request.path, ', '.join(problemas), _ms(stats.db_time),
+                       _ms(stats.render_time), _ms(elapsed),
+                       _one_line(stats.slowest_statement or ''))
+    for statement, vezes, identicas in repetidas:
+        logger.warning('%s %s: statement ran %d times (%d with identical parameters): %s',
+                       request.method, request.path, vezes, identicas,
+                       _one_line(statement))
+    return response
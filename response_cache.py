@@ -0,0 +1,197 @@
+"""
+Versioned cache of rendered catalog pages.
+
+Pages are keyed by user, path and query args and stamped with the catalog
+version kept on the `estoque_resumo` rows, which every product write bumps in
+its own transaction. The ETag is derived from (version, key) alone, so a
+revalidation that still matches is answered with 304 before the view runs; a
+changed version simply makes older entries unreachable until LRU evicts them.
+
+Workers re-read the version at most every `RESPONSE_CACHE_VERSION_TTL`
+seconds; the worker that committed a write sees it immediately.
+"""
+
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+
+from flask import Response, current_app, request, session
+from flask_login import current_user
+from sqlalchemy.orm import Session
+
+from app import db
+from models import EstoqueResumo
+from inventory_summary import get_summary
+
+
+class ResponseCache:
+    """Thread-safe LRU of rendered pages, bounded by entries and bytes"""
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, versao):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versao:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, key, versao, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (versao, body, mimetype)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+cache = ResponseCache()
+
+_version_lock = threading.Lock()
+# Catalog version: the sum of the striped summary rows' versions
+_VERSAO = db.select(
+    db.cast(db.func.sum(EstoqueResumo.versao), db.BigInteger), db.func.max(EstoqueResumo.atualizado_em)
+)
+_version = None  # (versao, atualizado_em, checked_at)
+
+
+def configure(max_entries, max_bytes):
+    cache.max_entries = max_entries
+    cache.max_bytes = max_bytes
+    cache.clear()
+
+
+def forget_version():
+    """Make the next request re-read the catalog version"""
+    global _version
+    with _version_lock:
+        _version = None
+
+
+def catalog_version():
+    """Return (versao, atualizado_em), reading the rows at most once per TTL"""
+    global _version
+    ttl = current_app.config['RESPONSE_CACHE_VERSION_TTL']
+    now = time.monotonic()
+    with _version_lock:
+        if _version is not None and now - _version[2] < ttl:
+            return _version[0], _version[1]
+
+    row = db.session.execute(_VERSAO).one()
+    if row[0] is None:
+        resumo = get_summary()
+        row = (resumo.versao, resumo.atualizado_em)
+
+    with _version_lock:
+        _version = (row[0], row[1], now)
+    return row[0], row[1]
+
+
+@db.event.listens_for(Session, 'after_commit')
+def _catalog_committed(session):
+    if session.info.pop('catalogo_alterado', False):
+        forget_version()
+
+
+@db.event.listens_for(Session, 'after_rollback')
+def _catalog_rolled_back(session):
+    session.info.pop('catalogo_alterado', None)
+
+
+def _cache_key():
+    args = tuple(sorted(request.args.items(multi=True)))
+    return (current_user.get_id(), request.path, args)
+
+
+def _etag(versao, key):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+    return f'{versao}-{digest}'
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and since >= last_modified
+
+
+def _finish(response, etag, last_modified, status):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    # Browsers keep the page but always revalidate it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Cache'] = status
+    return response
+
+
+def cached_page(view):
+    """Serve a catalog page from the cache, or 304 when the client is current.
+
+    Requests with pending flash messages skip the cache so the message is
+    rendered and consumed as usual.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if cache.max_entries <= 0 or request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        versao, atualizado_em = catalog_version()
+        key = _cache_key()
+        etag = _etag(versao, key)
+        last_modified = atualizado_em.replace(tzinfo=timezone.utc, microsecond=0)
+
+        if _not_modified(etag, last_modified):
+            cache.count_not_modified()
+            return _finish(Response(status=304), etag, last_modified, 'REVALIDATED')
+
+        entry = cache.get(key, versao)
+        if entry is not None:
+            return _finish(Response(entry[1], mimetype=entry[2]), etag, last_modified, 'HIT')
+
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        cache.put(key, versao, response.get_data(), response.mimetype)
+        return _finish(response, etag, last_modified, 'MISS')
+
+    return wrapper
@@ -0,0 +1,60 @@
+"""
+Schema creation and in-place upgrades.
+
+`db.create_all()` only creates tables that do not exist yet: a column or index
+added to a model later never reaches a database created before it. `upgrade`
+also adds those, with `ALTER TABLE ... ADD COLUMN` and `CREATE INDEX`, which is
+all this schema has needed so far. New NOT NULL columns must declare a scalar
+`default`, which is written as the column DEFAULT so existing rows get it.
+
+`flask banco criar` runs `upgrade`; `flask banco verificar` and the check on
+the first request of each process report `differences`.
+"""
+
+from app import db
+
+
+def differences():
+    """(missing tables, missing 'table.column', missing indexes) of the models"""
+    inspector = db.inspect(db.engine)
+    existentes = set(inspector.get_table_names())
+    tabelas, colunas, indices = [], [], []
+    for nome, tabela in sorted(db.metadata.tables.items()):
+        if nome not in existentes:
+            tabelas.append(nome)
+            continue
+        presentes = {coluna['name'] for coluna in inspector.get_columns(nome)}
+        colunas += [f'{nome}.{coluna.name}' for coluna in tabela.columns if coluna.name not in presentes]
+        presentes = {indice['name'] for indice in inspector.get_indexes(nome)}
+        indices += sorted(indice.name for indice in tabela.indexes if indice.name not in presentes)
+    return tabelas, colunas, indices
+
+
+def _add_column(connection, coluna):
+    dialect = connection.dialect
+    preparer = dialect.identifier_preparer
+    ddl = (f"ALTER TABLE {preparer.format_table(coluna.table)} "
+           f"ADD COLUMN {preparer.format_column(coluna)} {coluna.type.compile(dialect=dialect)}")
+    padrao = coluna.default.arg if coluna.default is not None and coluna.default.is_scalar else None
+    if padrao is not None:
+        literal = db.literal(padrao, coluna.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f" DEFAULT {literal}"
+    if not coluna.nullable:
+        if padrao is None:
+            raise RuntimeError(f"{coluna.table.name}.{coluna.name} is NOT NULL without a scalar default")
+        ddl += " NOT NULL"
+    connection.exec_driver_sql(ddl)
+
+
+def upgrade():
+    """Create missing tables, then add missing columns and indexes; returns what was created"""
+    tabelas, colunas, indices = differences()
+    db.create_all()
+    with db.engine.begin() as connection:
+        for nome in colunas:
+            tabela, coluna = nome.split('.', 1)
+            _add_column(connection, db.metadata.tables[tabela].c[coluna])
+        por_nome = {indice.name: indice for tabela in db.metadata.tables.values() for indice in tabela.indexes}
+        for nome in indices:
+            por_nome[nome].create(connection)
+    return tabelas + colunas + indices
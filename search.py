@@ -0,0 +1,204 @@
+"""
+Indexed, accent- and case-insensitive product search.
+
+PostgreSQL uses expression GIN indexes: a Portuguese `tsvector` over nome, sku
+and descricao for ranked full-text matching, plus a trigram index for partial
+SKU/name matches. SQLite uses an FTS5 external-content table kept in sync by
+triggers. Both strip accents, so "camera" finds "Câmera". Any other database
+falls back to the original LIKE filter.
+"""
+
+import logging
+import re
+
+from app import db
+from models import Produto
+
+logger = logging.getLogger(__name__)
+
+# Index expressions; queries reuse the exact same text so the planner matches them
+PG_DOCUMENT = (
+    "to_tsvector('portuguese', f_unaccent(lower("
+    "coalesce(nome, '') || ' ' || coalesce(sku, '') || ' ' || coalesce(descricao, ''))))"
+)
+PG_TRIGRAM = "f_unaccent(lower(nome || ' ' || sku))"
+
+PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # unaccent() is only STABLE; an IMMUTABLE wrapper is needed for indexing
+    """CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+       LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+       AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$""",
+    f"CREATE INDEX IF NOT EXISTS ix_produtos_busca_fts ON produtos USING gin ({PG_DOCUMENT})",
+    f"CREATE INDEX IF NOT EXISTS ix_produtos_busca_trgm ON produtos USING gin ({PG_TRIGRAM} gin_trgm_ops)",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS produtos_fts USING fts5(
+           nome, sku, descricao,
+           content='produtos', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2'
+       )""",
+    """CREATE TRIGGER IF NOT EXISTS produtos_fts_ai AFTER INSERT ON produtos BEGIN
+           INSERT INTO produtos_fts(rowid, nome, sku, descricao)
+           VALUES (new.id, new.nome, new.sku, new.descricao);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS produtos_fts_ad AFTER DELETE ON produtos BEGIN
+           INSERT INTO produtos_fts(produtos_fts, rowid, nome, sku, descricao)
+           VALUES ('delete', old.id, old.nome, old.sku, old.descricao);
+       END""",
+    # Only text changes touch the index; stock movements don't
+    """CREATE TRIGGER IF NOT EXISTS produtos_fts_au AFTER UPDATE OF nome, sku, descricao ON produtos BEGIN
+           INSERT INTO produtos_fts(produtos_fts, rowid, nome, sku, descricao)
+           VALUES ('delete', old.id, old.nome, old.sku, old.descricao);
+           INSERT INTO produtos_fts(rowid, nome, sku, descricao)
+           VALUES (new.id, new.nome, new.sku, new.descricao);
+       END""",
+]
+
+# bm25 column weights for nome, sku, descricao
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Per-process cache of which backend each engine supports
+_backends = {}
+
+
+def _tokens(term):
+    return re.findall(r'\w+', term.lower())
+
+
+def ensure_search_index(connection):
+    """Create the search index for the connection's dialect if missing"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statements = PG_DDL
+    elif dialect == 'sqlite':
+        statements = SQLITE_DDL
+    else:
+        return False
+
+    try:
+        with connection.begin_nested():
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+    except Exception as e:
+        logger.warning("Índice de busca indisponível (%s): %s", dialect, e)
+        return False
+    finally:
+        _backends.clear()
+    return True
+
+
+def rebuild_search_index(connection):
+    """Recreate the index and repopulate it from `produtos`"""
+    if not ensure_search_index(connection):
+        return False
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql("INSERT INTO produtos_fts(produtos_fts) VALUES ('rebuild')")
+    elif connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql("REINDEX INDEX ix_produtos_busca_fts")
+        connection.exec_driver_sql("REINDEX INDEX ix_produtos_busca_trgm")
+    return True
+
+
+def drop_search_index(connection):
+    """Drop the search index (the SQLite FTS table outlives a dropped `produtos`).
+
+    Bulk loads also call this so rows are not indexed one at a time;
+    `rebuild_search_index` restores it afterwards.
+    """
+    if connection.dialect.name == 'sqlite':
+        for trigger in ('produtos_fts_ai', 'produtos_fts_ad', 'produtos_fts_au'):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS produtos_fts")
+    elif connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql("DROP INDEX IF EXISTS ix_produtos_busca_fts")
+        connection.exec_driver_sql("DROP INDEX IF EXISTS ix_produtos_busca_trgm")
+    _backends.clear()
+
+
+def search_backend():
+    """Return 'postgresql', 'sqlite' or 'like' for the current engine"""
+    engine = db.engine
+    backend = _backends.get(engine.url)
+    if backend is not None:
+        return backend
+
+    backend = 'like'
+    with engine.connect() as connection:
+        if engine.dialect.name == 'postgresql':
+            found = connection.exec_driver_sql(
+                "SELECT to_regclass('ix_produtos_busca_fts') IS NOT NULL "
+                "AND to_regprocedure('f_unaccent(text)') IS NOT NULL"
+            ).scalar()
+            if found:
+                backend = 'postgresql'
+        elif engine.dialect.name == 'sqlite':
+            found = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'produtos_fts'"
+            ).scalar()
+            if found:
+                backend = 'sqlite'
+
+    _backends[engine.url] = backend
+    return backend
+
+
+def search_products(query, term):
+    """Filter a Produto query by `term`.
+
+    Returns `(query, rank)` where `rank` is a relevance expression that sorts
+    best matches first in ascending order, or None for the LIKE fallback.
+    """
+    tokens = _tokens(term)
+    backend = search_backend() if tokens else 'like'
+
+    if backend == 'postgresql':
+        # Every word must match, each one as a prefix
+        tsquery = db.func.to_tsquery(
+            db.literal_column("'portuguese'"),
+            db.func.f_unaccent(' & '.join(f'{token}:*' for token in tokens)),
+        )
+        document = db.literal_column(PG_DOCUMENT)
+        trigram = db.literal_column(PG_TRIGRAM)
+        escaped = re.sub(r'([\\%_])', r'\\\1', term.lower())
+        pattern = db.func.f_unaccent(f'%{escaped}%')
+        rank = db.func.ts_rank(document, tsquery) + db.func.similarity(
+            trigram, db.func.f_unaccent(term.lower())
+        )
+        query = query.filter(
+            db.or_(
+                document.op('@@')(tsquery),
+                trigram.like(pattern, escape='\\'),
+            )
+        )
+        return query, -db.cast(rank, db.Float)
+
+    if backend == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        fts = db.table('produtos_fts', db.column('rowid'))
+        query = query.join(fts, fts.c.rowid == Produto.id).filter(
+            db.text("produtos_fts MATCH :match").bindparams(match=match)
+        )
+        return query, db.literal_column(f"bm25(produtos_fts, {weights})")
+
+    query = query.filter(
+        db.or_(
+            Produto.nome.contains(term),
+            Produto.sku.contains(term),
+            Produto.descricao.contains(term)
+        )
+    )
+    return query, None
+
+
+@db.event.listens_for(Produto.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    ensure_search_index(connection)
+
+
+@db.event.listens_for(Produto.__table__, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    drop_search_index(connection)
@@ -0,0 +1,234 @@
+"""
+Per-worker in-memory SKU index for point-of-sale lookups.
+
+Maps every SKU to its pre-encoded JSON body (id, sku, nome, quantidade,
+preco_venda) so a lookup is one dict access and no database round trip. The
+index is loaded in full once and then kept current incrementally: every write
+stamps the products it touches (`produtos.versao`, see
+`inventory_summary.stamp`), so when the catalog version moves the index
+fetches only the rows stamped at or above the horizon it last read, through the
+index on that column. A sale therefore costs the next lookup one small range
+query instead of invalidating the whole index.
+
+Deletes and summary rebuilds leave no stamped row behind; they bump
+`estoque_resumo.geracao` instead. A changed generation, more than
+TAMANHO_LOTE rows to catch up (bulk imports) or an index older than
+SKU_INDEX_MAX_AGE trigger a full reload in the background. The initial load
+starts the same way on the first request of each worker (`warm`, unless
+SKU_INDEX_WARM=0) or else on its first lookup, never in `create_app`: a
+preloaded master would pay for it at boot and the workers would inherit an
+index as stale as their fork. Until the index catches up, lookups fall back to
+the `sku` unique index.
+"""
+
+import json
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from models import Produto, EstoqueResumo
+from inventory_summary import horizon
+from response_cache import catalog_version
+
+logger = logging.getLogger(__name__)
+
+COLUNAS = (Produto.sku, Produto.id, Produto.nome, Produto.quantidade, Produto.preco_venda)
+TAMANHO_LOTE = 5000
+
+
+def encode(sku, id_, nome, quantidade, preco_venda):
+    return json.dumps({
+        'id': id_,
+        'sku': sku,
+        'nome': nome,
+        'quantidade': quantidade,
+        'preco_venda': str(Decimal(str(preco_venda)).quantize(Decimal('0.01'))),
+    }, ensure_ascii=False).encode('utf-8')
+
+
+class SkuIndex:
+    """SKU -> (id, body) as of catalog version `versao`, with hit/miss counters"""
+
+    def __init__(self):
+        self._entries = {}
+        self._skus = {}  # id -> sku, to drop the old key when a product's SKU changes
+        self.versao = None  # catalog version every entry is current for
+        self.geracao = None
+        self.horizonte = None  # stamps below it are all applied
+        self.carregado_em = None
+        self.atualizacoes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Held by whoever is writing entries: one refresh or full load at a time
+        self.refresh_lock = threading.Lock()
+        self._reloading = False
+        self._last_reload = 0.0
+
+    def lookup(self, sku, versao):
+        """Return (found, body) when the index is current for `versao`, else None (a miss)"""
+        with self._lock:
+            if self.versao is None or self.versao < versao:
+                self.misses += 1
+                return None
+            self.hits += 1
+        entry = self._entries.get(sku)
+        return (True, entry[1]) if entry is not None else (False, None)
+
+    def apply(self, rows, versao, horizonte):
+        """Store rows read after the index was current for an older version"""
+        for row in rows:
+            anterior = self._skus.get(row.id)
+            if anterior is not None and anterior != row.sku:
+                entry = self._entries.get(anterior)
+                if entry is not None and entry[0] == row.id:
+                    del self._entries[anterior]
+            self._skus[row.id] = row.sku
+            self._entries[row.sku] = (row.id, encode(*row))
+        self.versao = versao
+        self.horizonte = horizonte
+        self.atualizacoes += 1
+
+    def replace(self, entries, skus, versao, geracao, horizonte):
+        self._entries = entries
+        self._skus = skus
+        self.versao = versao
+        self.geracao = geracao
+        self.horizonte = horizonte
+        self.carregado_em = time.time()
+
+    def claim_reload(self, interval):
+        """Single-flight guard: True if this caller should start a full reload"""
+        now = time.monotonic()
+        with self._lock:
+            if self._reloading or now - self._last_reload < interval:
+                return False
+            self._reloading = True
+            self._last_reload = now
+            return True
+
+    def reload_done(self):
+        with self._lock:
+            self._reloading = False
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'versao': self.versao,
+                'geracao': self.geracao,
+                'carregado_em': self.carregado_em,
+                'atualizacoes': self.atualizacoes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+index = SkuIndex()
+
+
+def _estado():
+    """(versao, geracao, horizonte) read now rather than through the TTL cache.
+
+    Read before the rows: every write counted in `versao` and every stamp
+    below `horizonte` is then visible to the row query that follows.
+    """
+    estado = db.session.query(
+        db.cast(db.func.sum(EstoqueResumo.versao), db.BigInteger),
+        db.cast(db.func.sum(EstoqueResumo.geracao), db.BigInteger),
+        horizon(),
+    ).one()
+    return estado if estado[0] is not None else None
+
+
+def load():
+    """Read the whole catalog into the index, stamped with the version read first"""
+    estado = _estado()
+    if estado is None:
+        return 0
+    entries = {}
+    skus = {}
+    stmt = db.select(*COLUNAS).execution_options(yield_per=TAMANHO_LOTE, stream_results=True)
+    for row in db.session.execute(stmt):
+        entries[row.sku] = (row.id, encode(*row))
+        skus[row.id] = row.sku
+    index.replace(entries, skus, *estado)
+    return len(entries)
+
+
+def _reload_in_background():
+    if not index.claim_reload(current_app.config['SKU_INDEX_RELOAD_INTERVAL']):
+        return
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context(), index.refresh_lock:
+            try:
+                total = load()
+                logger.info('SKU index loaded with %d products', total)
+            except SQLAlchemyError:
+                logger.warning('SKU index not loaded; lookups will use the database', exc_info=True)
+            finally:
+                db.session.remove()
+                index.reload_done()
+
+    threading.Thread(target=run, name='sku-index-reload', daemon=True).start()
+
+
+def warm():
+    """Start loading the index in the background; called on the first request of each process"""
+    if index.versao is None:
+        _reload_in_background()
+
+
+def refresh():
+    """Catch up with the rows written since the index version; False if it could not"""
+    if not index.refresh_lock.acquire(blocking=False):
+        return False  # another thread is writing the index
+    try:
+        estado = _estado()
+        if estado is None:
+            return False
+        versao, geracao, horizonte = estado
+        if index.versao is None or geracao != index.geracao:
+            _reload_in_background()
+            return False
+        rows = db.session.execute(
+            db.select(*COLUNAS).where(Produto.versao >= index.horizonte).limit(TAMANHO_LOTE + 1)
+        ).all()
+        if len(rows) > TAMANHO_LOTE:
+            # A bulk import: cheaper to reload than to patch, and not inside a request
+            _reload_in_background()
+            return False
+        index.apply(rows, versao, horizonte)
+        return True
+    except SQLAlchemyError:
+        logger.warning('SKU index refresh failed', exc_info=True)
+        return False
+    finally:
+        index.refresh_lock.release()
+
+
+def lookup(sku):
+    """Return the encoded product for `sku`, or None when it does not exist"""
+    versao, _ = catalog_version()
+    if index.versao is None or index.versao < versao:
+        refresh()
+    elif time.time() - index.carregado_em > current_app.config['SKU_INDEX_MAX_AGE']:
+        # Safety net for writes made outside the application
+        _reload_in_background()
+
+    found = index.lookup(sku, versao)
+    if found is not None:
+        return found[1]
+
+    # Behind: one point query on the unique sku index
+    row = db.session.execute(db.select(*COLUNAS).where(Produto.sku == sku)).first()
+    return encode(*row) if row is not None else None
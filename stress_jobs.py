@@ -0,0 +1,147 @@
+"""
+Background stress-test runs started from the web interface.
+
+Each run is a separate `stress_testing/web_runner.py` process, so the load
+generator never shares a worker (or its GIL) with the requests it measures.
+The runner reports progress in a JSON status file that any worker can read.
+Only one run at a time: the parent takes an exclusive lock on a lock file and
+hands the descriptor to the child, which holds it until it exits (even if it
+crashes), so concurrent starts from other workers are refused.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stress_testing', 'web_runner.py')
+TIPOS = ('basic', 'advanced')
+ATIVOS = ('iniciando', 'executando')
+
+_guard = threading.Lock()
+_processo = None  # last runner started by this worker (used without fcntl)
+
+
+class StressTestRunning(Exception):
+    """Another stress test is still running"""
+
+
+def _path(nome):
+    pasta = current_app.config['STRESS_TEST_STATE_DIR']
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, nome)
+
+
+def _try_lock():
+    """Open and lock the lock file; return the descriptor, or None if a run holds it"""
+    fd = os.open(_path('stress_test.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def is_running():
+    if fcntl is None:
+        return _processo is not None and _processo.poll() is None
+    fd = _try_lock()
+    if fd is None:
+        return True
+    os.close(fd)
+    return False
+
+
+def _write_status(dados):
+    caminho = _path('stress_test_status.json')
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f)
+    os.replace(temporario, caminho)
+
+
+def start(tipo, usuarios, duracao, taxa, base_url):
+    """Start a run in a new process; raise StressTestRunning if one is active"""
+    global _processo
+    with _guard:
+        fd = None
+        if fcntl is not None:
+            fd = _try_lock()
+            if fd is None:
+                raise StressTestRunning()
+        elif is_running():
+            raise StressTestRunning()
+
+        try:
+            agora = time.time()
+            status = {
+                'id': uuid.uuid4().hex[:12],
+                'estado': 'iniciando',
+                'tipo': tipo,
+                'parametros': {'usuarios': usuarios, 'duracao': duracao, 'taxa': taxa, 'url': base_url},
+                'iniciado_em': agora,
+                'atualizado_em': agora,
+            }
+            _write_status(status)
+
+            comando = [sys.executable, RUNNER, '--status', _path('stress_test_status.json'),
+                       '--tipo', tipo, '--url', base_url,
+                       '--usuarios', str(usuarios), '--duracao', str(duracao)]
+            if taxa:
+                comando += ['--taxa', str(taxa)]
+            with open(_path('stress_test.log'), 'w', encoding='utf-8') as log:
+                # Reports land in STRESS_REPORTS_DIR, where teste_estresse lists them
+                _processo = subprocess.Popen(
+                    comando, cwd=os.path.abspath(current_app.config['STRESS_REPORTS_DIR']),
+                    stdout=log, stderr=subprocess.STDOUT,
+                    stdin=subprocess.DEVNULL, pass_fds=(fd,) if fd is not None else (),
+                    start_new_session=fcntl is not None,
+                    env=dict(os.environ, PYTHONUNBUFFERED='1'),
+                )
+            status['pid'] = _processo.pid
+            _write_status(status)
+            return status
+        finally:
+            # The child keeps its own copy of the locked descriptor
+            if fd is not None:
+                os.close(fd)
+
+
+def status():
+    """Current (or last) run, or None; a run whose process died is reported as interrompido"""
+    global _processo
+    try:
+        with open(_path('stress_test_status.json'), encoding='utf-8') as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if _processo is not None and _processo.poll() is not None:
+        _processo = None  # reap
+    if dados.get('estado') in ATIVOS and not is_running():
+        dados['estado'] = 'interrompido'
+    dados['ativo'] = dados.get('estado') in ATIVOS
+    return dados
+
+
+def cancel():
+    """Ask the running test to stop; return False when nothing is running"""
+    dados = status()
+    if not dados or not dados['ativo'] or not dados.get('pid'):
+        return False
+    try:
+        os.kill(dados['pid'], signal.SIGTERM)
+    except ProcessLookupError:
+        return False
+    return True
@@ -0,0 +1,154 @@
+"""
+Index of stress-test reports for the /teste-estresse listing.
+
+The testers write a JSON file with the summary and per-endpoint histograms
+next to each Markdown report; reports from before that are scraped from the
+Markdown once. Parsed entries are cached per worker by (mtime, size), so a
+page view costs one directory scan and only new or changed files are read.
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+NOME = re.compile(r'^(stress_test_report|advanced_stress_report)_(\d{8}_\d{6})\.(md|json)$')
+TIPOS = ('Básico', 'Avançado', 'Open-loop')
+SERIES = ('p50', 'p95', 'p99')
+
+# Markdown scraping for reports without a JSON file
+_MD = {
+    'total_requests': (r'- \*\*Total de Requests:\*\*\s*(\d+)', ),
+    'success_rate': (r'- \*\*Taxa de Sucesso:\*\*\s*([\d.]+)%', ),
+    'avg_time': (r'- \*\*Média:\*\*\s*([\d.]+)\s*ms', r'- \*\*Tempo de Resposta Médio:\*\*\s*([\d.]+)\s*ms'),
+    'p50': (r'- \*\*P50 \(Mediana\):\*\*\s*([\d.]+)', r'\| P50 \| ([\d.]+) ms'),
+    'p95': (r'- \*\*P95:\*\*\s*([\d.]+)', r'\| P95 \| ([\d.]+) ms'),
+    'p99': (r'- \*\*P99:\*\*\s*([\d.]+)', r'\| P99 \| ([\d.]+) ms'),
+}
+
+
+def _from_json(path):
+    with open(path, encoding='utf-8') as f:
+        dados = json.load(f)
+    resumo = dados['resumo']
+    return {
+        'filename': dados['relatorio'],
+        'type': dados['tipo'],
+        'created': datetime.fromtimestamp(dados['criado_em']),
+        'total_requests': resumo['total_requests'],
+        'success_rate': resumo['taxa_sucesso'],
+        'avg_time': resumo['media_ms'],
+        'p50': resumo['p50_ms'],
+        'p95': resumo['p95_ms'],
+        'p99': resumo['p99_ms'],
+    }
+
+
+def _from_markdown(path, prefixo, carimbo):
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    entry = {
+        'filename': os.path.basename(path),
+        'type': 'Avançado' if prefixo == 'advanced_stress_report' else 'Básico',
+        'created': datetime.strptime(carimbo, '%Y%m%d_%H%M%S'),
+    }
+    for campo, padroes in _MD.items():
+        valor = None
+        for padrao in padroes:
+            match = re.search(padrao, content)
+            if match:
+                valor = float(match.group(1))
+                break
+        entry[campo] = valor
+    if entry['total_requests'] is not None:
+        entry['total_requests'] = int(entry['total_requests'])
+    return entry
+
+
+class ReportIndex:
+    """Report entries keyed by path, re-read only when (mtime, size) changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def scan(self, pasta):
+        """All reports in `pasta`, newest first"""
+        arquivos = {}
+        with os.scandir(pasta) as it:
+            for item in it:
+                match = NOME.match(item.name)
+                if match:
+                    arquivos.setdefault(match.group(1, 2), {})[match.group(3)] = item
+
+        entries = []
+        vistos = set()
+        for (prefixo, carimbo), por_extensao in arquivos.items():
+            item = por_extensao.get('json') or por_extensao['md']
+            try:
+                stat = item.stat()
+            except FileNotFoundError:
+                continue
+            assinatura = (stat.st_mtime_ns, stat.st_size)
+            vistos.add(item.path)
+            cached = self._entries.get(item.path)
+            if cached is not None and cached[0] == assinatura:
+                entry = cached[1]
+            else:
+                try:
+                    if item.name.endswith('.json'):
+                        entry = _from_json(item.path)
+                    else:
+                        entry = _from_markdown(item.path, prefixo, carimbo)
+                except (OSError, ValueError, KeyError, TypeError):
+                    entry = None
+                with self._lock:
+                    self._entries[item.path] = (assinatura, entry)
+            if entry is not None:
+                entries.append(entry)
+
+        with self._lock:
+            for path in self._entries.keys() - vistos:
+                del self._entries[path]
+
+        entries.sort(key=lambda e: e['created'], reverse=True)
+        return entries
+
+
+index = ReportIndex()
+
+
+def list_reports(pasta, tipo=None, dias=None):
+    """Reports newest first, optionally only of one type and from the last `dias` days"""
+    entries = index.scan(pasta)
+    if tipo:
+        entries = [e for e in entries if e['type'] == tipo]
+    if dias:
+        desde = datetime.now() - timedelta(days=dias)
+        entries = [e for e in entries if e['created'] >= desde]
+    return entries
+
+
+def trend(entries, limite=50, largura=600, altura=160):
+    """SVG polyline points of p50/p95/p99 for the latest `limite` runs, oldest first"""
+    pontos = [e for e in entries[:limite] if e['p50'] is not None][::-1]
+    if len(pontos) < 2:
+        return None
+    maximo = max(e['p99'] or e['p95'] or e['p50'] for e in pontos) or 1.0
+    passo = largura / (len(pontos) - 1)
+    series = {}
+    for serie in SERIES:
+        series[serie] = ' '.join(
+            f"{i * passo:.1f},{altura - (e[serie] or 0) / maximo * altura:.1f}"
+            for i, e in enumerate(pontos)
+        )
+    return {
+        'series': series,
+        'max_ms': maximo,
+        'runs': len(pontos),
+        'inicio': pontos[0]['created'],
+        'fim': pontos[-1]['created'],
+        'largura': largura,
+        'altura': altura,
+    }
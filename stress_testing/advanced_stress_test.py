@@ -5,12 +5,11 @@ Inclui testes mais sofisticados e relatórios com gráficos
 """
 
 import asyncio
-import aiohttp
 import time
 import json
 import random
-import statistics
 from datetime import datetime, timedelta
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 import threading
 import os
@@ -19,23 +18,21 @@ import sys
 # Adiciona o diretório atual ao path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from test_stress import GestokProStressTester
+from test_stress import GestokProStressTester, ROTA_PROXIMA
+
+# Operação que segue o link "Próximo" da última listagem (paginação por cursor)
+PROXIMA = 'proxima'
 
 class AdvancedGestokProTester(GestokProStressTester):
-    def __init__(self, base_url="http://localhost:5000"):
-        super().__init__(base_url)
+    def __init__(self, base_url="http://localhost:5000", **kwargs):
+        super().__init__(base_url, **kwargs)
         self.memory_snapshots = []
         self.cpu_usage = []
         self.concurrent_users = []
         
     async def simulate_realistic_user(self, session_id, behavior_type="normal"):
         """Simula comportamento mais realista de usuário"""
-        async with aiohttp.ClientSession() as session:
-            # Login
-            login_success = await self.login_user(session)
-            if not login_success:
-                return
-                
+        async with self.user_session() as session:
             if behavior_type == "heavy":
                 # Usuário pesado - faz muitas operações
                 operations = [
@@ -43,8 +40,8 @@ class AdvancedGestokProTester(GestokProStressTester):
                     ('/produtos', 'GET', 'Lista Produtos'),
                     ('/produtos?search=notebook', 'GET', 'Busca Notebook'),
                     ('/produtos?search=mouse', 'GET', 'Busca Mouse'),
-                    ('/produtos?page=1', 'GET', 'Página 1'),
-                    ('/produtos?page=2', 'GET', 'Página 2'),
+                    ('/produtos', 'GET', 'Página 1'),
+                    (PROXIMA, 'GET', 'Página 2'),
                     ('/produtos/novo', 'GET', 'Novo Produto'),
                     ('/produtos', 'GET', 'Lista Produtos 2'),
                     ('/dashboard', 'GET', 'Dashboard 2'),
@@ -66,31 +63,41 @@ class AdvancedGestokProTester(GestokProStressTester):
                     ('/dashboard', 'GET', 'Dashboard'),
                     ('/produtos', 'GET', 'Lista Produtos'),
                     ('/produtos?search=' + random.choice(['notebook', 'mouse', 'monitor']), 'GET', 'Busca'),
-                    ('/produtos?page=1', 'GET', 'Paginação'),
+                    (PROXIMA, 'GET', 'Paginação'),
                     ('/produtos/novo', 'GET', 'Formulário'),
                 ]
                 delay_between_ops = 0.2
             
             # Executa operações
+            proximo = None
             for endpoint, method, description in operations:
-                await self.test_endpoint(
-                    session, method, endpoint, 
+                rota = None
+                if endpoint == PROXIMA:
+                    if proximo is None:
+                        continue
+                    endpoint, rota = proximo, ROTA_PROXIMA
+                resultado = await self.test_endpoint(
+                    session, method, endpoint, rota=rota,
                     description=f"{description} - {behavior_type.title()} User {session_id}"
                 )
+                proximo = resultado['proximo']
                 await asyncio.sleep(delay_between_ops)
     
-    async def run_mixed_load_test(self, duration_seconds=60):
+    async def run_mixed_load_test(self, duration_seconds=60, users_per_wave=4):
         """Executa teste com diferentes tipos de carga"""
         print(f"🚀 Iniciando teste de carga mista...")
-        print(f"📊 Duração: {duration_seconds}s")
+        print(f"📊 Duração: {duration_seconds}s | Usuários por onda: {users_per_wave}")
         print("-" * 60)
         
+        await self.open_client()
         start_time = time.time()
         wave = 1
         
         while time.time() - start_time < duration_seconds:
             # Mistura diferentes tipos de usuários
-            user_types = ['normal'] * 2 + ['heavy'] * 1 + ['fast'] * 1
+            # Proporção fixa: 2 normais, 1 pesado e 1 rápido a cada 4 usuários
+            mix = ['normal', 'normal', 'heavy', 'fast']
+            user_types = [mix[i % len(mix)] for i in range(users_per_wave)]
             random.shuffle(user_types)
             
             print(f"🌊 Onda {wave} - Usuários: {', '.join(user_types)}")
@@ -110,6 +117,7 @@ class AdvancedGestokProTester(GestokProStressTester):
             wave += 1
             await asyncio.sleep(random.uniform(1, 3))  # Pausa variável entre ondas
             
+        await self.close_client()
         print(f"✅ Teste de carga mista concluído!")
         print(f"📈 Total de requests: {len(self.results)}")
     
@@ -119,44 +127,34 @@ class AdvancedGestokProTester(GestokProStressTester):
             print("❌ Nenhum resultado disponível")
             return
             
-        # Análise temporal
-        results_by_time = {}
-        for result in self.results:
-            timestamp = datetime.fromisoformat(result['timestamp'])
-            time_bucket = timestamp.replace(second=0, microsecond=0)  # Agrupa por minuto
-            
-            if time_bucket not in results_by_time:
-                results_by_time[time_bucket] = []
-            results_by_time[time_bucket].append(result['response_time_ms'])
+        recorder = self.results
+        hist = recorder.total.hist
+        total_requests = len(recorder)
+        success_count = recorder.total.success
         
-        # Calcula throughput por minuto
+        # Análise temporal: um histograma por janela de tempo
         throughput_data = []
-        for time_bucket, response_times in sorted(results_by_time.items()):
+        for window_start, stats in sorted(recorder.windows.items()):
             throughput_data.append({
-                'time': time_bucket.strftime('%H:%M'),
-                'requests_per_minute': len(response_times),
-                'avg_response_time': statistics.mean(response_times),
-                'max_response_time': max(response_times)
+                'time': datetime.fromtimestamp(window_start).strftime('%H:%M:%S'),
+                'requests_per_minute': stats.count * 60 / recorder.window_seconds,
+                'avg_response_time': stats.hist.mean,
+                'max_response_time': stats.hist.max
             })
         
         # Análise de percentis mais detalhada
-        response_times = [r['response_time_ms'] for r in self.results]
-        response_times.sort()
-        
-        percentiles = {}
-        for p in [10, 25, 50, 75, 80, 85, 90, 95, 99, 99.9]:
-            if len(response_times) > 0:
-                index = int(len(response_times) * (p / 100.0))
-                if index >= len(response_times):
-                    index = len(response_times) - 1
-                percentiles[f'P{p}'] = response_times[index]
+        percentiles = {
+            f'P{p}': value
+            for p, value in hist.percentiles([10, 25, 50, 75, 80, 85, 90, 95, 99, 99.9]).items()
+        }
         
         # Detecção de anomalias
-        mean_time = statistics.mean(response_times)
-        std_dev = statistics.stdev(response_times) if len(response_times) > 1 else 0
+        mean_time = hist.mean
+        std_dev = hist.stdev
         threshold = mean_time + (2 * std_dev)  # 2 desvios padrão
         
-        anomalies = [r for r in self.results if r['response_time_ms'] > threshold]
+        anomaly_count = hist.count_above(threshold)
+        anomalies = deque(recorder.raw_samples(minimo_ms=threshold), maxlen=5)
         
         # Gera relatório
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -171,15 +169,15 @@ class AdvancedGestokProTester(GestokProStressTester):
 ## 📊 Resumo Executivo
 
 ### Indicadores Chave de Performance (KPIs)
-- **Total de Requests:** {len(self.results)}
-- **Taxa de Sucesso:** {len([r for r in self.results if r['success']])/len(self.results)*100:.1f}%
-- **Tempo de Resposta Médio:** {statistics.mean(response_times):.2f} ms
-- **Throughput Médio:** {len(self.results) / ((max([datetime.fromisoformat(r['timestamp']) for r in self.results]) - min([datetime.fromisoformat(r['timestamp']) for r in self.results])).total_seconds() / 60):.1f} req/min
+- **Total de Requests:** {total_requests}
+- **Taxa de Sucesso:** {success_count/total_requests*100:.1f}%
+- **Tempo de Resposta Médio:** {mean_time:.2f} ms
+- **Throughput Médio:** {total_requests / (max(recorder.duration, 1) / 60):.1f} req/min
 
 ### Classificação de Performance
 """
         
-        avg_time = statistics.mean(response_times)
+        avg_time = mean_time
         if avg_time < 200:
             performance_grade = "🟢 EXCELENTE"
             performance_desc = "Sistema operando com performance ótima"
@@ -212,18 +210,18 @@ class AdvancedGestokProTester(GestokProStressTester):
 |---------|---------|-------------|--------------|
 """
         for data in throughput_data:
-            report_content += f"| {data['time']} | {data['requests_per_minute']} | {data['avg_response_time']:.1f} ms | {data['max_response_time']:.1f} ms |\n"
+            report_content += f"| {data['time']} | {data['requests_per_minute']:.0f} | {data['avg_response_time']:.1f} ms | {data['max_response_time']:.1f} ms |\n"
         
         # Anomalias
-        if anomalies:
+        if anomaly_count:
             report_content += f"""
 ## 🚨 Detecção de Anomalias
 
-Foram detectados **{len(anomalies)}** requests com tempo de resposta anômalo (>{threshold:.1f} ms):
+Foram detectados **{anomaly_count}** requests com tempo de resposta anômalo (>{threshold:.1f} ms):
 
 """
-            for anomaly in anomalies[-5:]:  # Últimas 5 anomalias
-                report_content += f"- {anomaly['endpoint']} - {anomaly['response_time_ms']:.1f} ms ({anomaly['timestamp']})\n"
+            for ts, endpoint, response_time, _ in anomalies:  # Últimas 5 anomalias
+                report_content += f"- {endpoint} - {response_time:.1f} ms ({datetime.fromtimestamp(ts).isoformat()})\n"
         
         # Análise de padrões
         report_content += f"""
@@ -231,13 +229,10 @@ Foram detectados **{len(anomalies)}** requests com tempo de resposta anômalo (>
 
 ### Endpoints Mais Acessados
 """
-        endpoint_counts = {}
-        for result in self.results:
-            endpoint = result['endpoint']
-            endpoint_counts[endpoint] = endpoint_counts.get(endpoint, 0) + 1
+        endpoint_counts = {endpoint: stats.count for endpoint, stats in recorder.endpoints.items()}
         
         for endpoint, count in sorted(endpoint_counts.items(), key=lambda x: x[1], reverse=True)[:5]:
-            percentage = (count / len(self.results)) * 100
+            percentage = (count / total_requests) * 100
             report_content += f"- **{endpoint}**: {count} requests ({percentage:.1f}%)\n"
         
         # Recomendações baseadas nos dados
@@ -253,7 +248,7 @@ Foram detectados **{len(anomalies)}** requests com tempo de resposta anômalo (>
             report_content += "- Considerar implementar paginação mais eficiente\n"
             report_content += "- Revisar índices do banco de dados\n\n"
         
-        if len(anomalies) > len(self.results) * 0.05:  # Mais de 5% de anomalias
+        if anomaly_count > total_requests * 0.05:  # Mais de 5% de anomalias
             report_content += "### 🟠 Estabilidade\n"
             report_content += "- Investigar picos de latência\n"
             report_content += "- Implementar circuit breakers\n"
@@ -261,44 +256,34 @@ Foram detectados **{len(anomalies)}** requests com tempo de resposta anômalo (>
         
         # Endpoints que precisam de otimização
         slow_endpoints = []
-        endpoint_stats = {}
-        for result in self.results:
-            endpoint = result['endpoint']
-            if endpoint not in endpoint_stats:
-                endpoint_stats[endpoint] = []
-            endpoint_stats[endpoint].append(result['response_time_ms'])
-        
-        for endpoint, times in endpoint_stats.items():
-            avg_endpoint_time = statistics.mean(times)
+        for endpoint, stats in recorder.endpoints.items():
+            avg_endpoint_time = stats.hist.mean
             if avg_endpoint_time > 500:  # Endpoints com mais de 500ms
                 slow_endpoints.append((endpoint, avg_endpoint_time))
         
         if slow_endpoints:
             report_content += "### 🔧 Endpoints para Otimização\n"
-            for endpoint, avg_time in sorted(slow_endpoints, key=lambda x: x[1], reverse=True):
-                report_content += f"- **{endpoint}**: {avg_time:.1f} ms médio\n"
+            for endpoint, endpoint_avg in sorted(slow_endpoints, key=lambda x: x[1], reverse=True):
+                report_content += f"- **{endpoint}**: {endpoint_avg:.1f} ms médio\n"
         
         report_content += f"""
 ## 📊 Dados Técnicos Detalhados
 
 ### Distribuição de Status Codes
 """
-        status_codes = {}
-        for result in self.results:
-            code = result['status_code']
-            status_codes[code] = status_codes.get(code, 0) + 1
+        status_codes = recorder.total.status_codes
         
         for code, count in sorted(status_codes.items()):
-            percentage = (count / len(self.results)) * 100
+            percentage = (count / total_requests) * 100
             report_content += f"- **{code}**: {count} requests ({percentage:.1f}%)\n"
         
         report_content += f"""
 ### Métricas de Confiabilidade
-- **MTTR (Mean Time To Respond)**: {statistics.mean(response_times):.2f} ms
+- **MTTR (Mean Time To Respond)**: {mean_time:.2f} ms
 - **Desvio Padrão**: {std_dev:.2f} ms
-- **Coeficiente de Variação**: {(std_dev/statistics.mean(response_times))*100:.1f}%
-- **Requests com Erro**: {len([r for r in self.results if not r['success']])}
-- **Uptime**: {len([r for r in self.results if r['success']])/len(self.results)*100:.2f}%
+- **Coeficiente de Variação**: {(std_dev/mean_time)*100 if mean_time else 0:.1f}%
+- **Requests com Erro**: {total_requests - success_count}
+- **Uptime**: {success_count/total_requests*100:.2f}%
 
 ---
 *Relatório gerado automaticamente pelo Sistema Avançado de Teste de Estresse*  
@@ -308,6 +293,7 @@ Foram detectados **{len(anomalies)}** requests com tempo de resposta anômalo (>
         # Salva o relatório
         with open(report_filename, 'w', encoding='utf-8') as f:
             f.write(report_content)
+        self.save_results(report_filename, 'Avançado')
             
         print(f"📄 Relatório avançado salvo: {report_filename}")
         
@@ -316,12 +302,12 @@ Foram detectados **{len(anomalies)}** requests com tempo de resposta anômalo (>
         print("🎯 RELATÓRIO AVANÇADO DE TESTE DE ESTRESSE")
         print("="*70)
         print(f"Status de Performance: {performance_grade}")
-        print(f"Total de Requests: {len(self.results)}")
-        print(f"Taxa de Sucesso: {len([r for r in self.results if r['success']])/len(self.results)*100:.1f}%")
+        print(f"Total de Requests: {total_requests}")
+        print(f"Taxa de Sucesso: {success_count/total_requests*100:.1f}%")
         print(f"Tempo Médio: {avg_time:.2f} ms")
         print(f"P95: {percentiles.get('P95', 0):.2f} ms")
         print(f"P99: {percentiles.get('P99', 0):.2f} ms")
-        print(f"Anomalias Detectadas: {len(anomalies)}")
+        print(f"Anomalias Detectadas: {anomaly_count}")
         print(f"Endpoints Lentos: {len(slow_endpoints)}")
         print("="*70)
         
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Benchmark em processo das rotas do GestokPro, com gate de regressão.
+
+Chama a aplicação pelo test client do Flask (WSGI direto, sem sockets nem
+servidor) contra um banco semeado com N produtos pelo gerador de
+`init_db.py --produtos`: um arquivo SQLite temporário por tamanho de
+catálogo, reaproveitado entre execuções, ou o PostgreSQL local informado em
+--banco. Cada rota roda sozinha, em série, por
+--duracao segundos; o resultado (ops/s e percentis de latência por rota) vai
+para um JSON. Com --baseline, compara com um resultado guardado e termina
+com código 1 se alguma rota ficou mais lenta que o --limite permitido.
+
+    python stress_testing/benchmark.py --produtos 100000 --salvar-baseline base_100k.json
+    python stress_testing/benchmark.py --produtos 100000 --baseline base_100k.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Adiciona o diretório atual ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from latency import LatencyHistogram
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VERSAO = 1
+ROTAS = ('dashboard', 'produtos', 'produtos_pagina', 'produtos_busca',
+         'produto_novo', 'produto_editar', 'produto_movimentar')
+# Métricas comparadas com o baseline: (campo, maior é melhor)
+METRICAS = (('ops_s', True), ('p95_ms', False))
+
+ADMIN_EMAIL = 'admin@gestokpro.com'
+ADMIN_SENHA = 'admin'
+PREFIXO_NOVO = 'BEN-NOVO-'
+
+BUSCAS = ['notebook', 'cafeteira', 'furadeira bosch', 'cadeira escritorio', 'garrafa termica', 'caneta bic']
+
+
+class SuiteBenchmark:
+    """Cenários por rota sobre um test client já autenticado"""
+
+    def __init__(self, app, client, ids, seed):
+        self.app = app
+        self.client = client
+        self.ids = ids
+        self.rng = random.Random(seed)
+        self.criados = 0
+        self.cursores = []
+        self.formularios = {}
+        self.editaveis = []
+        self._saida = None
+
+    def preparar(self):
+        """Cursores e dados de formulário calculados antes de medir"""
+        from models import Produto
+        from pagination import encode_cursor, sort_key
+
+        with self.app.test_request_context():
+            ordem = sort_key([(Produto.id, False)])
+            self.cursores = [encode_cursor([i], 'next', ordem) for i in self.ids]
+        with self.app.app_context():
+            for produto in Produto.query.filter(Produto.id.in_(self.ids)):
+                self.formularios[produto.id] = {
+                    'nome': produto.nome,
+                    'sku': produto.sku,
+                    'descricao': produto.descricao or '',
+                    'quantidade': str(produto.quantidade),
+                    'preco_venda': str(produto.preco_venda),
+                }
+        # O formulário recusa quantidade 0 (DataRequired)
+        self.editaveis = [i for i, dados in self.formularios.items() if dados['quantidade'] != '0']
+
+    def _limpar_flashes(self):
+        # Sem seguir o redirect, as mensagens acumulariam no cookie de sessão
+        with self.client.session_transaction() as sessao:
+            sessao.pop('_flashes', None)
+
+    def dashboard(self):
+        return self.client.get('/dashboard'), 200
+
+    def produtos(self):
+        return self.client.get('/produtos'), 200
+
+    def produtos_pagina(self):
+        return self.client.get('/produtos', query_string={'cursor': self.rng.choice(self.cursores)}), 200
+
+    def produtos_busca(self):
+        return self.client.get('/produtos', query_string={'search': self.rng.choice(BUSCAS)}), 200
+
+    def produto_novo(self):
+        self.criados += 1
+        return self.client.post('/produtos/novo', data={
+            'nome': f"Produto Benchmark {self.criados}",
+            'sku': f"{PREFIXO_NOVO}{self.criados}",
+            'descricao': 'Criado pelo benchmark',
+            'quantidade': '10',
+            'preco_venda': '19.90',
+        }), 302
+
+    def produto_editar(self):
+        # Reenvia os mesmos valores: mede o caminho completo sem alterar o catálogo
+        produto_id = self.rng.choice(self.editaveis)
+        return self.client.post(f'/produtos/editar/{produto_id}', data=self.formularios[produto_id]), 302
+
+    def produto_movimentar(self):
+        # Cada entrada é seguida da saída no mesmo produto: o saldo volta ao que era
+        if self._saida is None:
+            produto_id, quantidade = self.rng.choice(self.ids), 1
+            self._saida = produto_id
+        else:
+            produto_id, quantidade = self._saida, -1
+            self._saida = None
+        return self.client.post(f'/produtos/movimentar/{produto_id}', data={
+            'quantidade': quantidade, 'motivo': 'benchmark'}), 302
+
+    def executar(self, rota, duracao, aquecimento, minimo):
+        """Roda um cenário e devolve (histograma, erros, segundos medidos)"""
+        cenario = getattr(self, rota)
+        escreve = rota.startswith('produto_')
+        for _ in range(aquecimento):
+            cenario()
+            if escreve:
+                self._limpar_flashes()
+
+        histograma = LatencyHistogram()
+        erros = 0
+        medido = 0.0
+        fim = time.perf_counter() + duracao
+        while time.perf_counter() < fim or histograma.count < minimo:
+            inicio = time.perf_counter()
+            response, esperado = cenario()
+            latencia = time.perf_counter() - inicio
+            medido += latencia
+            histograma.record(latencia * 1000)
+            if response.status_code != esperado:
+                erros += 1
+            if escreve:
+                self._limpar_flashes()
+        return histograma, erros, medido
+
+    def desfazer(self):
+        """Remove os produtos criados por produto_novo e recalcula o resumo"""
+        from app import db
+        from models import Produto
+        from inventory_summary import rebuild_summary
+
+        with self.app.app_context():
+            Produto.query.filter(Produto.sku.like(f"{PREFIXO_NOVO}%")).delete(synchronize_session=False)
+            rebuild_summary()
+
+
+def _resumo_rota(histograma, erros, medido):
+    p50, p95, p99 = (histograma.percentiles([50, 95, 99])[p] for p in (50, 95, 99))
+    return {
+        'operacoes': histograma.count,
+        'erros': erros,
+        'ops_s': round(histograma.count / medido, 2) if medido else 0.0,
+        'media_ms': round(histograma.mean, 3),
+        'p50_ms': round(p50, 3),
+        'p95_ms': round(p95, 3),
+        'p99_ms': round(p99, 3),
+        'max_ms': round(histograma.max, 3),
+    }
+
+
+def carregar_app(banco, com_cache=False):
+    """Cria a aplicação apontando para o banco do benchmark"""
+    sys.path.insert(0, RAIZ)
+    from app import create_app
+    config = {
+        'SQLALCHEMY_DATABASE_URI': banco,
+        # Nada de efeitos colaterais nos diretórios da instalação
+        'METRICS_DIR': os.path.join(tempfile.gettempdir(), f"gestokpro_bench_metrics_{os.getpid()}"),
+        'PROFILER_ENABLED': False,
+        'SKU_INDEX_WARM': False,
+        'WTF_CSRF_ENABLED': False,
+        # Sem uma linha de log de acesso por requisição no terminal
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING').upper(),
+    }
+    if not com_cache:
+        config['RESPONSE_CACHE_SIZE'] = 0
+    return create_app(config)
+
+
+def preparar_banco(app, produtos, seed, recriar):
+    """Garante o admin e exatamente `produtos` produtos; devolve o dialeto"""
+    from app import db
+    from models import Usuario, Produto
+    from inventory_summary import rebuild_summary
+    from init_db import gerar_catalogo
+
+    with app.app_context():
+        if recriar:
+            print("🗑️  Recriando tabelas...")
+            db.drop_all()
+        db.create_all()
+
+        existentes = Produto.query.count()
+        if existentes == 0:
+            print(f"🌱 Semeando {produtos:,} produtos (seed {seed})...")
+            inicio = time.time()
+            gerar_catalogo(produtos, seed)
+            rebuild_summary()
+            print(f"   concluído em {time.time() - inicio:.1f}s")
+        elif existentes != produtos:
+            raise SystemExit(f"❌ O banco já tem {existentes:,} produtos (esperado {produtos:,}); "
+                             f"use --recriar ou outro --banco")
+
+        if Usuario.query.filter_by(email=ADMIN_EMAIL).first() is None:
+            admin = Usuario(email=ADMIN_EMAIL, is_admin=True)
+            admin.set_password(ADMIN_SENHA)
+            db.session.add(admin)
+            db.session.commit()
+        return db.engine.dialect.name
+
+
+def amostra_ids(app, quantidade, seed):
+    from app import db
+    from models import Produto
+
+    with app.app_context():
+        menor, maior = db.session.query(db.func.min(Produto.id), db.func.max(Produto.id)).one()
+        rng = random.Random(seed)
+        candidatos = {rng.randint(menor, maior) for _ in range(quantidade * 2)}
+        ids = [i for (i,) in db.session.query(Produto.id).filter(Produto.id.in_(candidatos))]
+        return sorted(ids)[:quantidade]
+
+
+def comparar(atual, baseline, limite):
+    """[(rota, métrica, baseline, atual, variação)] das rotas que pioraram além do limite"""
+    regressoes = []
+    for rota, resultado in atual['rotas'].items():
+        base = baseline['rotas'].get(rota)
+        if not base:
+            continue
+        for metrica, maior_melhor in METRICAS:
+            antes, depois = base[metrica], resultado[metrica]
+            if not antes:
+                continue
+            variacao = (depois - antes) / antes
+            if (-variacao if maior_melhor else variacao) > limite:
+                regressoes.append((rota, metrica, antes, depois, variacao))
+    return regressoes
+
+
+def _salvar(caminho, dados):
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--produtos', type=int, default=1000, help='tamanho do catálogo (ex.: 1000, 100000, 1000000)')
+    parser.add_argument('--banco', help='URL do banco (padrão: SQLite temporário por tamanho de catálogo)')
+    parser.add_argument('--recriar', action='store_true', help='apaga as tabelas e semeia de novo')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rota', action='append', choices=ROTAS, help='repetível (padrão: todas)')
+    parser.add_argument('--duracao', type=float, default=3, help='segundos medidos por rota')
+    parser.add_argument('--aquecimento', type=int, default=20, help='requisições descartadas por rota')
+    parser.add_argument('--min-operacoes', type=int, default=20, help='mínimo medido por rota')
+    parser.add_argument('--com-cache', action='store_true', help='mantém o cache de páginas de /produtos')
+    parser.add_argument('--saida', help='JSON de resultado (padrão: benchmark_<produtos>_<data>.json)')
+    parser.add_argument('--baseline', help='JSON de um resultado anterior para comparar')
+    parser.add_argument('--limite', type=float, default=0.25,
+                        help='piora relativa tolerada em ops/s e p95 (0.25 = 25%%)')
+    parser.add_argument('--salvar-baseline', metavar='ARQUIVO', help='grava este resultado como baseline')
+    args = parser.parse_args()
+
+    banco = args.banco or f"sqlite:///{os.path.join(tempfile.gettempdir(), f'gestokpro_bench_{args.produtos}.db')}"
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print("🧪 GestokPro - Benchmark em Processo")
+    print("=" * 50)
+    app = carregar_app(banco, args.com_cache)
+    dialeto = preparar_banco(app, args.produtos, args.seed, args.recriar)
+    if baseline and (baseline['produtos'], baseline['banco']) != (args.produtos, dialeto):
+        raise SystemExit(f"❌ Baseline medido com {baseline['produtos']:,} produtos em {baseline['banco']}; "
+                         f"esta execução usa {args.produtos:,} em {dialeto}")
+
+    client = app.test_client()
+    response = client.post('/login', data={'email': ADMIN_EMAIL, 'password': ADMIN_SENHA})
+    if response.status_code != 302:
+        raise SystemExit(f"❌ Login falhou (HTTP {response.status_code})")
+
+    suite = SuiteBenchmark(app, client, amostra_ids(app, 200, args.seed), args.seed)
+    suite.preparar()
+
+    print(f"📦 {args.produtos:,} produtos em {dialeto} | {args.duracao:g}s por rota\n")
+    print(f"{'Rota':<20} {'ops/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'erros':>6}")
+    resultados = {}
+    try:
+        for rota in args.rota or ROTAS:
+            resultado = _resumo_rota(*suite.executar(rota, args.duracao, args.aquecimento, args.min_operacoes))
+            resultados[rota] = resultado
+            print(f"{rota:<20} {resultado['ops_s']:>9.1f} {resultado['p50_ms']:>7.2f}ms "
+                  f"{resultado['p95_ms']:>7.2f}ms {resultado['p99_ms']:>7.2f}ms {resultado['erros']:>6}")
+    finally:
+        suite.desfazer()
+
+    dados = {
+        'versao': VERSAO,
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'banco': dialeto,
+        'produtos': args.produtos,
+        'seed': args.seed,
+        'cache': args.com_cache,
+        'duracao_s': args.duracao,
+        'python': platform.python_version(),
+        'rotas': resultados,
+    }
+    saida = args.saida or f"benchmark_{args.produtos}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    _salvar(saida, dados)
+    print(f"\n💾 Resultado salvo em {saida}")
+    if args.salvar_baseline:
+        _salvar(args.salvar_baseline, dados)
+        print(f"📌 Baseline salvo em {args.salvar_baseline}")
+
+    falhou = False
+    erros = {rota: r['erros'] for rota, r in resultados.items() if r['erros']}
+    if erros:
+        print(f"❌ Respostas inesperadas: {erros}")
+        falhou = True
+    if baseline:
+        regressoes = comparar(dados, baseline, args.limite)
+        if regressoes:
+            print(f"\n❌ Regressões acima de {args.limite:.0%} em relação a {args.baseline}:")
+            for rota, metrica, antes, depois, variacao in regressoes:
+                print(f"   {rota:<20} {metrica:<7} {antes:>9.2f} -> {depois:>9.2f} ({variacao:+.0%})")
+            falhou = True
+        else:
+            print(f"\n✅ Nenhuma rota piorou mais de {args.limite:.0%} em relação a {args.baseline}")
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    main()
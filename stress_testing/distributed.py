@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Geração de carga em vários processos para GestokPro.
+
+Um único loop asyncio satura um núcleo (HTML, regex de CSRF, JSON) muito antes
+de um gunicorn com vários workers. O coordenador inicia N processos, cada um
+com seu próprio loop e testador; todos fazem login, esperam numa barreira
+comum e começam no mesmo instante, com a mesma duração. Ao final os
+histogramas de cada processo são somados e o relatório normal é gerado sobre
+o resultado combinado.
+"""
+
+import argparse
+import asyncio
+import functools
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+
+# Adiciona o diretório atual ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from latency import LatencyRecorder, LatencyHistogram
+
+MODOS = ('basico', 'avancado', 'open-loop')
+
+# Tempo entre a barreira e o início, para todos acordarem juntos
+ATRASO_INICIO = 0.5
+
+
+class PerfilEscalado:
+    """Fração da taxa de um perfil open-loop, para dividir a carga entre processos"""
+
+    def __init__(self, perfil, fator):
+        self.perfil = perfil
+        self.fator = fator
+
+    def rate(self, t):
+        return self.perfil.rate(t) * self.fator
+
+    def describe(self):
+        return f"{self.perfil.describe()} × {self.fator:.2f}"
+
+
+def _criar_testador(modo, base_url, parametros):
+    if modo == 'avancado':
+        from advanced_stress_test import AdvancedGestokProTester
+        return AdvancedGestokProTester(base_url=base_url, **parametros.get('cliente', {}))
+    if modo == 'open-loop':
+        from open_loop import OpenLoopTester
+        return OpenLoopTester(base_url=base_url, sessoes=parametros.get('sessoes', 10),
+                              **parametros.get('cliente', {}))
+    from test_stress import GestokProStressTester
+    return GestokProStressTester(base_url=base_url, **parametros.get('cliente', {}))
+
+
+async def _executar(tester, modo, duracao, parametros):
+    if modo == 'avancado':
+        await tester.run_mixed_load_test(duration_seconds=duracao)
+    elif modo == 'open-loop':
+        perfil = PerfilEscalado(parametros['perfil'], 1 / parametros['processos'])
+        await tester.run_open_loop_test(perfil, duration_seconds=duracao,
+                                        poisson=parametros.get('poisson', False))
+    else:
+        await tester.run_stress_test(duration_seconds=duracao,
+                                     users_per_wave=parametros.get('usuarios', 3))
+
+
+def _definir_inicio(inicio):
+    # Executado por um único processo quando a barreira abre
+    inicio.value = time.time() + ATRASO_INICIO
+
+
+def _worker(indice, modo, base_url, duracao, parametros, barreira, inicio, resultados):
+    """Processo de carga: login, barreira, execução sincronizada, envio dos histogramas"""
+    if indice > 0:
+        # Só o primeiro processo imprime o progresso
+        sys.stdout = open(os.devnull, 'w')
+
+    async def rodar():
+        tester = _criar_testador(modo, base_url, parametros)
+        await tester.open_client()
+
+        # Bloqueia o loop de propósito: ninguém começa antes de todos estarem prontos
+        barreira.wait(timeout=parametros.get('timeout_barreira', 120))
+        espera = inicio.value - time.time()
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+        await _executar(tester, modo, duracao, parametros)
+        dados = {'indice': indice, 'results': tester.results.to_dict()}
+        if modo == 'open-loop':
+            dados.update(
+                agendadas=tester.agendadas,
+                descartadas=tester.descartadas,
+                servico=tester.servico.to_dict(),
+                atraso_envio=tester.atraso_envio.to_dict(),
+            )
+        return dados
+
+    try:
+        resultados.put(asyncio.run(rodar()))
+    except Exception:
+        barreira.abort()
+        resultados.put({'indice': indice, 'erro': traceback.format_exc()})
+
+
+class Coordenador:
+    def __init__(self, base_url="http://localhost:5000", processos=None, modo='basico', **parametros):
+        if modo not in MODOS:
+            raise ValueError(f"Modo inválido: {modo}")
+        self.base_url = base_url
+        self.processos = processos or os.cpu_count() or 2
+        self.modo = modo
+        self.parametros = dict(parametros, processos=self.processos)
+        self.erros = []
+
+    def run(self, duration_seconds=60):
+        """Executa os processos e devolve um testador com os resultados combinados"""
+        ctx = multiprocessing.get_context('spawn')
+        inicio = ctx.Value('d', 0.0)
+        barreira = ctx.Barrier(self.processos, action=functools.partial(_definir_inicio, inicio))
+        resultados = ctx.Queue()
+
+        print(f"🚀 Iniciando {self.processos} processos de carga (modo {self.modo})...")
+        workers = [
+            ctx.Process(
+                target=_worker,
+                args=(i, self.modo, self.base_url, duration_seconds, self.parametros,
+                      barreira, inicio, resultados),
+                daemon=True,
+            )
+            for i in range(self.processos)
+        ]
+        for worker in workers:
+            worker.start()
+
+        recebidos = []
+        limite = time.time() + duration_seconds + self.parametros.get('timeout_barreira', 120) + 60
+        while len(recebidos) < self.processos and time.time() < limite:
+            try:
+                recebidos.append(resultados.get(timeout=1))
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+        for worker in workers:
+            worker.join(timeout=5)
+
+        self.erros = [r for r in recebidos if 'erro' in r]
+        for erro in self.erros:
+            print(f"❌ Processo {erro['indice']} falhou:\n{erro['erro']}")
+
+        ok = [r for r in recebidos if 'erro' not in r]
+        print(f"✅ {len(ok)}/{self.processos} processos concluídos")
+        return self.combinar(ok, duration_seconds)
+
+    def combinar(self, recebidos, duracao):
+        """Testador local (sem cliente HTTP) com os histogramas somados"""
+        tester = _criar_testador(self.modo, self.base_url, self.parametros)
+        combinado = LatencyRecorder(window_seconds=tester.results.window_seconds, raw=False)
+        for dados in recebidos:
+            combinado.merge(LatencyRecorder.from_dict(dados['results']))
+        tester.results = combinado
+
+        if self.modo == 'open-loop':
+            tester.perfil = self.parametros['perfil']
+            tester.duracao = duracao
+            for dados in recebidos:
+                tester.agendadas += dados['agendadas']
+                tester.descartadas += dados['descartadas']
+                tester.servico.merge(LatencyHistogram.from_dict(dados['servico']))
+                tester.atraso_envio.merge(LatencyHistogram.from_dict(dados['atraso_envio']))
+        return tester
+
+    def generate_report(self, tester):
+        if self.modo == 'avancado':
+            return tester.generate_advanced_report()
+        return tester.generate_performance_report()
+
+
+def main():
+    from open_loop import criar_perfil
+
+    parser = argparse.ArgumentParser(description="Teste de estresse multiprocesso do GestokPro")
+    parser.add_argument('--url', default="http://localhost:5000")
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--modo', choices=MODOS, default='basico')
+    parser.add_argument('--duracao', type=int, default=60, help='segundos')
+    parser.add_argument('--usuarios', type=int, default=3, help='usuários por onda em cada processo (básico)')
+    parser.add_argument('--sessoes', type=int, default=10, help='sessões autenticadas por processo (open-loop)')
+    parser.add_argument('--conexoes', type=int, default=200, help='limite de conexões por processo')
+    # Perfil open-loop: taxas totais, divididas entre os processos
+    parser.add_argument('--perfil', choices=['constante', 'rampa', 'degrau', 'pico'], default='constante')
+    parser.add_argument('--taxa', type=float, default=50)
+    parser.add_argument('--taxa-final', type=float, default=200)
+    parser.add_argument('--duracao-rampa', type=float)
+    parser.add_argument('--incremento', type=float, default=25)
+    parser.add_argument('--intervalo', type=float, default=10)
+    parser.add_argument('--inicio-pico', type=float, default=20)
+    parser.add_argument('--duracao-pico', type=float, default=10)
+    parser.add_argument('--poisson', action='store_true')
+    args = parser.parse_args()
+
+    print("🧪 GestokPro - Teste de Estresse Multiprocesso")
+    print("=" * 50)
+
+    coordenador = Coordenador(
+        base_url=args.url,
+        processos=args.processos,
+        modo=args.modo,
+        usuarios=args.usuarios,
+        sessoes=args.sessoes,
+        perfil=criar_perfil(args),
+        poisson=args.poisson,
+        cliente={'connection_limit': args.conexoes},
+    )
+    tester = coordenador.run(duration_seconds=args.duracao)
+    report_file = coordenador.generate_report(tester)
+
+    print(f"\n🎉 Teste concluído! Verifique o arquivo: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Registro compacto de latências para os testes de estresse.
+
+`LatencyHistogram` é um histograma no estilo HDR: buckets log-lineares em
+microssegundos, com erro relativo abaixo de 1% em qualquer escala. A memória
+depende só do número de buckets ocupados (nunca do número de amostras), dois
+histogramas se somam com `merge` e `to_dict`/`from_dict` permitem juntar
+resultados de várias execuções ou processos.
+
+`LatencyRecorder` mantém um histograma por endpoint e por janela de tempo,
+contadores de status e, opcionalmente, um log bruto em arrays compactos
+(~16 bytes por amostra) para análises que precisam de cada requisição.
+"""
+
+import json
+import math
+import time
+from array import array
+from collections import Counter, deque
+
+# 2^8 sub-buckets por potência de 2: resolução de 1/128 (< 1%)
+SUB_BUCKET_BITS = 8
+SUB_BUCKET_HALF = 1 << (SUB_BUCKET_BITS - 1)
+
+
+def _index(valor_us):
+    bucket = max(valor_us.bit_length() - SUB_BUCKET_BITS, 0)
+    return bucket * SUB_BUCKET_HALF + (valor_us >> bucket)
+
+
+def _valor(indice):
+    """Valor representativo (ponto médio) do bucket `indice`, em µs"""
+    bucket = max((indice >> (SUB_BUCKET_BITS - 1)) - 1, 0)
+    sub = indice - bucket * SUB_BUCKET_HALF
+    return (sub << bucket) + ((1 << bucket) >> 1)
+
+
+class LatencyHistogram:
+    """Histograma de latências (ms) com buckets log-lineares esparsos"""
+
+    __slots__ = ('counts', 'count', 'min_us', 'max_us', 'total_us', 'total_sq_us')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.min_us = None
+        self.max_us = 0
+        self.total_us = 0
+        self.total_sq_us = 0
+
+    def record(self, latencia_ms, vezes=1):
+        valor = max(int(latencia_ms * 1000 + 0.5), 0)
+        indice = _index(valor)
+        self.counts[indice] = self.counts.get(indice, 0) + vezes
+        self.count += vezes
+        self.total_us += valor * vezes
+        self.total_sq_us += valor * valor * vezes
+        if self.min_us is None or valor < self.min_us:
+            self.min_us = valor
+        if valor > self.max_us:
+            self.max_us = valor
+
+    def merge(self, outro):
+        for indice, n in outro.counts.items():
+            self.counts[indice] = self.counts.get(indice, 0) + n
+        self.count += outro.count
+        self.total_us += outro.total_us
+        self.total_sq_us += outro.total_sq_us
+        if outro.min_us is not None and (self.min_us is None or outro.min_us < self.min_us):
+            self.min_us = outro.min_us
+        self.max_us = max(self.max_us, outro.max_us)
+        return self
+
+    def copy(self):
+        hist = LatencyHistogram()
+        hist.merge(self)
+        return hist
+
+    def since(self, anterior):
+        """Amostras registradas depois de `anterior`, uma cópia antiga deste histograma"""
+        hist = LatencyHistogram()
+        for indice, n in self.counts.items():
+            n -= anterior.counts.get(indice, 0)
+            if n:
+                hist.counts[indice] = n
+        hist.count = self.count - anterior.count
+        hist.total_us = self.total_us - anterior.total_us
+        hist.total_sq_us = self.total_sq_us - anterior.total_sq_us
+        if hist.counts:
+            # Extremos só com a resolução dos buckets
+            hist.min_us = _valor(min(hist.counts))
+            hist.max_us = _valor(max(hist.counts))
+        return hist
+
+    @property
+    def min(self):
+        return (self.min_us or 0) / 1000
+
+    @property
+    def max(self):
+        return self.max_us / 1000
+
+    @property
+    def mean(self):
+        return self.total_us / self.count / 1000 if self.count else 0.0
+
+    @property
+    def stdev(self):
+        if self.count < 2:
+            return 0.0
+        variancia = (self.total_sq_us - self.total_us ** 2 / self.count) / (self.count - 1)
+        return math.sqrt(max(variancia, 0)) / 1000
+
+    def percentiles(self, ps):
+        """{p: latência em ms} para cada percentil (0-100), numa única passada"""
+        resultado = {}
+        if not self.count:
+            return {p: 0.0 for p in ps}
+        alvos = sorted((max(math.ceil(self.count * p / 100), 1), p) for p in ps)
+        acumulado = 0
+        i = 0
+        for indice in sorted(self.counts):
+            acumulado += self.counts[indice]
+            while i < len(alvos) and acumulado >= alvos[i][0]:
+                valor = min(max(_valor(indice), self.min_us), self.max_us)
+                resultado[alvos[i][1]] = valor / 1000
+                i += 1
+            if i == len(alvos):
+                break
+        return resultado
+
+    def percentile(self, p):
+        return self.percentiles([p])[p]
+
+    def count_above(self, latencia_ms):
+        limite = _index(max(int(latencia_ms * 1000), 0))
+        return sum(n for indice, n in self.counts.items() if indice > limite)
+
+    def to_dict(self):
+        return {
+            'counts': {str(k): v for k, v in self.counts.items()},
+            'count': self.count,
+            'min_us': self.min_us,
+            'max_us': self.max_us,
+            'total_us': self.total_us,
+            'total_sq_us': self.total_sq_us,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.counts = {int(k): v for k, v in data['counts'].items()}
+        hist.count = data['count']
+        hist.min_us = data['min_us']
+        hist.max_us = data['max_us']
+        hist.total_us = data['total_us']
+        hist.total_sq_us = data['total_sq_us']
+        return hist
+
+
+class EndpointStats:
+    """Histograma + contadores de um endpoint ou janela"""
+
+    __slots__ = ('hist', 'success', 'status_codes')
+
+    def __init__(self):
+        self.hist = LatencyHistogram()
+        self.success = 0
+        self.status_codes = Counter()
+
+    def record(self, latencia_ms, status_code, success):
+        self.hist.record(latencia_ms)
+        self.status_codes[status_code] += 1
+        if success:
+            self.success += 1
+
+    def merge(self, outro):
+        self.hist.merge(outro.hist)
+        self.success += outro.success
+        self.status_codes.update(outro.status_codes)
+        return self
+
+    @property
+    def count(self):
+        return self.hist.count
+
+    def to_dict(self):
+        return {
+            'hist': self.hist.to_dict(),
+            'success': self.success,
+            'status_codes': {str(k): v for k, v in self.status_codes.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.hist = LatencyHistogram.from_dict(data['hist'])
+        stats.success = data['success']
+        stats.status_codes = Counter({int(k): v for k, v in data['status_codes'].items()})
+        return stats
+
+
+class LatencyRecorder:
+    """Latências por endpoint e por janela de tempo, com log bruto opcional"""
+
+    def __init__(self, window_seconds=10, raw=True, max_raw_samples=1_000_000, recent=10):
+        self.window_seconds = window_seconds
+        self.total = EndpointStats()
+        self.endpoints = {}
+        self.windows = {}
+        self.first_ts = None
+        self.last_ts = None
+        self.recent = deque(maxlen=recent)
+
+        # Log bruto: colunas em arrays tipados em vez de um dict por requisição
+        self.raw = raw
+        self.max_raw_samples = max_raw_samples
+        self.raw_dropped = 0
+        self._endpoint_ids = {}
+        self._endpoint_names = []
+        self.raw_ts = array('d')
+        self.raw_latency = array('f')
+        self.raw_status = array('H')
+        self.raw_endpoint = array('H')
+
+    def record(self, method, endpoint, latencia_ms, status_code, success, timestamp=None):
+        ts = time.time() if timestamp is None else timestamp
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+
+        self.total.record(latencia_ms, status_code, success)
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        stats.record(latencia_ms, status_code, success)
+
+        janela = int(ts // self.window_seconds) * self.window_seconds
+        stats = self.windows.get(janela)
+        if stats is None:
+            stats = self.windows[janela] = EndpointStats()
+        stats.record(latencia_ms, status_code, success)
+
+        self.recent.append((ts, method, endpoint, latencia_ms, status_code, success))
+
+        if self.raw:
+            if len(self.raw_ts) >= self.max_raw_samples:
+                self.raw_dropped += 1
+                return
+            endpoint_id = self._endpoint_ids.get(endpoint)
+            if endpoint_id is None:
+                endpoint_id = self._endpoint_ids[endpoint] = len(self._endpoint_names)
+                self._endpoint_names.append(endpoint)
+            self.raw_ts.append(ts)
+            self.raw_latency.append(latencia_ms)
+            self.raw_status.append(status_code)
+            self.raw_endpoint.append(endpoint_id)
+
+    def __len__(self):
+        return self.total.count
+
+    @property
+    def duration(self):
+        if self.first_ts is None:
+            return 0.0
+        return self.last_ts - self.first_ts
+
+    def raw_samples(self, minimo_ms=None):
+        """Itera (timestamp, endpoint, latência ms, status) do log bruto"""
+        for ts, latencia, status, endpoint_id in zip(
+            self.raw_ts, self.raw_latency, self.raw_status, self.raw_endpoint
+        ):
+            if minimo_ms is None or latencia > minimo_ms:
+                yield ts, self._endpoint_names[endpoint_id], latencia, status
+
+    def merge(self, outro):
+        """Soma os histogramas de outro registro (log bruto não é combinado)"""
+        self.total.merge(outro.total)
+        for endpoint, stats in outro.endpoints.items():
+            self.endpoints.setdefault(endpoint, EndpointStats()).merge(stats)
+        for janela, stats in outro.windows.items():
+            self.windows.setdefault(janela, EndpointStats()).merge(stats)
+        if outro.first_ts is not None:
+            self.first_ts = min(self.first_ts or outro.first_ts, outro.first_ts)
+            self.last_ts = max(self.last_ts or outro.last_ts, outro.last_ts)
+        self.recent.extend(outro.recent)
+        return self
+
+    def to_dict(self):
+        return {
+            'window_seconds': self.window_seconds,
+            'first_ts': self.first_ts,
+            'last_ts': self.last_ts,
+            'total': self.total.to_dict(),
+            'endpoints': {k: v.to_dict() for k, v in self.endpoints.items()},
+            'windows': {str(k): v.to_dict() for k, v in self.windows.items()},
+            'recent': list(self.recent),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        recorder = cls(window_seconds=data['window_seconds'], raw=False)
+        recorder.first_ts = data['first_ts']
+        recorder.last_ts = data['last_ts']
+        recorder.total = EndpointStats.from_dict(data['total'])
+        recorder.endpoints = {k: EndpointStats.from_dict(v) for k, v in data['endpoints'].items()}
+        recorder.windows = {int(k): EndpointStats.from_dict(v) for k, v in data['windows'].items()}
+        recorder.recent.extend(tuple(r) for r in data['recent'])
+        return recorder
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark de vazão de login do GestokPro.
+
+Modo servidor (padrão): dispara logins concorrentes contra a aplicação em
+execução e mede logins/s e latência, enquanto um segundo grupo de usuários
+acessa /dashboard para mostrar o impacto do hashing nas demais requisições.
+Rode uma vez com PASSWORD_HASH_SLOTS=0 e outra com PASSWORD_HASH_SLOTS=N no
+servidor para comparar.
+
+Modo local (--local): mede apenas a verificação de senha, sem servidor, para
+cada método de hash informado, sem limite e com --slots verificações
+simultâneas.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Adiciona o diretório atual ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p), len(ordenados) - 1)]
+
+
+def _resumo(nome, tempos_ms, duracao):
+    if not tempos_ms:
+        print(f"{nome:<28} sem resultados")
+        return
+    print(f"{nome:<28} {len(tempos_ms) / duracao:8.1f} op/s | "
+          f"média {statistics.mean(tempos_ms):7.1f} ms | "
+          f"p50 {_percentil(tempos_ms, 0.50):7.1f} ms | "
+          f"p99 {_percentil(tempos_ms, 0.99):7.1f} ms")
+
+
+async def benchmark_servidor(base_url, concorrencia, duracao):
+    """Logins concorrentes + sonda de dashboard contra um servidor real"""
+    import aiohttp
+    from test_stress import GestokProStressTester
+
+    tester = GestokProStressTester(base_url=base_url)
+    logins, falhas, dashboard = [], 0, []
+    fim = time.time() + duracao
+
+    async def logar():
+        nonlocal falhas
+        while time.time() < fim:
+            async with aiohttp.ClientSession() as session:
+                inicio = time.perf_counter()
+                ok = await tester.login_user(session)
+                if ok:
+                    logins.append((time.perf_counter() - inicio) * 1000)
+                else:
+                    falhas += 1
+
+    async def sondar():
+        async with aiohttp.ClientSession() as session:
+            if not await tester.login_user(session):
+                return
+            while time.time() < fim:
+                inicio = time.perf_counter()
+                async with session.get(f"{base_url}/dashboard") as response:
+                    await response.read()
+                dashboard.append((time.perf_counter() - inicio) * 1000)
+                await asyncio.sleep(0.05)
+
+    inicio = time.time()
+    await asyncio.gather(*[logar() for _ in range(concorrencia)], sondar())
+    decorrido = time.time() - inicio
+
+    print(f"\n🔐 Login: {concorrencia} clientes concorrentes por {duracao}s em {base_url}")
+    _resumo("login (GET + POST)", logins, decorrido)
+    _resumo("dashboard durante logins", dashboard, decorrido)
+    print(f"Falhas de login: {falhas}")
+
+
+def benchmark_local(metodos, concorrencia, operacoes, slots):
+    """Verificação de senha sem limite e com `slots` simultâneas, por método de hash"""
+    import tempfile
+    from flask import Flask
+    from werkzeug.security import generate_password_hash
+    import passwords
+
+    app = Flask(__name__)
+    print(f"\n🔐 Verificação de senha: {operacoes} operações, {concorrencia} threads")
+    for metodo in metodos:
+        senha_hash = generate_password_hash('admin', method=metodo)
+        for limite in ([0, slots] if slots else [0]):
+            app.config.update(
+                PASSWORD_HASH_METHOD=metodo,
+                PASSWORD_HASH_SLOTS=limite,
+                PASSWORD_HASH_SLOTS_DIR=os.path.join(tempfile.gettempdir(), 'gestokpro_password_slots'),
+                PASSWORD_HASH_TIMEOUT=60,
+            )
+
+            def verificar(_):
+                with app.app_context():
+                    inicio = time.perf_counter()
+                    assert passwords.verify_password(senha_hash, 'admin')
+                    return (time.perf_counter() - inicio) * 1000
+
+            inicio = time.time()
+            with ThreadPoolExecutor(concorrencia) as executor:
+                tempos = list(executor.map(verificar, range(operacoes)))
+            modo = f"slots={limite}" if limite else "sem limite"
+            _resumo(f"{metodo.split(':')[0]} ({modo})", tempos, time.time() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default="http://localhost:5000")
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--duracao', type=int, default=20, help='segundos (modo servidor)')
+    parser.add_argument('--local', action='store_true', help='mede só o hashing, sem servidor')
+    parser.add_argument('--operacoes', type=int, default=64, help='verificações por método (modo local)')
+    parser.add_argument('--slots', type=int, default=os.cpu_count() or 2,
+                        help='verificações simultâneas (modo local)')
+    parser.add_argument('--metodo', action='append',
+                        help='método werkzeug, repetível (padrão: scrypt e pbkdf2:sha256)')
+    args = parser.parse_args()
+
+    print("🧪 GestokPro - Benchmark de Login")
+    print("=" * 50)
+    if args.local:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        benchmark_local(args.metodo or ['scrypt', 'pbkdf2:sha256'], args.concorrencia, args.operacoes, args.slots)
+    else:
+        asyncio.run(benchmark_servidor(args.url, args.concorrencia, args.duracao))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Teste de estresse open-loop (taxa de chegada constante) para GestokPro.
+
+Os testes em ondas esperam cada onda terminar antes de enviar a próxima: quando
+o servidor fica lento, a carga oferecida cai junto e as latências altas somem
+das estatísticas (coordinated omission). Aqui as requisições são agendadas por
+uma taxa alvo (req/s), independentemente das respostas, e a latência de cada
+uma é medida a partir do instante em que ela DEVERIA ter sido enviada.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+# Adiciona o diretório atual ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_stress import GestokProStressTester
+from latency import LatencyHistogram
+
+# (endpoint, método, descrição, peso)
+MIX_PADRAO = [
+    ('/dashboard', 'GET', 'Dashboard', 2),
+    ('/produtos', 'GET', 'Lista Produtos', 4),
+    ('/produtos?search=notebook', 'GET', 'Busca', 1),
+    ('/produtos?search=mouse', 'GET', 'Busca', 1),
+    ('/produtos?ordem=nome', 'GET', 'Lista por Nome', 1),
+    ('/produtos/novo', 'GET', 'Formulário', 1),
+]
+
+
+class PerfilCarga:
+    """Taxa alvo (req/s) em função do tempo decorrido"""
+
+    nome = 'constante'
+
+    def __init__(self, taxa):
+        self.taxa = taxa
+
+    def rate(self, t):
+        return self.taxa
+
+    def describe(self):
+        return f"constante {self.taxa:g} req/s"
+
+
+class PerfilRampa(PerfilCarga):
+    """Sobe linearmente de `inicial` a `final` em `duracao_rampa` segundos e mantém"""
+
+    nome = 'rampa'
+
+    def __init__(self, inicial, final, duracao_rampa):
+        self.inicial = inicial
+        self.final = final
+        self.duracao_rampa = duracao_rampa
+
+    def rate(self, t):
+        if t >= self.duracao_rampa:
+            return self.final
+        return self.inicial + (self.final - self.inicial) * t / self.duracao_rampa
+
+    def describe(self):
+        return f"rampa {self.inicial:g} → {self.final:g} req/s em {self.duracao_rampa:g}s"
+
+
+class PerfilDegrau(PerfilCarga):
+    """Soma `incremento` req/s a cada `intervalo` segundos, até `maximo`"""
+
+    nome = 'degrau'
+
+    def __init__(self, inicial, incremento, intervalo, maximo):
+        self.inicial = inicial
+        self.incremento = incremento
+        self.intervalo = intervalo
+        self.maximo = maximo
+
+    def rate(self, t):
+        return min(self.maximo, self.inicial + self.incremento * int(t // self.intervalo))
+
+    def describe(self):
+        return (f"degrau {self.inicial:g} req/s +{self.incremento:g} a cada "
+                f"{self.intervalo:g}s (máx {self.maximo:g})")
+
+
+class PerfilPico(PerfilCarga):
+    """Taxa base com um pico de `pico` req/s entre `inicio` e `inicio + duracao_pico`"""
+
+    nome = 'pico'
+
+    def __init__(self, base, pico, inicio, duracao_pico):
+        self.base = base
+        self.pico = pico
+        self.inicio = inicio
+        self.duracao_pico = duracao_pico
+
+    def rate(self, t):
+        if self.inicio <= t < self.inicio + self.duracao_pico:
+            return self.pico
+        return self.base
+
+    def describe(self):
+        return (f"pico {self.base:g} → {self.pico:g} req/s aos {self.inicio:g}s "
+                f"por {self.duracao_pico:g}s")
+
+
+class OpenLoopTester(GestokProStressTester):
+    tipo_relatorio = 'Open-loop'
+
+    def __init__(self, base_url="http://localhost:5000", sessoes=10, timeout=30,
+                 max_em_voo=10000, mix=None, **kwargs):
+        super().__init__(base_url, auth_pool_size=sessoes, **kwargs)
+        self.timeout = timeout
+        self.max_em_voo = max_em_voo
+        self.mix = mix or MIX_PADRAO
+        self.agendadas = 0
+        self.descartadas = 0
+        # Além da latência desde o envio planejado (self.results)
+        self.servico = LatencyHistogram()
+        self.atraso_envio = LatencyHistogram()
+        self.perfil = None
+        self.duracao = 0
+
+    def _proxima_operacao(self):
+        endpoints = [op[:3] for op in self.mix]
+        pesos = [op[3] for op in self.mix]
+        return random.choices(endpoints, weights=pesos)[0]
+
+    async def _disparar(self, session, intended, endpoint, method, description):
+        """Executa uma requisição; latência contada desde o envio planejado"""
+        enviado = time.perf_counter()
+        status_code = 0
+        try:
+            async with session.request(method, f"{self.base_url}{endpoint}") as response:
+                await response.read()
+                status_code = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        fim = time.perf_counter()
+
+        self.results.record(method, endpoint, (fim - intended) * 1000, status_code,
+                            200 <= status_code < 400)
+        self.servico.record((fim - enviado) * 1000)
+        self.atraso_envio.record((enviado - intended) * 1000)
+
+    async def _abrir_sessoes(self):
+        """Uma sessão por cookie jar autenticado, todas no mesmo connector"""
+        await self.open_client()
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        return [self.client_session(cookie_jar=jar, timeout=timeout) for jar in self.auth_jars]
+
+    async def run_open_loop_test(self, perfil, duration_seconds=60, poisson=False):
+        """Agenda requisições pela taxa do perfil durante `duration_seconds`"""
+        self.perfil = perfil
+        self.duracao = duration_seconds
+        print(f"🚀 Iniciando teste open-loop...")
+        print(f"📊 Duração: {duration_seconds}s | Perfil: {perfil.describe()}"
+              f"{' (chegadas Poisson)' if poisson else ''}")
+        print(f"🔗 URL: {self.base_url}")
+        print("-" * 60)
+
+        sessions = await self._abrir_sessoes()
+        if not sessions:
+            print("❌ Falha no login; teste cancelado")
+            await self.close_client()
+            return
+
+        em_voo = set()
+        inicio = time.perf_counter()
+        proximo = inicio
+        ultimo_aviso = 0
+        try:
+            while True:
+                decorrido = proximo - inicio
+                if decorrido >= duration_seconds:
+                    break
+                taxa = perfil.rate(decorrido)
+                if taxa <= 0:
+                    proximo += 0.05
+                    continue
+
+                espera = proximo - time.perf_counter()
+                # Atrasado: envia já, mas cede o loop para as respostas andarem
+                await asyncio.sleep(max(espera, 0))
+
+                # O agendamento não espera respostas: só descarta se o cliente saturar
+                self.agendadas += 1
+                if len(em_voo) >= self.max_em_voo:
+                    self.descartadas += 1
+                else:
+                    endpoint, method, description = self._proxima_operacao()
+                    session = sessions[self.agendadas % len(sessions)]
+                    task = asyncio.create_task(
+                        self._disparar(session, proximo, endpoint, method, description)
+                    )
+                    em_voo.add(task)
+                    task.add_done_callback(em_voo.discard)
+
+                if int(decorrido) // 10 > ultimo_aviso:
+                    ultimo_aviso = int(decorrido) // 10
+                    print(f"⏱️  {int(decorrido)}s - {taxa:.1f} req/s alvo | "
+                          f"{len(self.results)} concluídas | {len(em_voo)} em voo")
+
+                intervalo = 1.0 / taxa
+                proximo += random.expovariate(taxa) if poisson else intervalo
+
+            if em_voo:
+                print(f"⏳ Aguardando {len(em_voo)} requisições em voo...")
+                await asyncio.gather(*em_voo, return_exceptions=True)
+        finally:
+            for session in sessions:
+                await session.close()
+            await self.close_client()
+
+        print(f"✅ Teste open-loop concluído!")
+        print(f"📈 Total de requests executados: {len(self.results)}")
+
+    def open_loop_summary(self):
+        """Métricas próprias do modo open-loop"""
+        latencias = self.results.total.hist.percentiles([50, 99])
+        return {
+            'perfil': self.perfil.describe() if self.perfil else '',
+            'agendadas': self.agendadas,
+            'descartadas': self.descartadas,
+            'taxa_oferecida': self.agendadas / self.duracao if self.duracao else 0.0,
+            'taxa_atendida': len(self.results) / self.duracao if self.duracao else 0.0,
+            'p50_ms': latencias[50],
+            'p99_ms': latencias[99],
+            'p99_servico_ms': self.servico.percentile(99),
+            'p99_atraso_envio_ms': self.atraso_envio.percentile(99),
+            'media_servico_ms': self.servico.mean,
+        }
+
+    def results_summary(self):
+        resumo = super().results_summary()
+        resumo['open_loop'] = self.open_loop_summary()
+        return resumo
+
+    def generate_performance_report(self):
+        """Relatório padrão acrescido da seção open-loop"""
+        report_filename = super().generate_performance_report()
+        if not report_filename:
+            return report_filename
+
+        resumo = self.open_loop_summary()
+        secao = f"""
+## 🎯 Open-Loop (taxa de chegada constante)
+
+- **Perfil de Carga:** {resumo['perfil']}
+- **Requisições Agendadas:** {resumo['agendadas']} ({resumo['descartadas']} descartadas pelo cliente)
+- **Taxa Oferecida:** {resumo['taxa_oferecida']:.1f} req/s
+- **Taxa Atendida:** {resumo['taxa_atendida']:.1f} req/s
+- **P99 (desde o envio planejado):** {resumo['p99_ms']:.2f} ms
+- **P99 (só tempo de serviço):** {resumo['p99_servico_ms']:.2f} ms
+- **P99 do Atraso de Envio:** {resumo['p99_atraso_envio_ms']:.2f} ms
+
+Os tempos de resposta acima são medidos a partir do instante planejado de envio,
+incluindo o tempo de fila quando o servidor não acompanha a taxa oferecida.
+"""
+        with open(report_filename, 'r', encoding='utf-8') as f:
+            content = f.read()
+        # Insere a seção antes do rodapé do relatório
+        rodape = content.rfind('\n---\n')
+        content = content[:rodape] + secao + content[rodape:] if rodape >= 0 else content + secao
+        with open(report_filename, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+        print(f"🎯 Oferecido: {resumo['taxa_oferecida']:.1f} req/s | "
+              f"Atendido: {resumo['taxa_atendida']:.1f} req/s | "
+              f"P99: {resumo['p99_ms']:.2f} ms (serviço: {resumo['p99_servico_ms']:.2f} ms)")
+        return report_filename
+
+
+def criar_perfil(args):
+    if args.perfil == 'rampa':
+        return PerfilRampa(args.taxa, args.taxa_final, args.duracao_rampa or args.duracao)
+    if args.perfil == 'degrau':
+        return PerfilDegrau(args.taxa, args.incremento, args.intervalo, args.taxa_final)
+    if args.perfil == 'pico':
+        return PerfilPico(args.taxa, args.taxa_final, args.inicio_pico, args.duracao_pico)
+    return PerfilCarga(args.taxa)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Teste de estresse open-loop do GestokPro")
+    parser.add_argument('--url', default="http://localhost:5000")
+    parser.add_argument('--perfil', choices=['constante', 'rampa', 'degrau', 'pico'], default='constante')
+    parser.add_argument('--taxa', type=float, default=10, help='req/s (inicial/base)')
+    parser.add_argument('--taxa-final', type=float, default=50, help='req/s final, máximo ou do pico')
+    parser.add_argument('--duracao', type=int, default=60, help='segundos')
+    parser.add_argument('--duracao-rampa', type=float, help='segundos até a taxa final (rampa)')
+    parser.add_argument('--incremento', type=float, default=5, help='req/s por degrau')
+    parser.add_argument('--intervalo', type=float, default=10, help='segundos por degrau')
+    parser.add_argument('--inicio-pico', type=float, default=20, help='segundos até o pico')
+    parser.add_argument('--duracao-pico', type=float, default=10, help='segundos de pico')
+    parser.add_argument('--sessoes', type=int, default=10, help='sessões autenticadas reutilizadas')
+    parser.add_argument('--conexoes', type=int, default=200, help='limite total de conexões keep-alive (0 = sem limite)')
+    parser.add_argument('--conexoes-por-host', type=int, default=0, help='limite de conexões por host (0 = sem limite)')
+    parser.add_argument('--poisson', action='store_true', help='intervalos exponenciais em vez de fixos')
+    args = parser.parse_args()
+
+    print("🧪 GestokPro - Teste de Estresse Open-Loop")
+    print("=" * 50)
+
+    tester = OpenLoopTester(base_url=args.url, sessoes=args.sessoes,
+                            connection_limit=args.conexoes, limit_per_host=args.conexoes_por_host)
+    await tester.run_open_loop_test(criar_perfil(args), duration_seconds=args.duracao, poisson=args.poisson)
+    report_file = tester.generate_performance_report()
+
+    print(f"\n🎉 Teste concluído! Verifique o arquivo: {report_file}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
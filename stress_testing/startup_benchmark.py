@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Tempo de partida a frio do GestokPro: do início do processo à primeira resposta.
+
+Sobe o gunicorn (`main:app`) com e sem --preload e mede, em cada repetição,
+o tempo entre criar o processo e receber o primeiro 200 em GET /login. Com
+--preload o mestre importa a aplicação uma vez e os workers nascem dela por
+fork; sem ele cada worker importa tudo sozinho. Antes das medições o banco
+recebe um catálogo sintético de --produtos produtos (`init_db.py`) e o esquema
+é conferido com `flask banco criar`, como num deploy, para que a verificação
+preguiçosa do primeiro request não crie tabelas durante a medição. Com um
+catálogo de verdade, qualquer trabalho proporcional a ele feito na partida (a
+carga do índice de SKUs, por exemplo) aparece nos tempos.
+
+--fases mede também, num interpretador novo, quanto custa cada etapa dentro
+do processo: importar `app`, `create_app()` e a primeira requisição.
+
+    python stress_testing/startup_benchmark.py --produtos 100000 --workers 2 --repeticoes 5 --fases
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODOS = ('sem-preload', 'preload')
+
+# Executado num interpretador novo para que nada venha já importado
+FASES_CODIGO = """
+import json, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+app = create_app()
+criado = time.perf_counter()
+resposta = app.test_client().get('/login')
+respondido = time.perf_counter()
+assert resposta.status_code == 200, resposta.status_code
+print(json.dumps({
+    'import_ms': (importado - inicio) * 1000,
+    'create_app_ms': (criado - importado) * 1000,
+    'primeira_requisicao_ms': (respondido - criado) * 1000,
+}))
+"""
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _ambiente(banco):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = banco
+    env['METRICS_DIR'] = os.path.join(tempfile.gettempdir(), f"gestokpro_startup_metrics_{os.getpid()}")
+    # Só erros no terminal; o log de acesso não interessa aqui
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    env['LOG_ACCESS'] = '0'
+    return env
+
+
+def semear_catalogo(env, produtos, seed):
+    subprocess.run([sys.executable, 'init_db.py', '--produtos', str(produtos), '--seed', str(seed)],
+                   cwd=RAIZ, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def criar_esquema(env):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'banco', 'criar'],
+                   cwd=RAIZ, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def medir_partida(env, workers, preload, timeout):
+    """Segundos entre o Popen do gunicorn e o primeiro 200 em /login"""
+    porta = _porta_livre()
+    comando = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{porta}', '--workers', str(workers)]
+    if preload:
+        comando.append('--preload')
+    comando.append('main:app')
+    url = f'http://127.0.0.1:{porta}/login'
+
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            decorrido = time.perf_counter() - inicio
+            if processo.poll() is not None:
+                raise RuntimeError(f"gunicorn terminou com código {processo.returncode} antes de responder")
+            if decorrido > timeout:
+                raise RuntimeError(f"sem resposta em {timeout}s")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resposta:
+                    if resposta.status == 200:
+                        return time.perf_counter() - inicio
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                pass
+            time.sleep(0.01)
+    finally:
+        processo.send_signal(signal.SIGTERM)
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+            processo.wait()
+
+
+def medir_fases(env):
+    saida = subprocess.run([sys.executable, '-c', FASES_CODIGO], cwd=RAIZ, env=env,
+                           check=True, capture_output=True, text=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def _resumo(tempos):
+    ms = [t * 1000 for t in tempos]
+    return {
+        'min_ms': round(min(ms), 1),
+        'mediana_ms': round(statistics.median(ms), 1),
+        'max_ms': round(max(ms), 1),
+        'amostras_ms': [round(t, 1) for t in ms],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banco', help='URL do banco (padrão: SQLite temporário)')
+    parser.add_argument('--produtos', type=int, default=10000, help='tamanho do catálogo semeado (0: banco vazio)')
+    parser.add_argument('--seed', type=int, default=42, help='seed do catálogo')
+    parser.add_argument('--workers', type=int, default=2, help='workers do gunicorn')
+    parser.add_argument('--repeticoes', type=int, default=5, help='partidas medidas por modo')
+    parser.add_argument('--modo', action='append', choices=MODOS, help='repetível (padrão: ambos)')
+    parser.add_argument('--timeout', type=float, default=60, help='segundos até desistir de uma partida')
+    parser.add_argument('--fases', action='store_true', help='mede import, create_app e primeira requisição')
+    parser.add_argument('--saida', help='grava o resultado em JSON')
+    args = parser.parse_args()
+
+    banco = args.banco or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'gestokpro_startup.db')}"
+    env = _ambiente(banco)
+    modos = args.modo or list(MODOS)
+
+    print("🚀 GestokPro - Tempo de Partida")
+    print("=" * 50)
+    if args.produtos:
+        print(f"🌱 Semeando {args.produtos:,} produtos em {banco}...")
+        semear_catalogo(env, args.produtos, args.seed)
+    print(f"🗄️  Conferindo o esquema em {banco}...")
+    criar_esquema(env)
+
+    resultados = {}
+    for modo in modos:
+        tempos = []
+        for i in range(args.repeticoes):
+            tempo = medir_partida(env, args.workers, modo == 'preload', args.timeout)
+            tempos.append(tempo)
+            print(f"   {modo:<12} #{i + 1}: {tempo * 1000:8.1f} ms")
+        resultados[modo] = _resumo(tempos)
+
+    print(f"\n📊 Até a primeira resposta ({args.workers} workers, {args.repeticoes} partidas):")
+    for modo, r in resultados.items():
+        print(f"   {modo:<12} mediana {r['mediana_ms']:8.1f} ms   min {r['min_ms']:8.1f}   max {r['max_ms']:8.1f}")
+
+    dados = {'banco': banco, 'produtos': args.produtos, 'workers': args.workers, 'repeticoes': args.repeticoes, 'modos': resultados}
+    if args.fases:
+        fases = [medir_fases(env) for _ in range(args.repeticoes)]
+        dados['fases'] = {nome: round(statistics.median(f[nome] for f in fases), 1) for nome in fases[0]}
+        print("\n⏱️  Fases dentro do processo (mediana):")
+        for nome, ms in dados['fases'].items():
+            print(f"   {nome:<24} {ms:8.1f} ms")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultado salvo em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,20 +9,117 @@ import aiohttp
 import time
 import json
 import random
-import statistics
-from datetime import datetime
+import re
+import html
+from datetime import datetime, timedelta
+import os
+import sys
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import threading
 
+# Adiciona o diretório atual ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from latency import LatencyRecorder
+
+# Link "Próximo" da listagem de produtos: a paginação é por cursor, então a
+# próxima página só existe a partir da resposta anterior, como no navegador
+_LINK_PROXIMO = re.compile(r'<a href="([^"]*cursor=[^"]*)"[^>]*>\s*Próximo'.encode('utf-8'))
+# Páginas seguidas por cursor ficam agrupadas numa rota só nas estatísticas
+ROTA_PROXIMA = '/produtos?cursor=…'
+
+
+def _proxima_pagina(corpo):
+    """URL da próxima página contida no HTML da listagem, ou None"""
+    if b'cursor=' not in corpo:
+        return None
+    link = _LINK_PROXIMO.search(corpo)
+    return html.unescape(link.group(1).decode('utf-8')) if link else None
+
+
 class GestokProStressTester:
-    def __init__(self, base_url="http://localhost:5000", max_concurrent=10):
+    # Tipo gravado nos resultados estruturados (listagem de /teste-estresse)
+    tipo_relatorio = 'Básico'
+
+    def __init__(self, base_url="http://localhost:5000", max_concurrent=10,
+                 connection_limit=200, limit_per_host=0, keepalive_timeout=30, auth_pool_size=None,
+                 window_seconds=10, raw_samples=True, max_rate=None):
         self.base_url = base_url
         self.max_concurrent = max_concurrent
-        self.results = []
+        # Teto opcional de requisições por segundo, somando todos os usuários
+        self.max_rate = max_rate
+        self._proximo_envio = 0.0
+        # Histogramas por endpoint/janela em vez de uma lista de dicts por requisição
+        self.results = LatencyRecorder(window_seconds=window_seconds, raw=raw_samples)
         self.login_cookies = None
         self.test_products = []
         self.lock = threading.Lock()
         
+        # Pool de conexões compartilhado e sessões já autenticadas
+        self.connection_limit = connection_limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.auth_pool_size = auth_pool_size or max_concurrent
+        self.connector = None
+        self.auth_jars = []
+        self._jar_pool = None
+        
+    async def open_client(self):
+        """Cria o TCPConnector compartilhado (keep-alive) e faz login nos cookie jars do pool"""
+        if self.connector is not None:
+            return
+        self.connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._jar_pool = asyncio.Queue()
+        
+        async def autenticar():
+            # unsafe=True aceita cookies de hosts por IP (ex.: 127.0.0.1)
+            jar = aiohttp.CookieJar(unsafe=True)
+            async with aiohttp.ClientSession(connector=self.connector, connector_owner=False,
+                                             cookie_jar=jar) as session:
+                if await self.login_user(session):
+                    return jar
+            return None
+        
+        jars = await asyncio.gather(*[autenticar() for _ in range(self.auth_pool_size)])
+        self.auth_jars = [jar for jar in jars if jar is not None]
+        for jar in self.auth_jars:
+            self._jar_pool.put_nowait(jar)
+        print(f"🔐 {len(self.auth_jars)}/{self.auth_pool_size} sessões autenticadas no pool "
+              f"(limite de conexões: {self.connection_limit or 'ilimitado'}, "
+              f"por host: {self.limit_per_host or 'ilimitado'})")
+    
+    async def close_client(self):
+        """Fecha o pool de conexões"""
+        if self.connector is not None:
+            await self.connector.close()
+        self.connector = None
+        self.auth_jars = []
+        self._jar_pool = None
+    
+    def client_session(self, cookie_jar=None, **kwargs):
+        """ClientSession leve sobre o connector compartilhado"""
+        return aiohttp.ClientSession(connector=self.connector, connector_owner=False,
+                                     cookie_jar=cookie_jar, **kwargs)
+    
+    @asynccontextmanager
+    async def user_session(self):
+        """Empresta uma sessão autenticada do pool; devolve ao final"""
+        await self.open_client()
+        if not self.auth_jars:
+            raise RuntimeError("Nenhuma sessão autenticada disponível (falha no login)")
+        jar = await self._jar_pool.get()
+        try:
+            async with self.client_session(cookie_jar=jar) as session:
+                yield session
+        finally:
+            self._jar_pool.put_nowait(jar)
+        
     async def get_csrf_token(self, session):
         """Obtém token CSRF da página de login"""
         try:
@@ -54,19 +151,40 @@ class GestokProStressTester:
         except:
             return False
 
-    async def test_endpoint(self, session, method, endpoint, data=None, description=""):
-        """Testa um endpoint específico e mede o tempo de resposta"""
-        start_time = time.time()
+    async def _aguardar_vaga(self):
+        """Espaça os envios em 1/max_rate segundos (sem efeito se max_rate não definido)"""
+        if not self.max_rate:
+            return
+        agora = time.perf_counter()
+        vaga = max(self._proximo_envio, agora)
+        self._proximo_envio = vaga + 1 / self.max_rate
+        if vaga > agora:
+            await asyncio.sleep(vaga - agora)
+
+    async def test_endpoint(self, session, method, endpoint, data=None, description="", rota=None):
+        """Testa um endpoint específico e mede o tempo de resposta.
+
+        `rota` agrupa nas estatísticas URLs que mudam a cada chamada (cursores);
+        o resultado traz em 'proximo' o link da próxima página, se houver.
+        """
+        await self._aguardar_vaga()
+        start_time = time.perf_counter()
         success = False
         status_code = 0
+        proximo = None
         
         try:
+            # O corpo é lido por completo para a conexão voltar ao pool (keep-alive)
             if method.upper() == 'GET':
                 async with session.get(f"{self.base_url}{endpoint}") as response:
+                    corpo = await response.read()
                     status_code = response.status
                     success = 200 <= status_code < 400
+                    if success:
+                        proximo = _proxima_pagina(corpo)
             elif method.upper() == 'POST':
                 async with session.post(f"{self.base_url}{endpoint}", data=data) as response:
+                    await response.read()
                     status_code = response.status
                     success = 200 <= status_code < 400
                     
@@ -74,33 +192,23 @@ class GestokProStressTester:
             success = False
             status_code = 0
             
-        response_time = (time.time() - start_time) * 1000  # em ms
+        response_time = (time.perf_counter() - start_time) * 1000  # em ms
+        self.results.record(method, rota or endpoint, response_time, status_code, success)
         
-        result = {
-            'timestamp': datetime.now().isoformat(),
+        return {
             'method': method,
             'endpoint': endpoint,
             'description': description,
             'response_time_ms': round(response_time, 2),
             'status_code': status_code,
-            'success': success
+            'success': success,
+            'proximo': proximo,
         }
-        
-        with self.lock:
-            self.results.append(result)
-            
-        return result
 
     async def simulate_user_session(self, session_id):
         """Simula uma sessão completa de usuário"""
-        async with aiohttp.ClientSession() as session:
-            # 1. Login
-            login_success = await self.login_user(session)
-            if not login_success:
-                print(f"❌ Sessão {session_id}: Falha no login")
-                return
-                
-            print(f"✅ Sessão {session_id}: Login realizado")
+        # 1. Sessão já autenticada, emprestada do pool
+        async with self.user_session() as session:
             
             # 2. Acessa dashboard
             await self.test_endpoint(session, 'GET', '/dashboard', 
@@ -108,7 +216,7 @@ class GestokProStressTester:
             
             # 3. Lista produtos (múltiplas vezes)
             for i in range(3):
-                await self.test_endpoint(session, 'GET', '/produtos', 
+                listagem = await self.test_endpoint(session, 'GET', '/produtos', 
                                        description=f"Lista Produtos {i+1} - Sessão {session_id}")
                 await asyncio.sleep(0.1)  # Pequena pausa entre requests
             
@@ -118,10 +226,14 @@ class GestokProStressTester:
             await self.test_endpoint(session, 'GET', f'/produtos?search={search_term}', 
                                    description=f"Busca '{search_term}' - Sessão {session_id}")
             
-            # 5. Simula navegação entre páginas
-            for page in range(1, 3):
-                await self.test_endpoint(session, 'GET', f'/produtos?page={page}', 
+            # 5. Simula navegação entre páginas seguindo o cursor da anterior
+            proximo = listagem['proximo']
+            for page in range(2, 4):
+                if proximo is None:
+                    break
+                pagina = await self.test_endpoint(session, 'GET', proximo, rota=ROTA_PROXIMA,
                                        description=f"Página {page} - Sessão {session_id}")
+                proximo = pagina['proximo']
             
             # 6. Acessa formulário de novo produto
             await self.test_endpoint(session, 'GET', '/produtos/novo', 
@@ -136,6 +248,7 @@ class GestokProStressTester:
         print(f"🔗 URL: {self.base_url}")
         print("-" * 60)
         
+        await self.open_client()
         start_time = time.time()
         wave = 1
         
@@ -155,38 +268,24 @@ class GestokProStressTester:
             wave += 1
             await asyncio.sleep(2)  # Pausa entre ondas
             
+        await self.close_client()
         print(f"✅ Teste de estresse concluído!")
         print(f"📈 Total de requests executados: {len(self.results)}")
 
     def generate_performance_report(self):
         """Gera relatório detalhado de performance"""
-        if not self.results:
+        recorder = self.results
+        if not len(recorder):
             print("❌ Nenhum resultado disponível para gerar relatório")
             return
             
-        # Estatísticas gerais
-        response_times = [r['response_time_ms'] for r in self.results]
-        successful_requests = [r for r in self.results if r['success']]
-        failed_requests = [r for r in self.results if not r['success']]
-        
-        # Estatísticas por endpoint
-        endpoints_stats = {}
-        for result in self.results:
-            endpoint = result['endpoint']
-            if endpoint not in endpoints_stats:
-                endpoints_stats[endpoint] = {
-                    'count': 0,
-                    'success_count': 0,
-                    'response_times': [],
-                    'status_codes': []
-                }
-            
-            stats = endpoints_stats[endpoint]
-            stats['count'] += 1
-            if result['success']:
-                stats['success_count'] += 1
-            stats['response_times'].append(result['response_time_ms'])
-            stats['status_codes'].append(result['status_code'])
+        # Estatísticas gerais, direto dos histogramas
+        total = recorder.total
+        hist = total.hist
+        total_requests = total.count
+        successful_requests = total.success
+        failed_requests = total_requests - successful_requests
+        p = hist.percentiles([50, 90, 95, 99])
         
         # Gera relatório
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -196,50 +295,50 @@ class GestokProStressTester:
 
 **Data/Hora:** {datetime.now().strftime("%d/%m/%Y às %H:%M:%S")}  
 **URL Testada:** {self.base_url}  
-**Duração do Teste:** {max([datetime.fromisoformat(r['timestamp']) for r in self.results]) - min([datetime.fromisoformat(r['timestamp']) for r in self.results])}
+**Duração do Teste:** {timedelta(seconds=round(recorder.duration))}
 
 ## 📊 Resumo Geral
 
-- **Total de Requests:** {len(self.results)}
-- **Requests Bem-sucedidos:** {len(successful_requests)} ({len(successful_requests)/len(self.results)*100:.1f}%)
-- **Requests com Falha:** {len(failed_requests)} ({len(failed_requests)/len(self.results)*100:.1f}%)
-- **Taxa de Sucesso:** {len(successful_requests)/len(self.results)*100:.1f}%
+- **Total de Requests:** {total_requests}
+- **Requests Bem-sucedidos:** {successful_requests} ({successful_requests/total_requests*100:.1f}%)
+- **Requests com Falha:** {failed_requests} ({failed_requests/total_requests*100:.1f}%)
+- **Taxa de Sucesso:** {successful_requests/total_requests*100:.1f}%
 
 ## ⚡ Métricas de Performance
 
 ### Tempo de Resposta (ms)
-- **Média:** {statistics.mean(response_times):.2f} ms
-- **Mediana:** {statistics.median(response_times):.2f} ms
-- **Mínimo:** {min(response_times):.2f} ms
-- **Máximo:** {max(response_times):.2f} ms
-- **Desvio Padrão:** {statistics.stdev(response_times) if len(response_times) > 1 else 0:.2f} ms
+- **Média:** {hist.mean:.2f} ms
+- **Mediana:** {p[50]:.2f} ms
+- **Mínimo:** {hist.min:.2f} ms
+- **Máximo:** {hist.max:.2f} ms
+- **Desvio Padrão:** {hist.stdev:.2f} ms
 
 ### Percentis
-- **P50 (Mediana):** {statistics.median(response_times):.2f} ms
-- **P90:** {sorted(response_times)[int(len(response_times) * 0.9)]:.2f} ms
-- **P95:** {sorted(response_times)[int(len(response_times) * 0.95)]:.2f} ms
-- **P99:** {sorted(response_times)[int(len(response_times) * 0.99)]:.2f} ms
+- **P50 (Mediana):** {p[50]:.2f} ms
+- **P90:** {p[90]:.2f} ms
+- **P95:** {p[95]:.2f} ms
+- **P99:** {p[99]:.2f} ms
 
 ## 🎯 Performance por Endpoint
 
 """
         
-        for endpoint, stats in sorted(endpoints_stats.items()):
-            avg_response = statistics.mean(stats['response_times'])
-            success_rate = (stats['success_count'] / stats['count']) * 100
+        for endpoint, stats in sorted(recorder.endpoints.items()):
+            success_rate = (stats.success / stats.count) * 100
             
             report_content += f"""### {endpoint}
-- **Total de Requests:** {stats['count']}
+- **Total de Requests:** {stats.count}
 - **Taxa de Sucesso:** {success_rate:.1f}%
-- **Tempo Médio de Resposta:** {avg_response:.2f} ms
-- **Tempo Mínimo:** {min(stats['response_times']):.2f} ms
-- **Tempo Máximo:** {max(stats['response_times']):.2f} ms
+- **Tempo Médio de Resposta:** {stats.hist.mean:.2f} ms
+- **P99:** {stats.hist.percentile(99):.2f} ms
+- **Tempo Mínimo:** {stats.hist.min:.2f} ms
+- **Tempo Máximo:** {stats.hist.max:.2f} ms
 
 """
         
         # Análise e recomendações
-        avg_response_time = statistics.mean(response_times)
-        success_rate = len(successful_requests) / len(self.results) * 100
+        avg_response_time = hist.mean
+        success_rate = successful_requests / total_requests * 100
         
         report_content += f"""## 🔍 Análise e Recomendações
 
@@ -264,8 +363,8 @@ class GestokProStressTester:
             
         # Endpoints mais lentos
         slow_endpoints = []
-        for endpoint, stats in endpoints_stats.items():
-            avg_time = statistics.mean(stats['response_times'])
+        for endpoint, stats in recorder.endpoints.items():
+            avg_time = stats.hist.mean
             if avg_time > 200:  # endpoints com mais de 200ms em média
                 slow_endpoints.append((endpoint, avg_time))
         
@@ -281,10 +380,9 @@ class GestokProStressTester:
 """
         
         # Últimos requests
-        recent_requests = sorted(self.results, key=lambda x: x['timestamp'])[-10:]
-        for req in recent_requests:
-            status_icon = "✅" if req['success'] else "❌"
-            report_content += f"- {status_icon} {req['method']} {req['endpoint']} - {req['response_time_ms']}ms ({req['status_code']})\n"
+        for _, method, endpoint, response_time, status_code, success in recorder.recent:
+            status_icon = "✅" if success else "❌"
+            report_content += f"- {status_icon} {method} {endpoint} - {response_time:.2f}ms ({status_code})\n"
         
         report_content += f"""
 ---
@@ -294,6 +392,7 @@ class GestokProStressTester:
         # Salva o relatório
         with open(report_filename, 'w', encoding='utf-8') as f:
             f.write(report_content)
+        self.save_results(report_filename)
             
         print(f"📄 Relatório salvo em: {report_filename}")
         
@@ -301,15 +400,54 @@ class GestokProStressTester:
         print("\n" + "="*60)
         print("📊 RESUMO DO TESTE DE ESTRESSE")
         print("="*60)
-        print(f"Total de Requests: {len(self.results)}")
+        print(f"Total de Requests: {total_requests}")
         print(f"Taxa de Sucesso: {success_rate:.1f}%")
         print(f"Tempo Médio: {avg_response_time:.2f} ms")
-        print(f"Tempo Máximo: {max(response_times):.2f} ms")
+        print(f"Tempo Máximo: {hist.max:.2f} ms")
         print(f"Relatório completo: {report_filename}")
         print("="*60)
         
         return report_filename
 
+    def results_summary(self):
+        """Totais e percentis do teste, usados na listagem e nas tendências"""
+        total = self.results.total
+        hist = total.hist
+        p = hist.percentiles([50, 90, 95, 99])
+        duracao = self.results.duration
+        return {
+            'total_requests': total.count,
+            'sucesso': total.success,
+            'taxa_sucesso': total.success / total.count * 100 if total.count else 0.0,
+            'media_ms': hist.mean,
+            'max_ms': hist.max,
+            'p50_ms': p[50],
+            'p90_ms': p[90],
+            'p95_ms': p[95],
+            'p99_ms': p[99],
+            'duracao_s': duracao,
+            'rps': total.count / duracao if duracao else 0.0,
+        }
+
+    def save_results(self, report_filename, tipo=None):
+        """Grava, ao lado do relatório .md, um JSON com o resumo e os histogramas por endpoint"""
+        json_filename = os.path.splitext(report_filename)[0] + '.json'
+        dados = {
+            'versao': 1,
+            'tipo': tipo or self.tipo_relatorio,
+            'relatorio': os.path.basename(report_filename),
+            'base_url': self.base_url,
+            'criado_em': time.time(),
+            'resumo': self.results_summary(),
+            'resultados': self.results.to_dict(),
+        }
+        # Escrita atômica: a listagem nunca lê um JSON pela metade
+        temporario = f"{json_filename}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f)
+        os.replace(temporario, json_filename)
+        return json_filename
+
 async def main():
     """Função principal"""
     print("🧪 GestokPro - Sistema de Teste de Estresse")
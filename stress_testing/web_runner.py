@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Executor dos testes de estresse disparados pela interface web.
+
+Roda em um processo separado do servidor (iniciado por `stress_jobs.start`) e
+grava o andamento em um arquivo JSON a cada segundo: vazão e percentis do
+último intervalo, totais acumulados e, ao final, o relatório gerado. SIGTERM
+cancela o teste; o relatório é gerado com o que foi medido até ali.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+
+# Adiciona o diretório atual ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_stress import GestokProStressTester
+from advanced_stress_test import AdvancedGestokProTester
+from latency import LatencyHistogram
+
+INTERVALO_PROGRESSO = 1.0
+
+
+class ArquivoStatus:
+    """Estado do teste em JSON, substituído de forma atômica a cada gravação"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, encoding='utf-8') as f:
+            self.dados = json.load(f)
+
+    def gravar(self, **campos):
+        self.dados.update(campos, atualizado_em=time.time())
+        temporario = f"{self.caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.dados, f)
+        os.replace(temporario, self.caminho)
+
+
+def resumo_parcial(tester, anterior, intervalo):
+    """Vazão e latência do último intervalo, mais os totais acumulados"""
+    total = tester.results.total
+    recente = total.hist.since(anterior)
+    # Intervalo sem respostas (ex.: pausa entre ondas): sem percentis
+    p = {k: round(v, 1) for k, v in recente.percentiles([50, 95, 99]).items()} if recente.count else {}
+    return {
+        'requests': total.count,
+        'sucesso_pct': round(total.success / total.count * 100, 1) if total.count else None,
+        'rps': round(recente.count / intervalo, 1),
+        'p50_ms': p.get(50),
+        'p95_ms': p.get(95),
+        'p99_ms': p.get(99),
+        'media_ms': round(total.hist.mean, 1),
+        'p95_total_ms': round(total.hist.percentile(95), 1),
+    }
+
+
+async def acompanhar(tester, status, inicio):
+    anterior = tester.results.total.hist.copy()
+    ultimo = time.perf_counter()
+    while True:
+        await asyncio.sleep(INTERVALO_PROGRESSO)
+        agora = time.perf_counter()
+        atual = tester.results.total.hist.copy()
+        status.gravar(estado='executando', decorrido=round(time.time() - inicio, 1),
+                      **resumo_parcial(tester, anterior, agora - ultimo))
+        anterior, ultimo = atual, agora
+
+
+async def executar(args, status):
+    kwargs = {'max_concurrent': args.usuarios, 'max_rate': args.taxa}
+    if args.tipo == 'advanced':
+        tester = AdvancedGestokProTester(base_url=args.url, **kwargs)
+        teste = tester.run_mixed_load_test(duration_seconds=args.duracao, users_per_wave=args.usuarios)
+    else:
+        tester = GestokProStressTester(base_url=args.url, **kwargs)
+        teste = tester.run_stress_test(duration_seconds=args.duracao, users_per_wave=args.usuarios)
+
+    inicio = time.time()
+    tarefa = asyncio.create_task(teste)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, tarefa.cancel)
+    except NotImplementedError:
+        pass  # Windows: SIGTERM encerra o processo sem relatório
+    progresso = asyncio.create_task(acompanhar(tester, status, inicio))
+    try:
+        await tarefa
+        estado = 'concluido'
+    except asyncio.CancelledError:
+        print("⏹️  Teste cancelado")
+        estado = 'cancelado'
+        await tester.close_client()
+    finally:
+        progresso.cancel()
+
+    relatorio = None
+    if len(tester.results):
+        if args.tipo == 'advanced':
+            relatorio = tester.generate_advanced_report()
+        else:
+            relatorio = tester.generate_performance_report()
+    # Resumo final: médias sobre o teste inteiro
+    status.gravar(estado=estado, decorrido=round(time.time() - inicio, 1), relatorio=relatorio,
+                  **resumo_parcial(tester, LatencyHistogram(), max(tester.results.duration, 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executor web de testes de estresse do GestokPro")
+    parser.add_argument('--status', required=True, help='arquivo JSON de andamento')
+    parser.add_argument('--tipo', choices=['basic', 'advanced'], default='basic')
+    parser.add_argument('--url', default="http://localhost:5000")
+    parser.add_argument('--usuarios', type=int, default=5)
+    parser.add_argument('--duracao', type=int, default=30)
+    parser.add_argument('--taxa', type=float, help='máximo de requisições por segundo')
+    args = parser.parse_args()
+
+    status = ArquivoStatus(args.status)
+    try:
+        asyncio.run(executar(args, status))
+    except Exception:
+        traceback.print_exc()
+        status.gravar(estado='erro', erro=traceback.format_exc(limit=3))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Per-worker cache of authenticated user identities.
+
+`load_user` runs on every authenticated request; caching the (id, email,
+is_admin) identity with a TTL and LRU eviction removes that query from almost
+every request. Hits and misses are exported at `/metrics`
+(`gestokpro_user_cache_lookups_total`). Local entries are dropped as soon as a user row is updated or
+deleted; other workers pick the change up when their entry expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+import metrics
+from app import db
+from models import Usuario
+
+
+class UsuarioIdentidade(UserMixin):
+    """Read-only identity used as `current_user`"""
+
+    __slots__ = ('id', 'email', 'is_admin')
+
+    def __init__(self, id, email, is_admin):
+        self.id = id
+        self.email = email
+        self.is_admin = is_admin
+
+    def __repr__(self):
+        return f'<UsuarioIdentidade {self.email}>'
+
+
+class UserCache:
+    """Thread-safe TTL/LRU mapping of user id -> UsuarioIdentidade"""
+
+    def __init__(self, ttl=60, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, identidade):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, identidade)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+cache = UserCache()
+
+
+def configure(ttl, max_size):
+    cache.ttl = ttl
+    cache.max_size = max_size
+    cache.clear()
+
+
+def load_identity(user_id):
+    """Return the identity for `user_id`, querying only on a cache miss"""
+    identidade = cache.get(user_id)
+    metrics.count_user_cache('hit' if identidade is not None else 'miss')
+    if identidade is not None:
+        return identidade
+
+    row = db.session.query(Usuario.id, Usuario.email, Usuario.is_admin).filter(
+        Usuario.id == user_id
+    ).first()
+    if row is None:
+        return None
+
+    identidade = UsuarioIdentidade(row.id, row.email, row.is_admin)
+    cache.put(user_id, identidade)
+    return identidade
+
+
+@db.event.listens_for(Usuario, 'after_update')
+@db.event.listens_for(Usuario, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    cache.invalidate(target.id)